@@ -1,163 +1,248 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+
 from agent.ai_parser import (
+    cache_interpretacao,
     interpretar_dieta,
+    interpretar_dieta_async,
     conversar_com_usuario,
+    conversar_com_usuario_async,
+    conversar_com_usuario_stream,
     gerar_lista_compras
 )
-from agent.pdf_reader import extrair_texto_pdf
+from agent.coalescencia import Coalescedor
+from agent.compactacao import compactar_paginas, compactar_texto
+from agent.lote import gerar_listas_em_lote_async
+from agent.pdf_reader import extrair_paginas_pdf_async
+from agent.roteiro_chat import responder_roteiro, registrar_resposta_ia
+from agent.tracing import span
+from agent.intencoes import (
+    detectar,
+    alimentos_mencionados,
+    termos_de_alimentos,
+    frutas_mencionadas,
+    trocas_pedidas
+)
 
 
 def interpretar_dieta_texto(texto: str):
-    return interpretar_dieta(texto)
+    return interpretar_dieta(compactar_texto(texto))
+
+
+# Envios idênticos simultâneos (mesmo texto normalizado ou mesmos bytes do
+# PDF) fazem uma única extração + chamada à IA
+coalescedor_interpretacao = Coalescedor("interpretacao")
+
+
+async def interpretar_dieta_texto_async(texto: str):
+    chave = "texto:" + cache_interpretacao.chave(texto)
+    return await coalescedor_interpretacao.executar(
+        chave, lambda: interpretar_dieta_async(compactar_texto(texto)))
+
+
+async def interpretar_dieta_pdf(arquivo):
+    # Copia para um temporário próprio (fora do event loop, em blocos): o
+    # arquivo do primeiro envio é fechado quando a requisição dele termina,
+    # mesmo que outros ainda aguardem o resultado
+    caminho, resumo = await asyncio.to_thread(_copiar_pdf_temporario, arquivo)
+    usado = False
 
+    def fabrica():
+        # Só roda para a primeira chamada; a tarefa dela apaga o temporário
+        nonlocal usado
+        usado = True
+        return _interpretar_pdf(caminho)
 
-async def interpretar_dieta_pdf(file):
-    texto = extrair_texto_pdf(file)
-    return interpretar_dieta(texto)
+    try:
+        return await coalescedor_interpretacao.executar("pdf:" + resumo, fabrica)
+    finally:
+        if not usado:
+            os.unlink(caminho)
+
+
+def _copiar_pdf_temporario(arquivo) -> tuple:
+    """(caminho, sha256) da cópia do upload, feita 64KB por vez"""
+    arquivo.seek(0)
+    resumo = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as destino:
+        for bloco in iter(lambda: arquivo.read(64 * 1024), b""):
+            resumo.update(bloco)
+            destino.write(bloco)
+    return destino.name, resumo.hexdigest()
+
+
+async def _interpretar_pdf(caminho: str):
+    # Os workers da extração abrem o PDF pelo caminho: os bytes não são
+    # copiados para cada bloco de páginas
+    try:
+        paginas = await extrair_paginas_pdf_async(caminho)
+    finally:
+        os.unlink(caminho)
+    # Cabeçalhos/rodapés repetidos por página e boilerplate saem antes da IA
+    return await interpretar_dieta_async(compactar_paginas(paginas))
 
 
 def chat_humano(dieta, historico, mensagem_usuario):
-    import re
+    # Turnos roteirizados (pergunta de pessoas, finalizar) respondem sem IA
+    resposta = responder_roteiro(dieta, historico, mensagem_usuario)
+    historico.append({"role": "user", "content": mensagem_usuario})
+    if resposta is None:
+        registrar_resposta_ia()
+        resposta = conversar_com_usuario(dieta, historico)
+    historico.append({"role": "assistant", "content": resposta})
+
+    _atualizar_dieta_com_mensagem(dieta, mensagem_usuario)
+
+    return resposta, historico
+
+
+async def chat_humano_async(dieta, historico, mensagem_usuario):
+    resposta = responder_roteiro(dieta, historico, mensagem_usuario)
+    historico.append({"role": "user", "content": mensagem_usuario})
+    if resposta is None:
+        registrar_resposta_ia()
+        resposta = await conversar_com_usuario_async(dieta, historico)
+    historico.append({"role": "assistant", "content": resposta})
+
+    _atualizar_dieta_com_mensagem(dieta, mensagem_usuario)
+
+    return resposta, historico
 
+
+async def chat_humano_stream(dieta, historico, mensagem_usuario):
+    """Como chat_humano_async, mas gera os pedaços da resposta conforme chegam.
+    Ao terminar, historico e dieta já estão atualizados."""
+    resposta = responder_roteiro(dieta, historico, mensagem_usuario)
     historico.append({"role": "user", "content": mensagem_usuario})
-    resposta = conversar_com_usuario(dieta, historico)
+    if resposta is not None:
+        yield resposta
+    else:
+        registrar_resposta_ia()
+        partes = []
+        async for pedaco in conversar_com_usuario_stream(dieta, historico):
+            partes.append(pedaco)
+            yield pedaco
+        resposta = "".join(partes)
     historico.append({"role": "assistant", "content": resposta})
 
+    _atualizar_dieta_com_mensagem(dieta, mensagem_usuario)
+
+
+def _atualizar_dieta_com_mensagem(dieta, mensagem_usuario):
+    """Extrai pessoas, dias, preferências, itens em casa e trocas da mensagem
+    do usuário e atualiza a dieta no lugar. As regras estão em
+    agent/intencoes.py e são avaliadas em uma única passada pela mensagem."""
+
     # ✅ EXTRAÇÃO INTELIGENTE: Atualizar dieta com informações da mensagem
     msg_lower = mensagem_usuario.lower()
+    deteccao = detectar(msg_lower)
+    intencoes = deteccao.intencoes
 
     # Detectar número de pessoas (1-20)
-    match_pessoas = re.search(r'(\d+)\s*pessoa', msg_lower)
-    if match_pessoas:
-        dieta["pessoas"] = int(match_pessoas.group(1))
+    if deteccao.pessoas is not None:
+        dieta["pessoas"] = deteccao.pessoas
 
     # Detectar dias (variações: "1 dia", "um dia", "7 dias", "semana completa")
     # IMPORTANTE: Só atualizar se usuário EXPLICITAMENTE corrigir
-    if "1 dia só" in msg_lower or "dieta é de 1 dia" in msg_lower or "só 1 dia" in msg_lower or "apenas 1 dia" in msg_lower:
+    if "dias_1" in intencoes:
         dieta["dias"] = 1
         print(f"[DEBUG] Usuário confirmou: dieta é para 1 dia")
-    elif "semana completa" in msg_lower or "já é a semana" in msg_lower or "7 dias completos" in msg_lower:
+    elif "dias_7" in intencoes:
         dieta["dias"] = 7
         print(f"[DEBUG] Usuário confirmou: dieta é para semana completa (7 dias)")
 
     # Detectar alimentos que já tem em casa
-    if "já tenho" in msg_lower or "tenho em casa" in msg_lower or "já tem" in msg_lower:
+    if "tem_em_casa" in intencoes:
         if "alimentos_em_casa" not in dieta:
             dieta["alimentos_em_casa"] = []
 
-        # Lista de alimentos comuns para detecção inteligente
-        alimentos_detectaveis = {
-            "whey": ["whey", "proteína", "suplemento"],
-            "azeite": ["azeite", "óleo", "oliva"],
-            "arroz": ["arroz"],
-            "feijão": ["feijão", "feijao"],
-            "café": ["café", "cafe"],
-            "açúcar": ["açúcar", "acucar"],
-            "sal": ["sal"],
-            "ovos": ["ovo", "ovos"],
-            "leite": ["leite"],
-            "pão": ["pão", "pao"],
-        }
-
-        # Verificar cada alimento detectável
-        for alimento_base, variacoes in alimentos_detectaveis.items():
-            if any(variacao in msg_lower for variacao in variacoes):
-                # Procurar nos fixos qual é o nome completo
-                for fixo in dieta.get("fixos", []):
-                    fixo_lower = fixo.lower()
-                    if any(variacao in fixo_lower for variacao in variacoes):
-                        if fixo not in dieta["alimentos_em_casa"]:
-                            dieta["alimentos_em_casa"].append(fixo)
-                            print(f"[DEBUG] Alimento detectado em casa: {fixo}")
-                        break
+        # Verificar cada alimento detectável citado na mensagem
+        for alimento_base, variacoes in alimentos_mencionados(deteccao):
+            # Procurar nos fixos qual é o nome completo
+            for fixo in dieta.get("fixos", []):
+                if variacoes & termos_de_alimentos(fixo.lower()):
+                    if fixo not in dieta["alimentos_em_casa"]:
+                        dieta["alimentos_em_casa"].append(fixo)
+                        print(f"[DEBUG] Alimento detectado em casa: {fixo}")
+                    break
 
     # Detectar preferência de proteína
-    if "só frango" in msg_lower or "apenas frango" in msg_lower or "prefiro frango" in msg_lower:
+    if "proteina_frango" in intencoes:
         dieta["preferencia_proteina"] = "frango"
-    elif "só carne" in msg_lower or "apenas carne" in msg_lower or "prefiro carne" in msg_lower or "carne vermelha" in msg_lower:
+    elif "proteina_carne" in intencoes:
         dieta["preferencia_proteina"] = "carne"
-    elif "só peixe" in msg_lower or "apenas peixe" in msg_lower or "prefiro peixe" in msg_lower:
+    elif "proteina_peixe" in intencoes:
         dieta["preferencia_proteina"] = "peixe"
-    elif "variar" in msg_lower or "variado" in msg_lower or "mix" in msg_lower or "diferentes" in msg_lower:
+    elif "proteina_variado" in intencoes:
         dieta["preferencia_proteina"] = "variado"
 
     # Detectar preferência de carboidrato
-    if "só arroz" in msg_lower or "apenas arroz" in msg_lower or "prefiro arroz" in msg_lower:
+    if "carboidrato_arroz" in intencoes:
         dieta["preferencia_carboidrato"] = "arroz"
-    elif "só batata" in msg_lower or "apenas batata" in msg_lower or "prefiro batata" in msg_lower:
+    elif "carboidrato_batata" in intencoes:
         dieta["preferencia_carboidrato"] = "batata"
-    elif "só macarrão" in msg_lower or "macarrao" in msg_lower or "prefiro macarrao" in msg_lower or "prefiro macarrão" in msg_lower:
+    elif "carboidrato_macarrao" in intencoes:
         dieta["preferencia_carboidrato"] = "macarrao"
-    elif ("carboidrato" in msg_lower or "carboidratos" in msg_lower) and ("variar" in msg_lower or "variado" in msg_lower):
+    elif "fala_carboidrato" in intencoes and "variar" in intencoes:
         dieta["preferencia_carboidrato"] = "variado"
 
     # Detectar preferência de frutas
-    frutas_comuns = ["banana", "maçã", "maca", "uva", "morango", "melão", "melao", "kiwi", "abacaxi", "manga", "laranja"]
-    frutas_mencionadas = [fruta for fruta in frutas_comuns if fruta in msg_lower]
-    if frutas_mencionadas and ("prefiro" in msg_lower or "gosto de" in msg_lower or "só" in msg_lower):
-        dieta["preferencia_frutas"] = ", ".join(frutas_mencionadas)
-    elif ("fruta" in msg_lower or "frutas" in msg_lower) and ("variar" in msg_lower or "variado" in msg_lower or "qualquer" in msg_lower):
+    frutas = frutas_mencionadas(deteccao)
+    if frutas and "gosta" in intencoes:
+        dieta["preferencia_frutas"] = ", ".join(frutas)
+    elif "fala_fruta" in intencoes and ("variar" in intencoes or "qualquer" in intencoes):
         dieta["preferencia_frutas"] = "variado"
 
     # Detectar preferência de vegetais
-    if ("vegetal" in msg_lower or "vegetais" in msg_lower or "legume" in msg_lower) and ("não gosto" in msg_lower or "nao gosto" in msg_lower):
+    fala_vegetal = "fala_vegetal" in intencoes
+    if (fala_vegetal or "fala_legume" in intencoes) and "nao_gosta" in intencoes:
         # Capturar o que não gosta
         dieta["preferencia_vegetais"] = mensagem_usuario  # Guardar mensagem completa para AI processar
-    elif ("vegetal" in msg_lower or "vegetais" in msg_lower) and ("variar" in msg_lower or "variado" in msg_lower or "qualquer" in msg_lower):
+    elif fala_vegetal and ("variar" in intencoes or "qualquer" in intencoes):
         dieta["preferencia_vegetais"] = "variado"
 
     # Detectar preferências gerais
-    if "integral" in msg_lower or "integrais" in msg_lower:
+    if "integrais" in intencoes:
         dieta["preferencias"] = dieta.get("preferencias", "") + " integrais"
-    if "sem lactose" in msg_lower:
+    if "sem_lactose" in intencoes:
         dieta["preferencias"] = dieta.get("preferencias", "") + " sem lactose"
-    if "orgânico" in msg_lower or "organico" in msg_lower:
+    if "organicos" in intencoes:
         dieta["preferencias"] = dieta.get("preferencias", "") + " orgânicos"
 
     # ✅ DETECTAR TROCAS DE ALIMENTOS (ex: "trocar pão francês por pão de forma")
     trocas_detectadas = []
 
-    # Mapeamento de trocas comuns
-    TROCAS_POSSIVEIS = {
-        "pão de forma": ["pao frances", "pão francês", "pao francês", "pão frances"],
-        "pao de forma": ["pao frances", "pão francês", "pao francês", "pão frances"],
-        "pão francês": ["pao de forma", "pão de forma"],
-        "carne": ["frango", "peixe", "tilapia"],
-        "frango": ["carne", "peixe", "tilapia"],
-        "peixe": ["frango", "carne"],
-        "batata": ["arroz", "macarrão", "macarrao"],
-        "arroz": ["batata", "macarrão", "macarrao"],
-        "macarrão": ["arroz", "batata"],
-    }
-
-    # Detectar pedidos de troca
-    palavras_troca = ["trocar", "troca", "mudar", "muda", "prefiro", "quero", "substituir", "substitui"]
-    if any(palavra in msg_lower for palavra in palavras_troca):
+    if "troca" in intencoes:
         # Procurar qual alimento o usuário quer
-        for alimento_novo, alimentos_antigos in TROCAS_POSSIVEIS.items():
-            if alimento_novo in msg_lower:
-                # Verificar se menciona algum alimento antigo ou se é genérico
-                for alimento_antigo in alimentos_antigos:
-                    # Atualizar nas refeições
-                    if "refeicoes" in dieta:
-                        for nome_refeicao, itens in dieta["refeicoes"].items():
-                            for i, item in enumerate(itens):
-                                item_nome = item.get("item", "").lower()
-                                if alimento_antigo in item_nome:
-                                    # Manter quantidade, trocar nome
-                                    qtd = item.get("quantidade", "1 unidade")
-                                    dieta["refeicoes"][nome_refeicao][i] = {
-                                        "item": alimento_novo.title(),
-                                        "quantidade": qtd,
-                                        "vezes": 1
-                                    }
-                                    trocas_detectadas.append(f"{alimento_antigo} → {alimento_novo}")
-                                    print(f"[DEBUG] Troca detectada: {alimento_antigo} → {alimento_novo} em {nome_refeicao}")
+        for alimento_novo, alimentos_antigos in trocas_pedidas(deteccao):
+            # Verificar se menciona algum alimento antigo ou se é genérico
+            for alimento_antigo in alimentos_antigos:
+                # Atualizar nas refeições
+                if "refeicoes" in dieta:
+                    for nome_refeicao, itens in dieta["refeicoes"].items():
+                        for i, item in enumerate(itens):
+                            item_nome = item.get("item", "").lower()
+                            if alimento_antigo in item_nome:
+                                # Manter quantidade, trocar nome
+                                qtd = item.get("quantidade", "1 unidade")
+                                dieta["refeicoes"][nome_refeicao][i] = {
+                                    "item": alimento_novo.title(),
+                                    "quantidade": qtd,
+                                    "vezes": 1
+                                }
+                                trocas_detectadas.append(f"{alimento_antigo} → {alimento_novo}")
+                                print(f"[DEBUG] Troca detectada: {alimento_antigo} → {alimento_novo} em {nome_refeicao}")
 
     if trocas_detectadas:
         print(f"[DEBUG] Total de trocas: {len(trocas_detectadas)}")
 
-    return resposta, historico
-
 
 def finalizar_compra(dieta_final):
     return gerar_lista_compras(dieta_final)
+
+
+async def finalizar_compras_em_lote(dietas: list) -> list:
+    with span("calculo.lote", dietas=len(dietas)):
+        return await gerar_listas_em_lote_async(dietas)
@@ -1,14 +1,23 @@
-import os
+import asyncio
+import contextvars
+import hashlib
 import json
+import os
 import re
 import math
+import unicodedata
 from collections import defaultdict
-from openai import OpenAI
-from dotenv import load_dotenv
-
-load_dotenv(override=True)
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import NamedTuple, Optional
+import httpx
+from openai import APIError
+from agent.automato import Automato
+from agent.cache import CacheInterpretacao
+from agent.contexto_chat import montar_mensagens_chat
+from agent.json_incremental import LeitorJson
+from agent.openai_client import client, async_client
+from agent.tracing import span
 
 # =============================================================================
 # CONFIGURAÇÃO: Categorias de alimentos
@@ -247,30 +256,239 @@ Diga apenas: "Perfeito! Clique em 'Finalizar' para gerar sua lista de compras. [
 # INTERPRETAÇÃO DA DIETA
 # =============================================================================
 
+# Incremente ao mudar o que é feito com a resposta da IA antes de cachear:
+# _pos_processar e os _filtrar_*, mescla dos trechos, reparo do JSON, regras
+# de interpretacao_local. O prompt já entra no hash sozinho.
+# 2: "dias" recuperado de JSON cortado, trechos com erro, itens com dois alimentos
+VERSAO_POS_PROCESSAMENTO = 2
+
+# Muda sempre que o prompt ou o pós-processamento mudam → invalida o cache
+VERSAO_INTERPRETACAO = hashlib.sha256(
+    f"gpt-4o-mini\0{VERSAO_POS_PROCESSAMENTO}\0{SYSTEM_INTERPRETACAO}".encode("utf-8")
+).hexdigest()[:16]
+
+cache_interpretacao = CacheInterpretacao(versao=VERSAO_INTERPRETACAO)
+
+
+def _mensagens_interpretacao(texto: str) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_INTERPRETACAO},
+        {"role": "user", "content": texto}
+    ]
+
+
+def _pedido_interpretacao(texto: str, stream: bool = False) -> dict:
+    """Argumentos de chat.completions.create (iguais no client e no async_client)"""
+    pedido = {"model": "gpt-4o-mini", "messages": _mensagens_interpretacao(texto)}
+    if stream:
+        pedido.update(stream=True, stream_options={"include_usage": True})
+    return pedido
+
+
+# Conexão caída no meio do streaming (o openai nem sempre embrulha o httpx)
+ERROS_STREAM = (APIError, httpx.HTTPError)
+
+# As versões sync e async de interpretar_dieta só diferem no transporte
+# (client/pool de threads × async_client/gather); o resto fica em
+# _preparar_interpretacao, _concluir_trechos e _LeituraInterpretacao.
+
+
 def interpretar_dieta(texto: str) -> dict:
     """Interpreta dieta usando IA"""
+    resultado, tipo, segmentos = _preparar_interpretacao(texto)
+    if resultado is not None:
+        return resultado
+
+    if len(segmentos) > 1:
+        # Cada trecho roda numa cópia do contexto: os spans dele ficam no trace
+        # da requisição
+        with ThreadPoolExecutor(max_workers=len(segmentos)) as executor:
+            futuros = [executor.submit(contextvars.copy_context().run, _interpretar_segmento, indice, segmento)
+                       for indice, segmento in enumerate(segmentos)]
+        return _concluir_trechos(texto, tipo, [futuro.exception() or futuro.result() for futuro in futuros])
+
+    for tentativa in range(2):
+        leitura = _LeituraInterpretacao()
+        with span("llm.interpretacao", caracteres=len(texto), stream=True, tentativa=tentativa) as s:
+            stream = client.chat.completions.create(**_pedido_interpretacao(texto, stream=True))
+            try:
+                for chunk in stream:
+                    leitura.alimentar(s, chunk)
+            except ERROS_STREAM as erro:
+                leitura.interromper(s, erro)
+        resultado = leitura.concluir(ultima_tentativa=tentativa == 1)
+        if resultado is not None:
+            break
+    _salvar_no_cache(texto, resultado)
+    return resultado
+
+
+async def interpretar_dieta_async(texto: str) -> dict:
+    """Versão assíncrona de interpretar_dieta: não bloqueia o event loop
+    durante a chamada à IA."""
+    resultado, tipo, segmentos = _preparar_interpretacao(texto)
+    if resultado is not None:
+        return resultado
+
+    if len(segmentos) > 1:
+        # Erro num trecho não descarta os outros: vira trecho com erro
+        parciais = await asyncio.gather(*(
+            _interpretar_segmento_async(indice, segmento) for indice, segmento in enumerate(segmentos)),
+            return_exceptions=True)
+        return _concluir_trechos(texto, tipo, parciais)
+
+    for tentativa in range(2):
+        leitura = _LeituraInterpretacao()
+        with span("llm.interpretacao", caracteres=len(texto), stream=True, tentativa=tentativa) as s:
+            stream = await async_client.chat.completions.create(**_pedido_interpretacao(texto, stream=True))
+            try:
+                async for chunk in stream:
+                    leitura.alimentar(s, chunk)
+            except ERROS_STREAM as erro:
+                leitura.interromper(s, erro)
+        resultado = leitura.concluir(ultima_tentativa=tentativa == 1)
+        if resultado is not None:
+            break
+    _salvar_no_cache(texto, resultado)
+    return resultado
+
+
+def _preparar_interpretacao(texto: str) -> tuple:
+    """Passos antes da IA: cache, regras e divisão em trechos.
+
+    Returns:
+        (resultado, tipo, trechos): resultado já pronto (cache ou regras) ou
+        None, e os trechos de dividir_dieta para mandar à IA
+    """
     print(f"\n[INTERPRETAR] Processando {len(texto)} caracteres...")
 
-    r = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": SYSTEM_INTERPRETACAO},
-            {"role": "user", "content": texto}
-        ]
-    )
+    with span("cache.interpretacao", caracteres=len(texto)) as s:
+        em_cache = cache_interpretacao.obter(texto)
+        s.definir(acerto=em_cache is not None)
+    if em_cache is not None:
+        print("[INTERPRETAR] Resultado encontrado no cache")
+        return em_cache, None, []
+
+    resultado = _interpretar_por_regras(texto)
+    if resultado is not None:
+        return resultado, None, []
+
+    tipo, segmentos = dividir_dieta(texto)
+    if len(segmentos) > 1:
+        print(f"[INTERPRETAR] Dieta longa: {len(segmentos)} trechos por {tipo}, em paralelo")
+    return None, tipo, segmentos
+
+
+def _concluir_trechos(texto: str, tipo: str, parciais: list) -> dict:
+    resultado = _processar_parciais(tipo, parciais)
+    _salvar_no_cache(texto, resultado)
+    return resultado
 
-    resposta = r.choices[0].message.content
-    resultado = _parsear_json(resposta)
 
+def _interpretar_por_regras(texto: str) -> Optional[dict]:
+    """Caminho rápido: dieta regular interpretada sem IA (None = usar a IA)"""
+    from agent.interpretacao_local import tentar_interpretar  # importa este módulo
+
+    with span("regras.interpretacao", caracteres=len(texto)) as s:
+        dieta, confianca = tentar_interpretar(texto)
+        s.definir(confianca=round(confianca, 3), caminho_rapido=dieta is not None)
+    return _pos_processar(dieta) if dieta is not None else None
+
+
+def _registrar_uso(s, resposta):
+    """Anota no span os tokens gastos na chamada à IA"""
+    uso = getattr(resposta, "usage", None)
+    if uso is not None:
+        s.definir(tokens_entrada=uso.prompt_tokens, tokens_saida=uso.completion_tokens)
+
+
+def _salvar_no_cache(texto: str, resultado: dict):
+    """Guarda só interpretações válidas (dieta vazia, com trechos perdidos ou
+    com JSON reparado = falha, não cachear)"""
+    if resultado.get("fixos") and not resultado.get("trechos_com_erro") and not resultado.get("json_reparado"):
+        cache_interpretacao.salvar(texto, resultado)
+
+
+class _LeituraInterpretacao:
+    """Resposta da interpretação lida em streaming: cada refeição passa pelos
+    filtros de nome (mapeamento, substituição) assim que a lista dela fecha,
+    enquanto a IA ainda escreve as próximas."""
+
+    def __init__(self):
+        self.leitor = LeitorJson()
+        self.refeicoes = {}
+        self.recebidas = set()  # nomes como a IA escreveu
+
+    def alimentar(self, s, chunk):
+        if getattr(chunk, "usage", None) is not None:
+            _registrar_uso(s, chunk)
+        if chunk.choices and chunk.choices[0].delta.content:
+            self.leitor.alimentar(chunk.choices[0].delta.content)
+            for nome, itens in self.leitor.refeicoes_concluidas():
+                self._filtrar_refeicao(nome, itens)
+
+    def interromper(self, s, erro: Exception):
+        """Streaming caiu no meio: segue com o que já chegou (se nada chegou,
+        o erro sobe)"""
+        if not self.leitor.iniciado:
+            raise erro
+        print(f"[ERRO] Streaming da interpretação interrompido ({erro.__class__.__name__}): "
+              "usando o que já chegou")
+        s.definir(interrompido=True)
+
+    def _filtrar_refeicao(self, nome: str, itens):
+        self.recebidas.add(nome)
+        if not isinstance(itens, list):
+            return
+        parcial = _filtrar_substituicoes(_filtrar_refeicoes_invalidas({"refeicoes": {nome: itens}}))
+        for destino, itens_destino in parcial["refeicoes"].items():
+            self.refeicoes.setdefault(destino, []).extend(itens_destino)
+
+    def concluir(self, ultima_tentativa: bool = True) -> dict:
+        """Dieta pós-processada. Se a resposta veio cortada e não dá para
+        saber se é semanal, retorna None (pedir de novo) ou, na última
+        tentativa, a dieta vazia de falha."""
+        resposta = self.leitor.texto()
+        with span("pos_processamento", caracteres=len(resposta), refeicoes_antecipadas=len(self.recebidas)) as s:
+            resultado = _parsear_json(resposta)
+            if resultado is None and self.refeicoes:
+                resultado = {"json_reparado": True}
+            if resultado is not None:
+                # Refeição que não fechou no streaming (resposta cortada e reparada)
+                refeicoes = resultado.get("refeicoes")
+                for nome, itens in (refeicoes.items() if isinstance(refeicoes, dict) else ()):
+                    if nome not in self.recebidas:
+                        self._filtrar_refeicao(nome, itens)
+                resultado["refeicoes"] = self.refeicoes
+                if resultado.get("json_reparado") and not _recuperar_dias(resultado):
+                    print("[ERRO] JSON cortado antes de \"dias\" e sem \"vezes\": dieta diária ou semanal?")
+                    s.definir(dias_desconhecido=True)
+                    if not ultima_tentativa:
+                        return None
+                    resultado = None
+            resultado = _pos_processar(resultado, refeicoes_filtradas=True)
+            s.definir(
+                refeicoes=len(resultado.get("refeicoes", {})),
+                itens=sum(len(itens) for itens in resultado.get("refeicoes", {}).values()),
+            )
+        return resultado
+
+
+def _pos_processar(resultado: dict, refeicoes_filtradas: bool = False) -> dict:
     if not resultado:
         print("[ERRO] Falha ao parsear JSON da IA")
         return {"fixos": [], "escolhas": [], "dias": 1, "refeicoes": {}}
 
-    # Filtrar refeições com nomes fora da lista permitida
-    resultado = _filtrar_refeicoes_invalidas(resultado)
+    # JSON cortado: o último item pode ter ficado sem nome ou quantidade
+    if resultado.get("json_reparado"):
+        resultado = _descartar_itens_incompletos(resultado)
 
-    # Filtrar refeições de substituição (por nome da refeição)
-    resultado = _filtrar_substituicoes(resultado)
+    if not refeicoes_filtradas:
+        # Filtrar refeições com nomes fora da lista permitida
+        resultado = _filtrar_refeicoes_invalidas(resultado)
+
+        # Filtrar refeições de substituição (por nome da refeição)
+        resultado = _filtrar_substituicoes(resultado)
 
     # Filtrar duplicatas de proteína/carboidrato por refeição (última linha de defesa)
     # NÃO filtrar em dietas semanais — múltiplas proteínas/carbs representam dias diferentes
@@ -384,6 +602,26 @@ def _tentar_mapear_por_similaridade(nome: str) -> str:
     return ""
 
 
+def _descartar_itens_incompletos(dieta: dict) -> dict:
+    """Remove itens sem nome ou sem quantidade (sobra do corte de um JSON reparado)"""
+    refeicoes = dieta.get("refeicoes")
+    if not isinstance(refeicoes, dict):
+        dieta["refeicoes"] = {}
+        return dieta
+    for nome, itens in list(refeicoes.items()):
+        completos = [
+            item for item in (itens if isinstance(itens, list) else [])
+            if isinstance(item, dict) and item.get("item") and item.get("quantidade")
+        ]
+        if len(completos) < len(itens if isinstance(itens, list) else []):
+            print(f"  [FILTRO] {nome}: item incompleto descartado (JSON cortado)")
+        if completos:
+            refeicoes[nome] = completos
+        else:
+            del refeicoes[nome]
+    return dieta
+
+
 def _filtrar_substituicoes(dieta: dict) -> dict:
     """Remove refeições que são substituições"""
     refeicoes = dieta.get("refeicoes", {})
@@ -414,10 +652,9 @@ def _filtrar_duplicatas_por_categoria(dieta: dict) -> dict:
         itens_filtrados = []
 
         for item in itens:
-            nome_item = item.get("item", "").lower()
-
-            eh_proteina = any(p in nome_item for p in PROTEINAS)
-            eh_carboidrato = any(c in nome_item for c in CARBOIDRATOS)
+            info = _indice_item(item.get("item", "").lower())
+            eh_proteina = info.eh_proteina
+            eh_carboidrato = info.eh_carboidrato
 
             if eh_proteina:
                 if proteina_encontrada:
@@ -449,48 +686,344 @@ def _gerar_fixos(resultado: dict) -> list:
     return fixos
 
 
+def _recuperar_dias(resultado: dict) -> bool:
+    """O "dias" vem depois de "refeicoes", então um JSON cortado quase sempre
+    o perde. Itens com "vezes" só existem em dieta semanal (dias=7); sem
+    "dias" e sem "vezes" não há como saber (False)."""
+    if "dias" in resultado:
+        return True
+    refeicoes = resultado.get("refeicoes")
+    for itens in (refeicoes.values() if isinstance(refeicoes, dict) else ()):
+        if any(isinstance(item, dict) and "vezes" in item for item in (itens if isinstance(itens, list) else ())):
+            resultado["dias"] = 7
+            return True
+    return False
+
+
+def _resposta_utilizavel(parcial: dict) -> bool:
+    """JSON de um trecho que pode ser usado: reparado só se o "dias" foi recuperado"""
+    return bool(parcial) and (not parcial.get("json_reparado") or _recuperar_dias(parcial))
+
+
+RE_CERCA_MARKDOWN = re.compile(r"```(?:json)?[ \t]*\n?(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+
+
 def _parsear_json(resposta: str) -> dict:
-    """Parseia JSON de forma robusta"""
-    resposta = resposta.strip()
+    """Parseia JSON de forma robusta: ignora cerca de markdown e texto em volta
+    e, se a resposta veio cortada, repara (marca "json_reparado")"""
+    resposta = (resposta or "").strip()
 
-    # Remover markdown
-    if "```json" in resposta:
-        resposta = resposta.split("```json")[1].split("```")[0]
-    elif "```" in resposta:
-        resposta = resposta.split("```")[1].split("```")[0]
+    # Remover markdown (cerca sem fechamento = resposta cortada)
+    cerca = RE_CERCA_MARKDOWN.search(resposta)
+    if cerca:
+        resposta = cerca.group(1)
 
     # Encontrar JSON
     inicio = resposta.find("{")
-    if inicio >= 0:
-        resposta = resposta[inicio:]
+    if inicio < 0:
+        print(f"[ERRO] JSON inválido: {resposta[:200]}")
+        return None
 
     try:
-        return json.loads(resposta)
-    except:
+        # raw_decode: ignora explicação escrita depois do JSON
+        resultado, _ = json.JSONDecoder().raw_decode(resposta, inicio)
+        return resultado if isinstance(resultado, dict) else None
+    except json.JSONDecodeError:
+        pass
+
+    leitor = LeitorJson()
+    leitor.alimentar(resposta[inicio:])
+    try:
+        resultado = json.loads(leitor.reparado())
+    except json.JSONDecodeError:
         print(f"[ERRO] JSON inválido: {resposta[:200]}")
         return None
+    if not isinstance(resultado, dict):
+        return None
+    if leitor.completo:
+        # Só vírgulas sobrando: a resposta está inteira
+        print("[INTERPRETAR] JSON com vírgulas sobrando: corrigido localmente")
+        return resultado
+    print(f"[INTERPRETAR] JSON incompleto ({len(resposta)} caracteres): reparado localmente")
+    resultado["json_reparado"] = True
+    return resultado
+
+
+# =============================================================================
+# DIETAS LONGAS: divisão por dia ou refeição, trechos interpretados em paralelo
+# =============================================================================
+
+# Abaixo disso a dieta vai inteira numa chamada só (cada trecho repete o
+# SYSTEM_INTERPRETACAO, então dividir dieta curta só gasta tokens)
+DIETA_DIVIDIR_ACIMA_CHARS = int(os.getenv("DIETA_DIVIDIR_ACIMA_CHARS", "4000"))
+DIETA_TRECHO_MIN_CHARS = int(os.getenv("DIETA_TRECHO_MIN_CHARS", "1200"))
+DIETA_MAX_TRECHOS = int(os.getenv("DIETA_MAX_TRECHOS", "8"))
+
+# Texto antes do primeiro título (nome, objetivo, "plano semanal"...): até este
+# tamanho vai junto com cada trecho como contexto
+PREAMBULO_MAX_CHARS = 500
+
+
+def _sem_acentos(texto: str) -> str:
+    return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii").lower()
+
+
+def _regex_termos(termos) -> str:
+    """'cafe manha' também casa 'café da manhã', 'pre treino' casa 'pré-treino'"""
+    return "|".join(
+        r"(?:[\s_-]+d[aeo]s?)?[\s_-]+".join(re.escape(palavra) for palavra in termo.split())
+        for termo in sorted(termos, key=len, reverse=True)
+    )
+
+
+# Mesmo vocabulário do MAPEAMENTO_REFEICOES (cafe_manha → "cafe manha" etc.)
+_TERMOS_REFEICAO = {
+    chave.replace("_", " ") for chave in REFEICOES_PERMITIDAS | MAPEAMENTO_REFEICOES.keys()
+    if not chave[-1].isdigit()
+} | {"refeicao", "pequeno almoco"}
+
+# Título = termo no começo da linha, um complemento curto ("(07h)", "- 12:30")
+# e dois-pontos ou fim da linha
+RE_TITULO_REFEICAO = re.compile(rf"^(?:{_regex_termos(_TERMOS_REFEICAO)})\b[^:\n]{{0,40}}(?::|$)")
+RE_TITULO_DIA = re.compile(
+    r"^(?:(?:segunda|terca|quarta|quinta|sexta)(?:[\s-]*feira)?|sabado|domingo|dia\s+\d{1,2}"
+    r"|(?:seg|ter|qua|qui|sex|sab|dom)\.?(?=\s*(?:[:(\-–/,]|a\s|e\s|$)))\b[^:\n]{0,40}(?::|$)"
+)
+# "Qui a Dom: repetir Seg" só faz sentido com a dieta inteira
+RE_REFERENCIA_ENTRE_DIAS = re.compile(r"\brepet|\bigual\s+a|\bmesm[oa]\s+(?:cardapio|do|da|de)\b")
+_RE_TITULO_NUMERADO = re.compile(r"^(?!refeicao|lanche|dia\b)[a-z ]+\s\d+\s*$")
+_RE_MARCADOR_LINHA = re.compile(r"^[\s#*>•·\-–—=_\d.)]*")
+_PALAVRAS_SUBSTITUICAO_SEM_ACENTO = {_sem_acentos(p).replace("_", " ").strip() for p in PALAVRAS_SUBSTITUICAO}
+
+_CONTEXTO_TRECHO = {
+    "dias": "[Trecho de uma dieta semanal. Use dias=7 e conte em \"vezes\" apenas os dias deste trecho.]",
+    "refeicoes": "[Trecho de uma dieta: extraia apenas as refeições presentes neste trecho.]",
+}
+
+
+def _normalizar_linha(linha: str) -> str:
+    """Sem marcadores de lista/markdown no começo, sem acentos, minúscula"""
+    return _sem_acentos(_RE_MARCADOR_LINHA.sub("", linha, count=1)).strip()
+
+
+def _titulo_da_linha(linha: str, regex) -> bool:
+    normalizada = _normalizar_linha(linha)
+    if not normalizada or not regex.match(normalizada):
+        return False
+    # "Substituição do almoço:" e "Almoço 2:" ficam no trecho do almoço (a IA ignora)
+    titulo = normalizada.split(":", 1)[0]
+    if _RE_TITULO_NUMERADO.match(titulo):
+        return False
+    return not any(p in titulo for p in _PALAVRAS_SUBSTITUICAO_SEM_ACENTO)
+
+
+def _cortar_em_titulos(linhas: list, regex) -> list:
+    """Índices das linhas que são título (só se houver pelo menos 2)"""
+    titulos = [i for i, linha in enumerate(linhas) if _titulo_da_linha(linha, regex)]
+    return titulos if len(titulos) >= 2 else []
+
+
+def dividir_dieta(texto: str) -> tuple:
+    """
+    Divide uma dieta longa em trechos que podem ser interpretados separadamente.
+
+    Divide por dia da semana quando houver títulos de dia (dieta semanal),
+    senão pelos títulos de refeição. Títulos consecutivos são agrupados até
+    DIETA_TRECHO_MIN_CHARS, em no máximo ~DIETA_MAX_TRECHOS trechos.
+
+    Returns:
+        (tipo, trechos): tipo é "dias", "refeicoes" ou None (dieta inteira)
+    """
+    if len(texto) <= DIETA_DIVIDIR_ACIMA_CHARS or DIETA_MAX_TRECHOS < 2:
+        return None, [texto]
+
+    linhas = texto.splitlines()
+    tipo, titulos = "dias", _cortar_em_titulos(linhas, RE_TITULO_DIA)
+    if titulos and RE_REFERENCIA_ENTRE_DIAS.search(_sem_acentos(texto)):
+        print("[INTERPRETAR] Dieta semanal com dias que repetem outros: interpretando inteira")
+        return None, [texto]
+    if not titulos:
+        tipo, titulos = "refeicoes", _cortar_em_titulos(linhas, RE_TITULO_REFEICAO)
+    if not titulos:
+        return None, [texto]
+
+    preambulo = "\n".join(linhas[:titulos[0]]).strip()
+    secoes = ["\n".join(linhas[inicio:fim]).strip() for inicio, fim in zip(titulos, titulos[1:] + [len(linhas)])]
+    if len(preambulo) > PREAMBULO_MAX_CHARS:
+        secoes[0] = preambulo + "\n" + secoes[0]
+        preambulo = ""
+
+    alvo = max(DIETA_TRECHO_MIN_CHARS, math.ceil(sum(map(len, secoes)) / DIETA_MAX_TRECHOS))
+    trechos, atual = [], []
+    for secao in secoes:
+        atual.append(secao)
+        if sum(map(len, atual)) >= alvo:
+            trechos.append("\n\n".join(atual))
+            atual = []
+    if atual:
+        # Sobra pequena vai junto com o último trecho
+        if trechos and sum(map(len, atual)) < alvo / 2:
+            trechos[-1] += "\n\n" + "\n\n".join(atual)
+        else:
+            trechos.append("\n\n".join(atual))
+    if len(trechos) < 2:
+        return None, [texto]
+
+    cabecalho = _CONTEXTO_TRECHO[tipo] + (f"\n{preambulo}" if preambulo else "")
+    return tipo, [f"{cabecalho}\n\n{trecho}" for trecho in trechos]
+
+
+def _interpretar_segmento(indice: int, segmento: str) -> dict:
+    """Interpreta um trecho; se o JSON vier inválido (ex: cortado), tenta de novo uma vez"""
+    for tentativa in range(2):
+        with span("llm.interpretacao", caracteres=len(segmento), trecho=indice, tentativa=tentativa) as s:
+            r = client.chat.completions.create(**_pedido_interpretacao(segmento))
+        parcial = _parcial_do_segmento(s, r)
+        if parcial is not None:
+            return parcial
+    return None
+
+
+async def _interpretar_segmento_async(indice: int, segmento: str) -> dict:
+    for tentativa in range(2):
+        with span("llm.interpretacao", caracteres=len(segmento), trecho=indice, tentativa=tentativa) as s:
+            r = await async_client.chat.completions.create(**_pedido_interpretacao(segmento))
+        parcial = _parcial_do_segmento(s, r)
+        if parcial is not None:
+            return parcial
+    return None
+
+
+def _parcial_do_segmento(s, resposta) -> Optional[dict]:
+    """JSON do trecho, ou None se não der para usar (pedir de novo)"""
+    _registrar_uso(s, resposta)
+    parcial = _parsear_json(resposta.choices[0].message.content)
+    return parcial if _resposta_utilizavel(parcial) else None
+
+
+def _refeicoes_do_parcial(parcial: dict) -> dict:
+    refeicoes = parcial.get("refeicoes")
+    if not isinstance(refeicoes, dict):
+        return {}
+    return {nome: itens for nome, itens in refeicoes.items() if isinstance(itens, list)}
+
+
+def _mesclar_parciais(tipo: str, parciais: list) -> dict:
+    """Junta os "refeicoes" dos trechos numa dieta só, antes dos filtros.
+
+    Por refeição: as listas são concatenadas. Por dia: o mesmo item (nome
+    normalizado + quantidade) na mesma refeição vira uma entrada só, com a
+    soma dos "vezes" de cada trecho, e a dieta fica com dias=7."""
+    if not parciais:
+        return None
+
+    refeicoes = {}
+    if tipo != "dias":
+        for parcial in parciais:
+            for nome, itens in _refeicoes_do_parcial(parcial).items():
+                refeicoes.setdefault(nome, []).extend(itens)
+        return {"refeicoes": refeicoes, "dias": max(parcial.get("dias", 1) for parcial in parciais)}
+
+    por_item = {}
+    for parcial in parciais:
+        semanal = parcial.get("dias", 1) != 1
+        for nome, itens in _refeicoes_do_parcial(parcial).items():
+            destino = refeicoes.setdefault(nome, [])
+            for item in itens:
+                if not isinstance(item, dict):
+                    continue
+                vezes = item.get("vezes", 1) if semanal else 1
+                if not isinstance(vezes, (int, float)) or vezes < 1:
+                    vezes = 1
+                chave = (nome, _normalizar_nome_item(str(item.get("item", ""))), item.get("quantidade"))
+                existente = por_item.get(chave)
+                if existente is None:
+                    por_item[chave] = {**item, "vezes": vezes}
+                    destino.append(por_item[chave])
+                else:
+                    # No máximo todos os dias da semana
+                    existente["vezes"] = min(existente["vezes"] + vezes, 7)
+    return {"refeicoes": refeicoes, "dias": 7}
+
+
+def _processar_parciais(tipo: str, parciais: list) -> dict:
+    """Mescla os trechos e aplica os mesmos filtros da dieta inteira.
+
+    Trecho sem JSON válido (None) ou cuja chamada falhou (exceção) conta em
+    trechos_com_erro; se todas as chamadas falharam, a primeira exceção sobe."""
+    erros = [parcial for parcial in parciais if isinstance(parcial, BaseException)]
+    if erros and len(erros) == len(parciais):
+        raise erros[0]
+    for erro in erros:
+        print(f"[ERRO] Trecho da interpretação falhou: {erro.__class__.__name__}: {erro}")
+    falhas = sum(1 for parcial in parciais if not isinstance(parcial, dict) or not parcial)
+    with span("pos_processamento", trechos=len(parciais), trechos_com_erro=falhas) as s:
+        if falhas:
+            print(f"[ERRO] {falhas} de {len(parciais)} trechos sem resultado")
+        validos = [parcial for parcial in parciais if isinstance(parcial, dict) and parcial]
+        mesclado = _mesclar_parciais(tipo, validos)
+        if mesclado and any(parcial.get("json_reparado") for parcial in validos):
+            mesclado["json_reparado"] = True
+        resultado = _pos_processar(mesclado)
+        if falhas:
+            resultado["trechos_com_erro"] = falhas
+        s.definir(
+            refeicoes=len(resultado.get("refeicoes", {})),
+            itens=sum(len(itens) for itens in resultado.get("refeicoes", {}).values()),
+        )
+    return resultado
 
 
 # =============================================================================
 # CHAT COM USUÁRIO
 # =============================================================================
 
+def _mensagens_chat(dieta: dict, historico: list) -> list:
+    # Contexto limitado: resumo da dieta + últimos turnos + resumo dos antigos
+    return montar_mensagens_chat(SYSTEM_CHAT, dieta, historico)
+
+
 def conversar_com_usuario(dieta: dict, historico: list) -> str:
     """Conversa com usuário"""
-    messages = [
-        {"role": "system", "content": SYSTEM_CHAT},
-        {"role": "user", "content": f"Dieta do usuário: {json.dumps(dieta, ensure_ascii=False)[:500]}"}
-    ]
-    messages.extend(historico)
+    with span("llm.chat", turnos=len(historico)) as s:
+        r = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=_mensagens_chat(dieta, historico)
+        )
+        _registrar_uso(s, r)
+
+    return r.choices[0].message.content
 
-    r = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages
-    )
+
+async def conversar_com_usuario_async(dieta: dict, historico: list) -> str:
+    """Versão assíncrona de conversar_com_usuario"""
+    with span("llm.chat", turnos=len(historico)) as s:
+        r = await async_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=_mensagens_chat(dieta, historico)
+        )
+        _registrar_uso(s, r)
 
     return r.choices[0].message.content
 
 
+async def conversar_com_usuario_stream(dieta: dict, historico: list):
+    """Versão em streaming: gera os pedaços da resposta à medida que a IA escreve"""
+    with span("llm.chat", turnos=len(historico), stream=True) as s:
+        stream = await async_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=_mensagens_chat(dieta, historico),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+
+        async for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                _registrar_uso(s, chunk)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
 # =============================================================================
 # CÁLCULO DE QUANTIDADES (100% Python)
 # =============================================================================
@@ -504,6 +1037,13 @@ def gerar_lista_compras(dieta: dict) -> list:
     2. Multiplica por 7 dias
     3. Multiplica por número de pessoas
     """
+    with span("calculo.lista", itens=sum(len(itens) for itens in dieta.get("refeicoes", {}).values())) as s:
+        lista = _calcular_lista(dieta)
+        s.definir(itens_lista=len(lista))
+    return lista
+
+
+def _calcular_lista(dieta: dict) -> list:
     refeicoes = dieta.get("refeicoes", {})
     dias = dieta.get("dias", 1)
     pessoas = dieta.get("pessoas", 1)
@@ -552,9 +1092,7 @@ def gerar_lista_compras(dieta: dict) -> list:
             # Agregar (incluir unidade na chave para NÃO misturar g com unidade)
             chave = f"{nome_norm}|{unidade}"
             # Manter o nome mais curto como display name, removendo termos de preparo
-            nome_display = re.sub(r'\s*\(?(cozid[oa]|grelh?ad[oa]|refogad[oa]|assad[oa]|desfi?ad[oa])\)?', '', nome_item, flags=re.IGNORECASE).strip()
-            if not nome_display:
-                nome_display = nome_item
+            nome_display = _nome_exibicao(nome_item)
             if "nome" not in agregado[chave] or len(nome_display) < len(agregado[chave]["nome"]):
                 agregado[chave]["nome"] = nome_display
             agregado[chave]["qtd"] += qtd_num * vezes
@@ -563,11 +1101,6 @@ def gerar_lista_compras(dieta: dict) -> list:
 
     # Mesclar entradas do mesmo item com unidades diferentes (g → unidade)
     # Ex: "banana|g" (80g) + "banana|unidade" (2 un) → "banana|unidade" (3 un)
-    PESO_MEDIO_FRUTA = {
-        "banana": 80, "maçã": 150, "laranja": 180, "mexerica": 120,
-        "manga": 300, "goiaba": 150, "pêra": 170, "pêssego": 130,
-        "kiwi": 80, "caqui": 170, "ameixa": 50, "maracujá": 120,
-    }
     nomes_no_agregado = set(k.split("|")[0] for k in agregado)
     for nome_norm in nomes_no_agregado:
         chave_g = f"{nome_norm}|g"
@@ -615,55 +1148,111 @@ def gerar_lista_compras(dieta: dict) -> list:
     return lista
 
 
+# Termos de preparo removidos do nome exibido na lista ("Frango grelhado" → "Frango")
+RE_TERMOS_PREPARO = re.compile(
+    r'\s*\(?(cozid[oa]|grelh?ad[oa]|refogad[oa]|assad[oa]|desfi?ad[oa])\)?', re.IGNORECASE
+)
+
+
+@lru_cache(maxsize=4096)
+def _nome_exibicao(nome_item: str) -> str:
+    nome_display = RE_TERMOS_PREPARO.sub('', nome_item).strip()
+    return nome_display or nome_item
+
+
+# Unidades compostas normalizadas pelo prompt da IA
+UNIDADES_COMPOSTAS = {
+    "colher_sopa": ("colher_sopa", 1),
+    "colher_cha": ("colher_cha", 1),
+    "xicara": ("xicara", 1),
+}
+
+# Unidades simples (ordem importa: mais específicas primeiro)
+ALIAS_UNIDADES = [
+    (r'colher(?:es)?\s*de\s*sopa', "colher_sopa", 1),
+    (r'colher(?:es)?\s*de\s*ch[aá]', "colher_cha", 1),
+    (r'x[ií]car[as]?', "xicara", 1),
+    (r'kg', "g", 1000),
+    (r'gramas?', "g", 1),
+    (r'ml', "ml", 1),           # ml antes de l\b para não confundir
+    (r'litros?|(?<![a-z])l(?![a-z])', "ml", 1000),
+    (r'g\b', "g", 1),
+    (r'latas?', "lata", 1),
+    (r'sach[eê]s?|envelopes?', "sache", 1),
+    (r'caixas?', "caixa", 1),
+    (r'pacotes?', "pacote", 1),
+    (r'por[çc][oõ]es?|por[çc][aã]o', "porcao", 1),
+    (r'conchas?', "g", 100),           # 1 concha ≈ 100g
+    (r'potes?', "pote", 1),
+    (r'colheres?', "colher_sopa", 1),   # colher sem especificação → sopa
+    (r'fatias?', "fatia", 1),
+    (r'unidades?|un\.?|und\.?', "unidade", 1),
+]
+_ALIAS_UNIDADES_COMPILADOS = [(re.compile(padrao), unidade, fator) for padrao, unidade, fator in ALIAS_UNIDADES]
+
+RE_NUMERO = re.compile(r'(\d+\.?\d*)')
+
+# Formato canônico pedido no SYSTEM_INTERPRETACAO ("150g", "1 colher_sopa",
+# "0.5 xicara", "2 unidades"...): número e unidade saem de um único match.
+# Cada grupo nomeado corresponde a uma entrada de _UNIDADES_CANONICAS.
+_UNIDADES_CANONICAS = {
+    "kg": ("g", 1000),
+    "g": ("g", 1),
+    "ml": ("ml", 1),
+    "l": ("ml", 1000),
+    "colher_sopa": ("colher_sopa", 1),
+    "colher_cha": ("colher_cha", 1),
+    "xicara": ("xicara", 1),
+    "unidade": ("unidade", 1),
+    "fatia": ("fatia", 1),
+    "pote": ("pote", 1),
+    "lata": ("lata", 1),
+    "sache": ("sache", 1),
+    "caixa": ("caixa", 1),
+    "pacote": ("pacote", 1),
+    "porcao": ("porcao", 1),
+    "concha": ("g", 100),
+}
+RE_QUANTIDADE_CANONICA = re.compile(
+    r'^(?P<num>\d+(?:\.\d+)?)\s*(?:'
+    r'(?P<kg>kg)|(?P<g>g|gramas?)|(?P<ml>ml)|(?P<l>l|litros?)'
+    r'|(?P<colher_sopa>colher_sopa)|(?P<colher_cha>colher_cha)|(?P<xicara>xicaras?)'
+    r'|(?P<unidade>unidades?|und?)|(?P<fatia>fatias?)|(?P<pote>potes?)|(?P<lata>latas?)'
+    r'|(?P<sache>sach[eê]s?)|(?P<caixa>caixas?)|(?P<pacote>pacotes?)'
+    r'|(?P<porcao>porç[aã]o|porcao|porç[oõ]es|porcoes)|(?P<concha>conchas?)'
+    r')$'
+)
+
+
+@lru_cache(maxsize=4096)
 def _extrair_quantidade(qtd_str: str) -> tuple:
     """Extrai número e unidade. Suporta g, kg, ml, l, unidade, xícara,
-    colher_sopa, colher_cha, fatia, pote, lata, sachê, caixa, pacote, porção."""
+    colher_sopa, colher_cha, fatia, pote, lata, sachê, caixa, pacote, porção.
+
+    Memoizado: dietas repetem "100g" e "1 unidade" o tempo todo."""
     qtd_str = qtd_str.lower().strip()
 
-    # Unidades compostas normalizadas pelo prompt da IA
-    UNIDADES_COMPOSTAS = {
-        "colher_sopa": ("colher_sopa", 1),
-        "colher_cha": ("colher_cha", 1),
-        "xicara": ("xicara", 1),
-    }
+    # Caminho rápido: formato canônico, um único match
+    match = RE_QUANTIDADE_CANONICA.match(qtd_str)
+    if match:
+        unidade_final, fator = _UNIDADES_CANONICAS[match.lastgroup]
+        return float(match.group("num")) * fator, unidade_final
 
     for alias, (unidade_final, fator) in UNIDADES_COMPOSTAS.items():
         if alias in qtd_str:
-            match = re.search(r'(\d+\.?\d*)', qtd_str)
+            match = RE_NUMERO.search(qtd_str)
             qtd = float(match.group(1)) if match else 1.0
             return qtd * fator, unidade_final
 
-    # Unidades simples (ordem importa: mais específicas primeiro)
-    ALIAS_UNIDADES = [
-        (r'colher(?:es)?\s*de\s*sopa', "colher_sopa", 1),
-        (r'colher(?:es)?\s*de\s*ch[aá]', "colher_cha", 1),
-        (r'x[ií]car[as]?', "xicara", 1),
-        (r'kg', "g", 1000),
-        (r'gramas?', "g", 1),
-        (r'ml', "ml", 1),           # ml antes de l\b para não confundir
-        (r'litros?|(?<![a-z])l(?![a-z])', "ml", 1000),
-        (r'g\b', "g", 1),
-        (r'latas?', "lata", 1),
-        (r'sach[eê]s?|envelopes?', "sache", 1),
-        (r'caixas?', "caixa", 1),
-        (r'pacotes?', "pacote", 1),
-        (r'por[çc][oõ]es?|por[çc][aã]o', "porcao", 1),
-        (r'conchas?', "g", 100),           # 1 concha ≈ 100g
-        (r'potes?', "pote", 1),
-        (r'colheres?', "colher_sopa", 1),   # colher sem especificação → sopa
-        (r'fatias?', "fatia", 1),
-        (r'unidades?|un\.?|und\.?', "unidade", 1),
-    ]
-
-    for padrao, unidade_final, fator in ALIAS_UNIDADES:
-        match_u = re.search(padrao, qtd_str)
+    for padrao, unidade_final, fator in _ALIAS_UNIDADES_COMPILADOS:
+        match_u = padrao.search(qtd_str)
         if match_u:
-            match_n = re.search(r'(\d+\.?\d*)', qtd_str)
+            match_n = RE_NUMERO.search(qtd_str)
             qtd = float(match_n.group(1)) if match_n else 1.0
             return qtd * fator, unidade_final
 
     # Fallback: só número
-    match_num = re.search(r'(\d+\.?\d*)', qtd_str)
+    match_num = RE_NUMERO.search(qtd_str)
     if match_num:
         return float(match_num.group(1)), "unidade"
 
@@ -728,11 +1317,7 @@ NORMALIZACAO_NOMES = [
 def _normalizar_nome_item(nome: str) -> str:
     """Normaliza nome do item para agregar variações corretamente.
     'Peito de frango' e 'Frango grelhado' viram 'Frango'."""
-    nome_lower = nome.lower()
-    for variacao, normalizado in NORMALIZACAO_NOMES:
-        if variacao in nome_lower:
-            return normalizado
-    return nome_lower
+    return _indice_item(nome.lower()).nome_normalizado
 
 
 # Peso médio de 1 colher de sopa por tipo de alimento (em gramas)
@@ -786,6 +1371,86 @@ FATOR_COZIDO_PARA_CRU = {
     "brocolis": 0.90,
 }
 
+# Peso médio (g) por unidade, para somar "banana|g" com "banana|unidade"
+PESO_MEDIO_FRUTA = {
+    "banana": 80, "maçã": 150, "laranja": 180, "mexerica": 120,
+    "manga": 300, "goiaba": 150, "pêra": 170, "pêssego": 130,
+    "kiwi": 80, "caqui": 170, "ameixa": 50, "maracujá": 120,
+}
+
+
+# =============================================================================
+# ÍNDICE DE ITENS: uma consulta → nome normalizado, categoria, líquido, peso
+# =============================================================================
+
+class InfoItem(NamedTuple):
+    nome_normalizado: str
+    eh_proteina: bool
+    eh_carboidrato: bool
+    liquido: bool
+    peso_colher_sopa: float  # gramas por colher de sopa (None = sem tabela)
+    eh_ovo: bool
+
+
+def _construir_indice():
+    """Compila NORMALIZACAO_NOMES, PROTEINAS, CARBOIDRATOS, LIQUIDOS e
+    PESO_COLHER_SOPA em um único automato. Cada termo guarda sua posição nas
+    tabelas originais para manter a regra "primeiro da lista vence"."""
+    atributos = {}  # termo -> dict com posições/flags
+
+    def termo(chave):
+        return atributos.setdefault(chave, {
+            "normalizacao": None, "peso": None,
+            "proteina": False, "carboidrato": False, "liquido": False, "ovo": False,
+        })
+
+    for posicao, (variacao, normalizado) in enumerate(NORMALIZACAO_NOMES):
+        info = termo(variacao)
+        if info["normalizacao"] is None:
+            info["normalizacao"] = (posicao, normalizado)
+    for posicao, (alimento, peso) in enumerate(PESO_COLHER_SOPA.items()):
+        termo(alimento)["peso"] = (posicao, peso)
+    for proteina in PROTEINAS:
+        termo(proteina)["proteina"] = True
+    for carboidrato in CARBOIDRATOS:
+        termo(carboidrato)["carboidrato"] = True
+    for liquido in LIQUIDOS:
+        termo(liquido)["liquido"] = True
+    termo("ovo")["ovo"] = True
+
+    automato = Automato(atributos)
+    return automato, [atributos[t] for t in automato.termos]
+
+
+_AUTOMATO_ITENS, _ATRIBUTOS_TERMOS = _construir_indice()
+
+
+@lru_cache(maxsize=8192)
+def _indice_item(nome_lower: str) -> InfoItem:
+    """Consulta o índice em uma passada pelo nome (já em minúsculas)"""
+    normalizacao = peso = None
+    eh_proteina = eh_carboidrato = liquido = eh_ovo = False
+
+    for indice in _AUTOMATO_ITENS.indices(nome_lower):
+        atributos = _ATRIBUTOS_TERMOS[indice]
+        if atributos["normalizacao"] and (normalizacao is None or atributos["normalizacao"] < normalizacao):
+            normalizacao = atributos["normalizacao"]
+        if atributos["peso"] and (peso is None or atributos["peso"] < peso):
+            peso = atributos["peso"]
+        eh_proteina = eh_proteina or atributos["proteina"]
+        eh_carboidrato = eh_carboidrato or atributos["carboidrato"]
+        liquido = liquido or atributos["liquido"]
+        eh_ovo = eh_ovo or atributos["ovo"]
+
+    return InfoItem(
+        nome_normalizado=normalizacao[1] if normalizacao else nome_lower,
+        eh_proteina=eh_proteina,
+        eh_carboidrato=eh_carboidrato,
+        liquido=liquido,
+        peso_colher_sopa=peso[1] if peso else None,
+        eh_ovo=eh_ovo,
+    )
+
 
 def _converter_cozido_para_cru(nome_normalizado: str, qtd: float, unidade: str) -> float:
     """Converte quantidade de alimento cozido para cru (peso de compra).
@@ -831,7 +1496,7 @@ def _arredondar_embalagem_ml(qtd_ml: float) -> str:
 
 def _formatar_quantidade(nome: str, qtd: float, unidade: str) -> str:
     """Formata quantidade para exibição, arredondando para embalagens de supermercado."""
-    nome_lower = nome.lower()
+    info = _indice_item(nome.lower())
 
     if unidade == "g":
         return _arredondar_embalagem(qtd)
@@ -842,21 +1507,20 @@ def _formatar_quantidade(nome: str, qtd: float, unidade: str) -> str:
     if unidade in ("colher_sopa", "colher_cha"):
         ml_por_colher = 15 if unidade == "colher_sopa" else 5
         # Líquidos → converter para ml
-        if any(liq in nome_lower for liq in LIQUIDOS):
+        if info.liquido:
             ml_total = qtd * ml_por_colher
             return _arredondar_embalagem_ml(ml_total)
         # Sólidos → converter para gramas
-        for alimento, peso in PESO_COLHER_SOPA.items():
-            if alimento in nome_lower:
-                gramas = qtd * peso
-                return _arredondar_embalagem(gramas)
+        if info.peso_colher_sopa:
+            gramas = qtd * info.peso_colher_sopa
+            return _arredondar_embalagem(gramas)
         # Fallback sólido: 1 colher sopa ≈ 20g
         gramas = qtd * 20
         return _arredondar_embalagem(gramas)
 
     if unidade == "unidade":
         qtd_int = int(round(qtd))
-        if "ovo" in nome_lower:
+        if info.eh_ovo:
             # Arredondar para múltiplos de 6 (meia dúzia) ou 12 (dúzia)
             if qtd_int <= 6:
                 return "6 unidades (meia dúzia)"
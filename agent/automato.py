@@ -0,0 +1,65 @@
+"""
+Automato de Aho-Corasick: encontra todas as ocorrências de um conjunto de
+termos em uma única passada pelo texto, com custo proporcional ao tamanho do
+texto (e não ao número de termos).
+
+Ao contrário de uma regex com alternativas, encontra também ocorrências
+sobrepostas ("carne" e "carne vermelha" no mesmo trecho), preservando a
+semântica de vários testes `termo in texto`.
+"""
+from collections import deque
+
+
+class Automato:
+    """Casa todos os termos de uma lista contra um texto em uma passada"""
+
+    def __init__(self, termos):
+        self.termos = list(dict.fromkeys(termos))  # sem duplicatas, ordem preservada
+        self._transicoes = [{}]
+        self._falha = [0]
+        self._saida = [[]]  # índices dos termos que terminam em cada estado
+
+        for indice, termo in enumerate(self.termos):
+            estado = 0
+            for caractere in termo:
+                proximo = self._transicoes[estado].get(caractere)
+                if proximo is None:
+                    proximo = len(self._transicoes)
+                    self._transicoes.append({})
+                    self._falha.append(0)
+                    self._saida.append([])
+                    self._transicoes[estado][caractere] = proximo
+                estado = proximo
+            self._saida[estado].append(indice)
+
+        # Links de falha em largura (BFS)
+        fila = deque(self._transicoes[0].values())
+        while fila:
+            estado = fila.popleft()
+            for caractere, proximo in self._transicoes[estado].items():
+                fila.append(proximo)
+                falha = self._falha[estado]
+                while falha and caractere not in self._transicoes[falha]:
+                    falha = self._falha[falha]
+                destino = self._transicoes[falha].get(caractere, 0)
+                self._falha[proximo] = destino if destino != proximo else 0
+                self._saida[proximo] = self._saida[proximo] + self._saida[self._falha[proximo]]
+
+    def ocorrencias(self, texto: str):
+        """Gera (posicao_final, indice_do_termo) para cada ocorrência"""
+        transicoes, falha, saida = self._transicoes, self._falha, self._saida
+        estado = 0
+        for posicao, caractere in enumerate(texto):
+            while estado and caractere not in transicoes[estado]:
+                estado = falha[estado]
+            estado = transicoes[estado].get(caractere, 0)
+            for indice in saida[estado]:
+                yield posicao, indice
+
+    def indices(self, texto: str) -> set:
+        """Índices (na lista de termos) dos termos presentes no texto"""
+        return {indice for _, indice in self.ocorrencias(texto)}
+
+    def encontrar(self, texto: str) -> set:
+        """Termos presentes no texto"""
+        return {self.termos[indice] for indice in self.indices(texto)}
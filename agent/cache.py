@@ -0,0 +1,219 @@
+"""
+Caches do agente: LRU em memória e cache persistente (SQLite) para
+interpretações de dieta.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """Cache LRU thread-safe com limite de itens e TTL opcionais.
+
+    Com max_bytes, os valores devem ser bytes/str e o total guardado também
+    fica limitado (valores maiores que o limite inteiro não são guardados)."""
+
+    def __init__(self, max_itens: int = 256, ttl: float = None, max_bytes: int = None):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _tamanho(self, valor) -> int:
+        return len(valor) if self.max_bytes else 0
+
+    def obter(self, chave):
+        with self._lock:
+            entrada = self._dados.get(chave)
+            if entrada is None:
+                self.misses += 1
+                return None
+            valor, criado_em = entrada
+            if self.ttl and time.time() - criado_em > self.ttl:
+                del self._dados[chave]
+                self.bytes -= self._tamanho(valor)
+                self.misses += 1
+                return None
+            self._dados.move_to_end(chave)
+            self.hits += 1
+            return valor
+
+    def salvar(self, chave, valor, criado_em: float = None):
+        tamanho = self._tamanho(valor)
+        if self.max_bytes and tamanho > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._dados.get(chave)
+            if anterior is not None:
+                self.bytes -= self._tamanho(anterior[0])
+            self._dados[chave] = (valor, criado_em or time.time())
+            self._dados.move_to_end(chave)
+            self.bytes += tamanho
+            while len(self._dados) > self.max_itens or (self.max_bytes and self.bytes > self.max_bytes):
+                _, (removido, _) = self._dados.popitem(last=False)
+                self.bytes -= self._tamanho(removido)
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._dados)
+
+    def estatisticas(self) -> dict:
+        estatisticas = {"itens": len(self._dados), "hits": self.hits, "misses": self.misses}
+        if self.max_bytes:
+            estatisticas["bytes"] = self.bytes
+        return estatisticas
+
+
+def normalizar_texto_dieta(texto: str) -> str:
+    """Normaliza o texto para que variações irrelevantes (espaços, quebras de
+    linha extras, forma Unicode) gerem a mesma chave de cache."""
+    texto = unicodedata.normalize("NFC", texto or "")
+    linhas = [re.sub(r"[ \t\u00a0]+", " ", linha).strip() for linha in texto.splitlines()]
+    texto = "\n".join(linhas)
+    texto = re.sub(r"\n{2,}", "\n", texto)
+    return texto.strip()
+
+
+class CacheInterpretacao:
+    """Cache de resultados de interpretar_dieta: LRU em memória na frente de
+    um arquivo SQLite, com expiração por TTL e limite de tamanho.
+
+    A chave é o hash do texto normalizado + a versão do prompt, então mudar
+    SYSTEM_INTERPRETACAO invalida automaticamente as entradas antigas.
+    """
+
+    def __init__(self, versao: str, arquivo: str = None, ttl: float = None,
+                 max_memoria: int = None, max_disco: int = None):
+        self.versao = versao
+        self.arquivo = arquivo if arquivo is not None else os.getenv(
+            "DIETA_CACHE_ARQUIVO", os.path.join(".cache", "interpretacoes.sqlite3"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("DIETA_CACHE_TTL", str(30 * 24 * 3600)))
+        self.max_disco = max_disco if max_disco is not None else int(os.getenv("DIETA_CACHE_MAX_DISCO", "5000"))
+        max_memoria = max_memoria if max_memoria is not None else int(os.getenv("DIETA_CACHE_MAX_MEMORIA", "256"))
+
+        self.memoria = CacheLRU(max_itens=max_memoria, ttl=self.ttl)
+        self.hits = 0
+        self.hits_disco = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if self.arquivo:
+            try:
+                self._conn = self._abrir_banco()
+            except Exception as e:
+                print(f"[CACHE] SQLite indisponível ({e}), usando apenas memória")
+                self._conn = None
+
+    def _abrir_banco(self):
+        pasta = os.path.dirname(self.arquivo)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        conn = sqlite3.connect(self.arquivo, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS interpretacoes ("
+            " chave TEXT PRIMARY KEY,"
+            " resultado TEXT NOT NULL,"
+            " criado_em REAL NOT NULL,"
+            " acessado_em REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_acessado ON interpretacoes (acessado_em)")
+        conn.commit()
+        return conn
+
+    def chave(self, texto: str) -> str:
+        conteudo = f"{self.versao}\0{normalizar_texto_dieta(texto)}"
+        return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+    def obter(self, texto: str):
+        """Retorna uma cópia do resultado em cache, ou None"""
+        chave = self.chave(texto)
+
+        serializado = self.memoria.obter(chave)
+        if serializado is not None:
+            self.hits += 1
+            return json.loads(serializado)
+
+        if self._conn is not None:
+            agora = time.time()
+            with self._lock:
+                linha = self._conn.execute(
+                    "SELECT resultado, criado_em FROM interpretacoes WHERE chave = ?", (chave,)
+                ).fetchone()
+                if linha and agora - linha[1] <= self.ttl:
+                    self._conn.execute(
+                        "UPDATE interpretacoes SET acessado_em = ? WHERE chave = ?", (agora, chave))
+                    self._conn.commit()
+                else:
+                    linha = None
+            if linha:
+                self.hits += 1
+                self.hits_disco += 1
+                self.memoria.salvar(chave, linha[0], criado_em=linha[1])
+                return json.loads(linha[0])
+
+        self.misses += 1
+        return None
+
+    def salvar(self, texto: str, resultado: dict):
+        chave = self.chave(texto)
+        serializado = json.dumps(resultado, ensure_ascii=False)
+        self.memoria.salvar(chave, serializado)
+
+        if self._conn is None:
+            return
+        agora = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO interpretacoes (chave, resultado, criado_em, acessado_em)"
+                " VALUES (?, ?, ?, ?)",
+                (chave, serializado, agora, agora),
+            )
+            self._expirar(agora)
+            self._conn.commit()
+
+    def _expirar(self, agora: float):
+        """Remove entradas vencidas e as menos acessadas acima do limite"""
+        self._conn.execute("DELETE FROM interpretacoes WHERE criado_em < ?", (agora - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM interpretacoes WHERE chave IN ("
+            " SELECT chave FROM interpretacoes ORDER BY acessado_em DESC LIMIT -1 OFFSET ?)",
+            (self.max_disco,),
+        )
+
+    def limpar(self):
+        self.memoria.limpar()
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM interpretacoes")
+                self._conn.commit()
+
+    def estatisticas(self) -> dict:
+        total = self.hits + self.misses
+        itens_disco = 0
+        if self._conn is not None:
+            with self._lock:
+                itens_disco = self._conn.execute("SELECT COUNT(*) FROM interpretacoes").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "hits_disco": self.hits_disco,
+            "misses": self.misses,
+            "taxa_acerto": round(self.hits / total, 3) if total else 0.0,
+            "itens_memoria": len(self.memoria),
+            "itens_disco": itens_disco,
+        }
@@ -0,0 +1,59 @@
+"""
+Coalescência de chamadas idênticas simultâneas ("single-flight").
+
+Quando a mesma dieta chega várias vezes ao mesmo tempo (plano compartilhado
+num grupo, usuário que clica de novo porque demorou), só a primeira chamada
+faz o trabalho (extração + IA); as outras aguardam o mesmo resultado. Cada
+chamador recebe a sua própria cópia, porque a dieta é alterada depois na
+sessão de cada um.
+"""
+import asyncio
+import copy
+
+from agent.tracing import span
+
+
+class Coalescedor:
+    """Junta chamadas com a mesma chave enquanto a primeira está em andamento.
+
+    O trabalho roda numa tarefa própria: se o cliente que o iniciou desistir
+    (conexão fechada), os outros que estão aguardando não são cancelados.
+    """
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self._em_andamento = {}  # chave -> asyncio.Task
+        self.executadas = 0
+        self.coalescidas = 0
+
+    async def executar(self, chave: str, fabrica):
+        """Retorna uma cópia do resultado de `await fabrica()`, chamando-a só
+        se não houver outra chamada com a mesma chave em andamento."""
+        tarefa = self._em_andamento.get(chave)
+        if tarefa is None:
+            self.executadas += 1
+            tarefa = asyncio.ensure_future(fabrica())
+            self._em_andamento[chave] = tarefa
+            tarefa.add_done_callback(lambda t: self._concluir(chave, t))
+            resultado = await asyncio.shield(tarefa)
+        else:
+            self.coalescidas += 1
+            print(f"[COALESCENCIA] {self.nome}: aguardando chamada idêntica em andamento")
+            with span(f"coalescencia.{self.nome}"):
+                resultado = await asyncio.shield(tarefa)
+        return copy.deepcopy(resultado)
+
+    def _concluir(self, chave: str, tarefa: asyncio.Task):
+        if self._em_andamento.get(chave) is tarefa:
+            del self._em_andamento[chave]
+        if not tarefa.cancelled():
+            tarefa.exception()  # evita o aviso "exception was never retrieved" se todos desistiram
+
+    def estatisticas(self) -> dict:
+        total = self.executadas + self.coalescidas
+        return {
+            "executadas": self.executadas,
+            "coalescidas": self.coalescidas,
+            "taxa_coalescencia": round(self.coalescidas / total, 3) if total else 0.0,
+            "em_andamento": len(self._em_andamento),
+        }
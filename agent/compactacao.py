@@ -0,0 +1,180 @@
+"""
+Compactação do texto da dieta antes da IA.
+
+PDFs de nutricionista repetem em toda página o cabeçalho da clínica, o
+rodapé, CRN, número da página, contatos e avisos gerais. Nada disso tem
+alimento, mas tudo vira token de entrada na interpretação. Aqui esse texto
+sai antes de chamar a IA:
+  - linhas repetidas no topo/rodapé de várias páginas (fica só a primeira)
+  - padrões conhecidos (CRN, "Página 2 de 5", e-mail, site, telefone e
+    avisos)
+  - orientação de hidratação só com água pura e sem quantidade ("Beba
+    bastante água"); "Tome água de coco", "Beba 2 litros de água" ficam
+  - espaços e linhas em branco repetidos
+
+Linhas com quantidade ("150g", "2 colheres"), alimento conhecido, marcador
+de lista ou cara de título de refeição/dia nunca são removidas por repetição.
+
+DIETA_COMPACTAR=0 desliga (útil para comparar o gasto de tokens).
+"""
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from agent.ai_parser import (
+    FRUTAS, RE_TITULO_DIA, RE_TITULO_REFEICAO, _indice_item, _normalizar_linha, _sem_acentos
+)
+from agent.tracing import span
+
+DIETA_COMPACTAR = os.getenv("DIETA_COMPACTAR", "1") != "0"
+
+# Linhas do topo e do rodapé de cada página onde cabeçalhos se repetem
+LINHAS_BORDA_PAGINA = 3
+
+# Estimativa grosseira (sem tokenizer): ~4 caracteres por token
+CARACTERES_POR_TOKEN = 4
+
+RE_QUANTIDADE_ALIMENTO = re.compile(
+    r"\d+(?:[.,]\d+)?\s*(?:g|kg|mg|ml|gramas?|colher(?:es)?|colher_\w+|fatias?|unidades?|und?|"
+    r"xic(?:aras?)?|copos?|conchas?|potes?|scoops?|latas?|porc(?:ao|oes)?|pedacos?|sache)\b"
+)
+
+# Removidas em qualquer posição
+RE_BOILERPLATE = re.compile("|".join([
+    r"\bcrn\s*-?\s*\d*\b",
+    r"[\w.+-]+@[\w-]+\.[\w.]+",                                  # e-mail
+    r"(?:https?://|www\.)\S+",                                    # site
+    r"^(?:instagram|insta|ig|whatsapp|whats)\b|^@\w+$",
+    r"(?:\+55\s*)?\(?\b\d{2}\)?\s*9?\d{4}[-\s]\d{4}\b",           # telefone
+    r"\b(?:este|esse) plano\b.*\b(?:individual|intransferivel|pessoal)\b",
+    r"\bnao (?:compartilhe|divulgue|repasse)\b",
+]))
+
+# Hidratação: só água pura ("água de coco", "água com limão" são alimento) e
+# sem número (quantidade é orientação da dieta)
+RE_HIDRATACAO = re.compile(
+    r"^(?:(?:beba|ingira|ingerir|tome|consuma)\s+(?:(?:bastante|muita|mais|bem|sempre|pelo menos)\s+)*agua"
+    r"|(?:hidratacao|ingestao (?:hidrica|de agua)))\b(?!\s*(?:de|com|e)\b)[^\d]*$"
+)
+
+# Números de página: só no topo/rodapé (um número solto no meio pode ser dado)
+RE_NUMERO_PAGINA = re.compile(
+    r"^(?:pagina|pag\.?)\s*\d+(?:\s*(?:de|/)\s*\d+)?$|^-?\s*\d{1,3}\s*(?:(?:de|/)\s*\d{1,3})?\s*-?$"
+)
+
+RE_ITEM_LISTA = re.compile(r"^[-•*·–]\s")
+
+RE_ESPACOS = re.compile(r"[ \t\u00a0]+")
+
+estatisticas_compactacao = {
+    "textos": 0,
+    "caracteres_antes": 0,
+    "caracteres_depois": 0,
+    "linhas_removidas": 0,
+    "tokens_removidos_estimados": 0,
+}
+_lock = threading.Lock()
+
+
+def _protegida(linha: str) -> bool:
+    """Linha que pode ter alimento ou estrutura da dieta (item de lista,
+    quantidade, alimento conhecido, título de refeição/dia)"""
+    if RE_ITEM_LISTA.match(linha) or RE_QUANTIDADE_ALIMENTO.search(_sem_acentos(linha)):
+        return True
+    minuscula = linha.lower()
+    info = _indice_item(minuscula)
+    if info.nome_normalizado != minuscula or info.eh_proteina or info.eh_carboidrato or info.liquido:
+        return True
+    if any(fruta in minuscula for fruta in FRUTAS):
+        return True
+    titulo = _normalizar_linha(linha)
+    return bool(titulo) and bool(RE_TITULO_REFEICAO.match(titulo) or RE_TITULO_DIA.match(titulo))
+
+
+def _chave_repeticao(linha: str) -> str:
+    """"Página 2 de 5" e "Página 3 de 5" contam como a mesma linha"""
+    return re.sub(r"\d+", "#", _sem_acentos(linha))
+
+
+def _linhas_repetidas(paginas: list) -> set:
+    """Linhas do topo/rodapé que aparecem em pelo menos metade das páginas"""
+    if len(paginas) < 2:
+        return set()
+    paginas_por_chave = Counter()
+    for linhas in paginas:
+        borda = linhas[:LINHAS_BORDA_PAGINA] + linhas[-LINHAS_BORDA_PAGINA:]
+        paginas_por_chave.update({_chave_repeticao(linha) for linha in borda})
+    minimo = max(2, math.ceil(len(paginas) / 2))
+    return {chave for chave, quantas in paginas_por_chave.items() if quantas >= minimo}
+
+
+def _compactar(paginas: list) -> tuple:
+    paginas = [
+        [RE_ESPACOS.sub(" ", linha).strip() for linha in (texto or "").splitlines()]
+        for texto in paginas
+    ]
+    paginas = [[linha for linha in linhas if linha] for linhas in paginas]
+    repetidas = _linhas_repetidas(paginas)
+
+    saida = []
+    removidas = 0
+    vistas = set()  # repetidas já mantidas uma vez (ex: cabeçalho de tabela)
+    for linhas in paginas:
+        for indice, linha in enumerate(linhas):
+            na_borda = indice < LINHAS_BORDA_PAGINA or indice >= len(linhas) - LINHAS_BORDA_PAGINA
+            normalizada = _sem_acentos(linha)
+            remover = RE_BOILERPLATE.search(normalizada) and not RE_QUANTIDADE_ALIMENTO.search(normalizada)
+            if not remover and RE_HIDRATACAO.match(normalizada):
+                remover = not _protegida(linha)
+            if not remover and na_borda:
+                remover = RE_NUMERO_PAGINA.match(normalizada)
+                chave = _chave_repeticao(linha)
+                if not remover and chave in repetidas and not _protegida(linha):
+                    remover = chave in vistas
+                    vistas.add(chave)
+            if remover:
+                removidas += 1
+            else:
+                saida.append(linha)
+        saida.append("")  # separa as páginas com uma linha em branco
+    return "\n".join(saida).strip(), removidas
+
+
+def compactar_paginas(paginas: list) -> str:
+    """Texto das páginas sem cabeçalhos/rodapés repetidos nem boilerplate"""
+    antes = sum(len(texto or "") + 1 for texto in paginas)
+    if not DIETA_COMPACTAR:
+        return "".join((texto or "") + "\n" for texto in paginas)
+
+    with span("compactacao", paginas=len(paginas), caracteres_antes=antes) as s:
+        texto, removidas = _compactar(paginas)
+        tokens_removidos = max(0, antes - len(texto)) // CARACTERES_POR_TOKEN
+        s.definir(caracteres_depois=len(texto), linhas_removidas=removidas,
+                  tokens_removidos_estimados=tokens_removidos)
+
+    with _lock:
+        estatisticas_compactacao["textos"] += 1
+        estatisticas_compactacao["caracteres_antes"] += antes
+        estatisticas_compactacao["caracteres_depois"] += len(texto)
+        estatisticas_compactacao["linhas_removidas"] += removidas
+        estatisticas_compactacao["tokens_removidos_estimados"] += tokens_removidos
+
+    if antes:
+        print(f"[COMPACTAR] {antes} → {len(texto)} caracteres (-{100 * (antes - len(texto)) / antes:.0f}%), "
+              f"{removidas} linhas removidas, ~{tokens_removidos} tokens a menos")
+    return texto
+
+
+def compactar_texto(texto: str) -> str:
+    """Para texto colado (sem páginas): só boilerplate e espaços"""
+    return compactar_paginas([texto])
+
+
+def estatisticas() -> dict:
+    with _lock:
+        dados = dict(estatisticas_compactacao)
+    antes = dados["caracteres_antes"]
+    dados["reducao"] = round(1 - dados["caracteres_depois"] / antes, 3) if antes else 0.0
+    return dados
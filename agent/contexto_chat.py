@@ -0,0 +1,118 @@
+"""
+Contexto limitado para o chat: em vez de mandar o histórico inteiro a cada
+turno, mantém o prompt do sistema, um resumo compacto da dieta e os últimos
+turnos literais. Turnos mais antigos viram um resumo acumulado (em cache),
+então o tamanho do prompt para de crescer com a conversa.
+"""
+import hashlib
+import json
+import os
+
+from agent.cache import CacheLRU
+
+# Orçamento aproximado de tokens para dieta + resumo + turnos recentes
+CHAT_MAX_TOKENS_CONTEXTO = int(os.getenv("CHAT_MAX_TOKENS_CONTEXTO", "1500"))
+# Turnos (pergunta + resposta) mantidos literalmente
+CHAT_TURNOS_RECENTES = int(os.getenv("CHAT_TURNOS_RECENTES", "4"))
+
+MAX_CHARS_DIETA = 500
+MAX_CHARS_POR_MENSAGEM_RESUMO = 160
+MAX_CHARS_RESUMO = 1200
+
+_resumos = CacheLRU(max_itens=1024)
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimativa barata (~4 caracteres por token em português)"""
+    return len(texto) // 4 + 1
+
+
+def resumir_dieta(dieta: dict) -> str:
+    """Resumo compacto da dieta: refeições com itens e as escolhas do usuário"""
+    partes = []
+    for refeicao, itens in (dieta.get("refeicoes") or {}).items():
+        nomes = ", ".join(str(item.get("item", "")) for item in itens if item.get("item"))
+        if nomes:
+            partes.append(f"{refeicao}: {nomes}")
+
+    for campo in ("dias", "pessoas", "alimentos_em_casa", "preferencia_proteina",
+                  "preferencia_carboidrato", "preferencia_frutas", "preferencias"):
+        valor = dieta.get(campo)
+        if valor:
+            if isinstance(valor, list):
+                valor = ", ".join(str(v) for v in valor)
+            partes.append(f"{campo}: {valor}")
+
+    if not partes and dieta.get("fixos"):
+        partes.append("itens: " + ", ".join(dieta["fixos"]))
+
+    return "; ".join(partes)[:MAX_CHARS_DIETA]
+
+
+def _chave(mensagens: list) -> str:
+    return hashlib.sha256(json.dumps(mensagens, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _acrescentar_ao_resumo(resumo: str, mensagens: list) -> str:
+    autores = {"user": "Usuário", "assistant": "Assistente"}
+    linhas = resumo.split("\n") if resumo else []
+    for msg in mensagens:
+        conteudo = " ".join(str(msg.get("content", "")).split())
+        if len(conteudo) > MAX_CHARS_POR_MENSAGEM_RESUMO:
+            conteudo = conteudo[:MAX_CHARS_POR_MENSAGEM_RESUMO] + "…"
+        linhas.append(f"{autores.get(msg.get('role'), msg.get('role'))}: {conteudo}")
+    # Resumo rolante: descarta as linhas mais antigas quando passa do limite
+    while len(linhas) > 1 and sum(len(linha) + 1 for linha in linhas) > MAX_CHARS_RESUMO:
+        linhas.pop(0)
+    return "\n".join(linhas)
+
+
+def resumir_turnos(antigos: list) -> str:
+    """Resumo acumulado dos turnos antigos. A cada turno só as mensagens que
+    acabaram de sair da janela são acrescentadas ao resumo do turno anterior."""
+    if not antigos:
+        return ""
+
+    chave = _chave(antigos)
+    resumo = _resumos.obter(chave)
+    if resumo is not None:
+        return resumo
+
+    # Cada turno acrescenta 2 mensagens (usuário + assistente)
+    anterior = _resumos.obter(_chave(antigos[:-2])) if len(antigos) > 2 else None
+    if anterior is not None:
+        resumo = _acrescentar_ao_resumo(anterior, antigos[-2:])
+    else:
+        resumo = _acrescentar_ao_resumo("", antigos)
+
+    _resumos.salvar(chave, resumo)
+    return resumo
+
+
+def montar_mensagens_chat(system: str, dieta: dict, historico: list,
+                          max_tokens: int = None, turnos_recentes: int = None) -> list:
+    """Monta as mensagens do chat respeitando o orçamento de tokens"""
+    max_tokens = max_tokens or CHAT_MAX_TOKENS_CONTEXTO
+    turnos_recentes = turnos_recentes if turnos_recentes is not None else CHAT_TURNOS_RECENTES
+
+    mensagens = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": f"Dieta do usuário: {resumir_dieta(dieta)}"}
+    ]
+
+    corte = max(len(historico) - 2 * turnos_recentes, 0)
+    recentes = historico[corte:]
+    orcamento = max_tokens - estimar_tokens(mensagens[1]["content"])
+
+    # Se os turnos recentes estourarem o orçamento, move os mais antigos para o
+    # resumo (sempre mantendo pelo menos a última mensagem literal)
+    while len(recentes) > 1 and sum(estimar_tokens(str(m.get("content", ""))) for m in recentes) > orcamento * 0.75:
+        corte += 1
+        recentes = historico[corte:]
+
+    resumo = resumir_turnos(historico[:corte])
+    if resumo:
+        mensagens.append({"role": "system", "content": f"Resumo da conversa até aqui:\n{resumo}"})
+
+    mensagens.extend(recentes)
+    return mensagens
@@ -0,0 +1,140 @@
+"""
+Tabela declarativa de intenções e entidades do chat.
+
+As regras que antes eram dezenas de testes `"x" in msg_lower` ficam aqui como
+dados e são compiladas uma única vez, no import, em um automato de
+Aho-Corasick. Uma passada pela mensagem retorna todas as intenções e
+entidades detectadas; adicionar vocabulário não deixa cada turno mais lento.
+"""
+import re
+from typing import NamedTuple
+
+from agent.automato import Automato
+
+# Intenção → termos que a disparam (basta um estar na mensagem)
+INTENCOES = {
+    # Correção explícita do número de dias
+    "dias_1": ["1 dia só", "dieta é de 1 dia", "só 1 dia", "apenas 1 dia"],
+    "dias_7": ["semana completa", "já é a semana", "7 dias completos"],
+    # Alimentos que já tem em casa
+    "tem_em_casa": ["já tenho", "tenho em casa", "já tem"],
+    # Preferência de proteína
+    "proteina_frango": ["só frango", "apenas frango", "prefiro frango"],
+    "proteina_carne": ["só carne", "apenas carne", "prefiro carne", "carne vermelha"],
+    "proteina_peixe": ["só peixe", "apenas peixe", "prefiro peixe"],
+    "proteina_variado": ["variar", "variado", "mix", "diferentes"],
+    # Preferência de carboidrato
+    "carboidrato_arroz": ["só arroz", "apenas arroz", "prefiro arroz"],
+    "carboidrato_batata": ["só batata", "apenas batata", "prefiro batata"],
+    "carboidrato_macarrao": ["só macarrão", "macarrao", "prefiro macarrao", "prefiro macarrão"],
+    "fala_carboidrato": ["carboidrato", "carboidratos"],
+    # Frutas e vegetais
+    "gosta": ["prefiro", "gosto de", "só"],
+    "fala_fruta": ["fruta", "frutas"],
+    "fala_vegetal": ["vegetal", "vegetais"],
+    "fala_legume": ["legume"],
+    "nao_gosta": ["não gosto", "nao gosto"],
+    "variar": ["variar", "variado"],
+    "qualquer": ["qualquer"],
+    # Preferências gerais
+    "integrais": ["integral", "integrais"],
+    "sem_lactose": ["sem lactose"],
+    "organicos": ["orgânico", "organico"],
+    # Pedido de troca de alimento
+    "troca": ["trocar", "troca", "mudar", "muda", "prefiro", "quero", "substituir", "substitui"],
+}
+
+# Alimentos comuns que o usuário pode dizer que já tem em casa
+ALIMENTOS_DETECTAVEIS = {
+    "whey": ["whey", "proteína", "suplemento"],
+    "azeite": ["azeite", "óleo", "oliva"],
+    "arroz": ["arroz"],
+    "feijão": ["feijão", "feijao"],
+    "café": ["café", "cafe"],
+    "açúcar": ["açúcar", "acucar"],
+    "sal": ["sal"],
+    "ovos": ["ovo", "ovos"],
+    "leite": ["leite"],
+    "pão": ["pão", "pao"],
+}
+
+FRUTAS_COMUNS = ["banana", "maçã", "maca", "uva", "morango", "melão", "melao", "kiwi", "abacaxi", "manga", "laranja"]
+
+# Alimento novo → alimentos da dieta que ele substitui
+TROCAS_POSSIVEIS = {
+    "pão de forma": ["pao frances", "pão francês", "pao francês", "pão frances"],
+    "pao de forma": ["pao frances", "pão francês", "pao francês", "pão frances"],
+    "pão francês": ["pao de forma", "pão de forma"],
+    "carne": ["frango", "peixe", "tilapia"],
+    "frango": ["carne", "peixe", "tilapia"],
+    "peixe": ["frango", "carne"],
+    "batata": ["arroz", "macarrão", "macarrao"],
+    "arroz": ["batata", "macarrão", "macarrao"],
+    "macarrão": ["arroz", "batata"],
+}
+
+RE_PESSOAS = re.compile(r'(\d+)\s*pessoa')
+
+
+class Deteccao(NamedTuple):
+    intencoes: frozenset
+    termos: frozenset
+    pessoas: int = None
+
+
+def _compilar():
+    termos = []
+    intencoes_por_termo = {}
+    for intencao, gatilhos in INTENCOES.items():
+        for termo in gatilhos:
+            termos.append(termo)
+            intencoes_por_termo.setdefault(termo, set()).add(intencao)
+    for variacoes in ALIMENTOS_DETECTAVEIS.values():
+        termos.extend(variacoes)
+    termos.extend(FRUTAS_COMUNS)
+    termos.extend(TROCAS_POSSIVEIS)
+    automato = Automato(termos)
+    intencoes_por_indice = [frozenset(intencoes_por_termo.get(t, ())) for t in automato.termos]
+    return automato, intencoes_por_indice
+
+
+_AUTOMATO, _INTENCOES_POR_INDICE = _compilar()
+_AUTOMATO_ALIMENTOS = Automato(v for variacoes in ALIMENTOS_DETECTAVEIS.values() for v in variacoes)
+_VARIACOES_ALIMENTOS = {base: frozenset(v) for base, v in ALIMENTOS_DETECTAVEIS.items()}
+
+
+def detectar(msg_lower: str) -> Deteccao:
+    """Uma passada pela mensagem (já em minúsculas): intenções, termos e pessoas"""
+    indices = _AUTOMATO.indices(msg_lower)
+    intencoes = set()
+    for indice in indices:
+        intencoes.update(_INTENCOES_POR_INDICE[indice])
+    match_pessoas = RE_PESSOAS.search(msg_lower)
+    return Deteccao(
+        intencoes=frozenset(intencoes),
+        termos=frozenset(_AUTOMATO.termos[i] for i in indices),
+        pessoas=int(match_pessoas.group(1)) if match_pessoas else None,
+    )
+
+
+def alimentos_mencionados(deteccao: Deteccao) -> list:
+    """Alimentos de ALIMENTOS_DETECTAVEIS citados na mensagem: [(base, variacoes)]"""
+    return [
+        (base, variacoes)
+        for base, variacoes in _VARIACOES_ALIMENTOS.items()
+        if variacoes & deteccao.termos
+    ]
+
+
+def termos_de_alimentos(texto_lower: str) -> frozenset:
+    """Variações de ALIMENTOS_DETECTAVEIS presentes em um texto (ex: um fixo)"""
+    return frozenset(_AUTOMATO_ALIMENTOS.encontrar(texto_lower))
+
+
+def frutas_mencionadas(deteccao: Deteccao) -> list:
+    return [fruta for fruta in FRUTAS_COMUNS if fruta in deteccao.termos]
+
+
+def trocas_pedidas(deteccao: Deteccao) -> list:
+    """Alimentos novos citados na mensagem: [(alimento_novo, alimentos_antigos)]"""
+    return [(novo, antigos) for novo, antigos in TROCAS_POSSIVEIS.items() if novo in deteccao.termos]
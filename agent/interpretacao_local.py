@@ -0,0 +1,372 @@
+"""
+Interpretação de dietas regulares por regras, sem IA.
+
+Boa parte das dietas já chega num formato previsível:
+
+    Almoço: 150g arroz, 120g frango grelhado, salada à vontade
+
+    Jantar:
+    - 2 colheres de sopa de arroz
+    - Filé de tilápia (150g)
+
+Para essas, o parser abaixo monta o mesmo "refeicoes" que a IA devolveria
+(quantidades já no formato canônico do SYSTEM_INTERPRETACAO) e dá uma nota
+de confiança entre 0 e 1. Abaixo de DIETA_REGRAS_CONFIANCA_MIN a dieta segue
+para a IA normalmente. Qualquer coisa que as regras não cobrem com segurança
+(dieta semanal, item sem quantidade, "1 fruta (banana, maçã ou pera)", "pão
+com queijo", texto corrido no meio das refeições) derruba a confiança.
+"""
+import os
+import re
+import threading
+import unicodedata
+from typing import Optional
+
+from agent.ai_parser import (
+    MAPEAMENTO_REFEICOES,
+    REFEICOES_PERMITIDAS,
+    RE_REFERENCIA_ENTRE_DIAS,
+    RE_TITULO_DIA,
+    RE_TITULO_REFEICAO,
+    _PALAVRAS_SUBSTITUICAO_SEM_ACENTO,
+    _AUTOMATO_ITENS,
+    _RE_TITULO_NUMERADO,
+    _indice_item,
+    _normalizar_linha,
+    _sem_acentos,
+)
+
+# 2 = desliga o caminho rápido (confiança nunca passa de 1)
+DIETA_REGRAS_CONFIANCA_MIN = float(os.getenv("DIETA_REGRAS_CONFIANCA_MIN", "0.95"))
+
+# Peso na confiança de uma linha não entendida antes da primeira refeição: se
+# ela tem número ou alimento, provavelmente é um item que ficaria de fora.
+# Dentro de uma refeição, qualquer parte não entendida já manda para a IA
+# (ela colocaria o item com quantidade estimada; as regras o perderiam)
+PESO_LINHA_DUVIDOSA = 3
+
+estatisticas_interpretacao_local = {"regras": 0, "ia": 0}
+_lock = threading.Lock()
+
+# Nomes de refeição que não estão no MAPEAMENTO_REFEICOES
+REFEICOES_EXTRAS = {
+    "cafe": "cafe_manha",
+    "pequeno_almoco": "cafe_manha",
+    "lanche_matinal": "lanche_manha",
+    "lanche_vespertino": "lanche_tarde",
+    "colacao_tarde": "lanche_tarde",
+}
+
+# Unidade escrita → (unidade canônica, fator). Ordem importa: mais específicas primeiro
+UNIDADES = [
+    (r"kg|quilos?", "g", 1000),
+    (r"gramas?|grs?|g", "g", 1),
+    (r"ml|mililitros?", "ml", 1),
+    (r"litros?|l", "ml", 1000),
+    (r"colher(?:es)?\s+(?:de\s+)?sopa|cs|c\.s\.?", "colher_sopa", 1),
+    (r"colher(?:es)?\s+(?:de\s+)?cha|cc|c\.c\.?", "colher_cha", 1),
+    (r"colher(?:es)?(?:_sopa)?", "colher_sopa", 1),
+    (r"colher(?:es)?_cha", "colher_cha", 1),
+    (r"xicaras?|xic\.?", "xicara", 1),
+    (r"copos?(?:\s+americanos?)?", "ml", 200),
+    (r"conchas?", "g", 100),
+    (r"unidades?|und?\.?|uni", "unidade", 1),
+    (r"fatias?|fts?", "fatia", 1),
+    (r"potes?(?:\s+pequenos?)?", "pote", 1),
+    (r"latas?", "lata", 1),
+    (r"saches?|envelopes?", "sache", 1),
+    (r"caixas?", "caixa", 1),
+    (r"pacotes?", "pacote", 1),
+]
+_UNIDADES_COMPILADAS = [(re.compile(padrao), unidade, fator) for padrao, unidade, fator in UNIDADES]
+
+_NUMERO = r"\d+/\d+|\d+(?:[.,]\d+)?|meia|meio|uma|um|duas|dois|tres"
+_PALAVRAS_NUMERO = {"meia": 0.5, "meio": 0.5, "um": 1, "uma": 1, "dois": 2, "duas": 2, "tres": 3}
+
+# "150g", "2 colheres de sopa", "150 a 200g", "1,5 xícara", "meia xícara", "2"
+RE_QUANTIDADE = re.compile(
+    rf"(?P<n1>{_NUMERO})(?:\s*(?:a|-|–|ou)\s*(?P<n2>\d+(?:[.,]\d+)?))?"
+    rf"\s*(?P<unidade>{'|'.join(padrao for padrao, _, _ in UNIDADES)})?\.?(?![a-z])"
+)
+RE_A_VONTADE = re.compile(r"\s*[-–(]?\s*\b(?:a vontade|livre|sem restricao)\b\s*\)?\s*")
+RE_MARCADOR = re.compile(r"^\s*(?:[-•*·–>]+\s*|\d+[.)]\s+)")
+RE_ALTERNATIVA = re.compile(r"\s+ou\s+")
+RE_BARRA = re.compile(r"\s/\s|\|")
+RE_SEMANAL = re.compile(r"\bsemana")
+RE_INICIO_SUBSTITUICAO = re.compile(r"^(?:substitu|alternativ|opc(?:ao|oes)\b|variac|troca|pode trocar|ou entao)")
+RE_HORARIO = re.compile(r"\(.*?\)|\b\d{1,2}\s*(?:[:h]\s*\d{0,2})\s*(?:h|hs|min)?\b")
+
+# Nomes que pedem escolha ("1 fruta", "1 porção de proteína"): quem decide é a IA
+NOMES_GENERICOS = {"fruta", "frutas", "proteina", "proteinas", "carboidrato", "carboidratos",
+                   "legume", "legumes", "verdura", "verduras", "opcao", "opcoes"}
+
+# "1 porção de frango", "1 prato de salada": a IA estima em gramas
+RE_MEDIDA_IMPRECISA = re.compile(r"\b(?:porc(?:ao|oes)|pratos?|pedac(?:o|os|inhos?))\b")
+
+# "Pão integral com queijo branco", "arroz e feijão": mais de um alimento num
+# nome só; as regras os juntariam num item e o segundo sumiria da lista
+RE_CONECTOR = re.compile(r"\s(?:com|e|mais)\s|[+/&]")
+
+
+def _espelho(texto: str) -> str:
+    """Minúsculo e sem acentos, com o mesmo comprimento do original (para
+    recortar o nome do alimento do texto original, com acentos)"""
+    return "".join(c if len(s) != 1 else s for c, s in ((c, _sem_acentos(c)) for c in texto))
+
+
+def _numero(texto: str) -> float:
+    if texto in _PALAVRAS_NUMERO:
+        return _PALAVRAS_NUMERO[texto]
+    if "/" in texto:
+        numerador, denominador = texto.split("/")
+        return int(numerador) / int(denominador) if int(denominador) else 0
+    return float(texto.replace(",", "."))
+
+
+def _formatar_numero(valor: float) -> str:
+    return str(int(valor)) if valor == int(valor) else str(round(valor, 2))
+
+
+def _quantidade_canonica(match) -> Optional[str]:
+    """Quantidade no formato do SYSTEM_INTERPRETACAO ("150g", "1 colher_sopa")"""
+    valor = _numero(match.group("n1"))
+    if match.group("n2"):
+        valor = max(valor, _numero(match.group("n2")))  # faixa: pega o maior
+    if valor <= 0:
+        return None
+
+    unidade, fator = "unidade", 1
+    if match.group("unidade"):
+        for padrao, canonica, fator_unidade in _UNIDADES_COMPILADAS:
+            if padrao.fullmatch(match.group("unidade")):
+                unidade, fator = canonica, fator_unidade
+                break
+    valor *= fator
+
+    if unidade in ("g", "ml"):
+        return f"{_formatar_numero(valor)}{unidade}"
+    if unidade in ("unidade", "fatia") and valor != 1:
+        return f"{_formatar_numero(valor)} {unidade}s"
+    return f"{_formatar_numero(valor)} {unidade}"
+
+
+def _quantidade_do_trecho(trecho: str) -> Optional[str]:
+    """Quantidade de um trecho que é só quantidade ("150g", "1 scoop/30g")"""
+    for parte in re.split(r"\s*[/=]\s*", trecho.strip()):
+        match = RE_QUANTIDADE.fullmatch(parte.strip())
+        if match and (match.group("unidade") or not re.search(r"[a-z]", parte)):
+            return _quantidade_canonica(match)
+    return None
+
+
+def _nome_limpo(nome: str) -> str:
+    nome = re.sub(r"^(?:de|do|da|dos|das)\s+", "", nome.strip(" .,;:-–"), flags=re.IGNORECASE).strip()
+    return nome[:1].upper() + nome[1:]
+
+
+def _parsear_item(texto: str) -> Optional[dict]:
+    """Um item ("150g arroz", "Arroz (4 colheres de sopa)", "Frango - 150g").
+    Retorna {"item", "quantidade"} ou None se não der para ter certeza."""
+    texto = RE_MARCADOR.sub("", texto).strip()
+    espelho = _espelho(texto.lower())
+    if RE_MEDIDA_IMPRECISA.search(espelho):
+        return None
+
+    # "1 fruta (banana, maçã ou pera)": escolha dentro do parêntese
+    for parentese in re.findall(r"\(([^)]*)\)", espelho):
+        if not re.search(r"\d", parentese) and ("," in parentese or " ou " in parentese):
+            return None
+
+    # "X / Y" tanto pode ser alternativa quanto lista de itens: fica com a IA
+    if RE_BARRA.search(re.sub(r"\([^)]*\)", "", espelho)):
+        return None
+    # "X ou Y": só o primeiro (mesma regra do prompt)
+    alternativa = RE_ALTERNATIVA.search(espelho)
+    if alternativa:
+        texto, espelho = texto[:alternativa.start()], espelho[:alternativa.start()]
+
+    a_vontade = RE_A_VONTADE.search(espelho)
+    if a_vontade:
+        nome = _nome_limpo(texto[:a_vontade.start()] + " " + texto[a_vontade.end():])
+        return {"item": nome, "quantidade": "a vontade"} if _nome_valido(nome) else None
+
+    nome = quantidade = None
+    # Quantidade na frente: "150g arroz", "2 colheres de sopa de aveia", "2 ovos"
+    match = RE_QUANTIDADE.match(espelho)
+    if match and match.end() < len(espelho):
+        nome, quantidade = texto[match.end():], _quantidade_canonica(match)
+    else:
+        # Quantidade atrás: "Arroz (4 colheres de sopa)", "Frango - 150g", "Frango 150g"
+        atras = (re.match(r"^(?P<nome>.+?)\s*\((?P<qtd>[^)]*\d[^)]*)\)\s*$", espelho)
+                 or re.match(r"^(?P<nome>.+?)\s*[-–:=]\s*(?P<qtd>\d.*)$", espelho)
+                 or re.match(r"^(?P<nome>.+?)\s+(?P<qtd>\d[\d.,]*\s*(?:kg|g|ml|l)\b.*)$", espelho))
+        if atras:
+            nome, quantidade = texto[:atras.end("nome")], _quantidade_do_trecho(atras.group("qtd"))
+
+    if not quantidade or nome is None:
+        return None
+    nome = _nome_limpo(nome)
+    return {"item": nome, "quantidade": quantidade} if _nome_valido(nome) else None
+
+
+def _nome_valido(nome: str) -> bool:
+    if not nome or len(nome) > 60 or re.search(r"\d|[()]", nome):
+        return False
+    sem_acentos = _sem_acentos(nome)
+    if RE_CONECTOR.search(sem_acentos) or _alimentos_no_nome(nome.lower()) > 1:
+        return False
+    return sem_acentos not in NOMES_GENERICOS
+
+
+def _alimentos_no_nome(nome_lower: str) -> int:
+    """Alimentos do índice no nome, sem contar termo dentro de outro
+    ("frango" em "peito de frango" conta uma vez só)"""
+    trechos = sorted(
+        (fim - len(_AUTOMATO_ITENS.termos[indice]) + 1, fim)
+        for fim, indice in _AUTOMATO_ITENS.ocorrencias(nome_lower)
+    )
+    alimentos, ate = 0, -1
+    for inicio, fim in trechos:
+        if inicio > ate:
+            alimentos += 1
+        ate = max(ate, fim)
+    return alimentos
+
+
+def _chave_refeicao(titulo: str) -> Optional[str]:
+    """'Café da manhã (7h)' → 'cafe_manha'; None se não souber qual é"""
+    palavras = re.findall(r"[a-z0-9]+", RE_HORARIO.sub(" ", _normalizar_linha(titulo)))
+    candidatos = []
+    for quantas in range(len(palavras), 0, -1):
+        inicio = palavras[:quantas]
+        candidatos.append("_".join(inicio))
+        candidatos.append("_".join(p for p in inicio if p not in ("da", "de", "do", "das", "dos")))
+    for chave in candidatos:
+        if chave in REFEICOES_PERMITIDAS:
+            return chave
+        destino = MAPEAMENTO_REFEICOES.get(chave) or REFEICOES_EXTRAS.get(chave)
+        if destino:
+            return destino
+    return None
+
+
+def _eh_substituicao(titulo: str) -> bool:
+    titulo = _normalizar_linha(titulo)
+    if _RE_TITULO_NUMERADO.match(titulo):  # "Almoço 2"
+        return True
+    return any(palavra in titulo for palavra in _PALAVRAS_SUBSTITUICAO_SEM_ACENTO)
+
+
+def _partes(texto: str) -> list:
+    """Separa "arroz, feijão + salada" fora de parênteses ("1,5 xícara" fica inteiro)"""
+    partes, atual, profundidade = [], [], 0
+    for pos, c in enumerate(texto):
+        if c == "(":
+            profundidade += 1
+        elif c == ")":
+            profundidade = max(0, profundidade - 1)
+        decimal = c == "," and texto[pos - 1:pos].isdigit() and texto[pos + 1:pos + 2].isdigit()
+        if profundidade == 0 and c in ",;+" and not decimal:
+            partes.append("".join(atual))
+            atual = []
+        else:
+            atual.append(c)
+    partes.append("".join(atual))
+    return [parte.strip() for parte in partes if parte.strip()]
+
+
+def _duvidosa(linha: str) -> int:
+    """Peso de uma linha que as regras não entenderam"""
+    if re.search(r"\d", linha):
+        return PESO_LINHA_DUVIDOSA
+    info = _indice_item(linha.lower())
+    if info.nome_normalizado != linha.lower() or info.eh_proteina or info.eh_carboidrato or info.liquido:
+        return PESO_LINHA_DUVIDOSA
+    return 1
+
+
+def interpretar_localmente(texto: str) -> tuple:
+    """
+    Interpreta a dieta só com regras.
+
+    Returns:
+        (dieta, confianca): dieta no formato {"refeicoes": ..., "dias": 1}
+        (ou None) e confiança entre 0 e 1
+    """
+    texto = unicodedata.normalize("NFC", texto or "")
+    sem_acentos = _sem_acentos(texto)
+    if RE_SEMANAL.search(sem_acentos) or RE_REFERENCIA_ENTRE_DIAS.search(sem_acentos):
+        return None, 0.0  # "vezes" por dia da semana: só a IA conta
+
+    refeicoes = {}
+    atual = None
+    ignorando = False
+    entendidos = duvidosos = 0
+    itens_por_titulo = []  # título de refeição sem nenhum item = algo que as regras não leram
+
+    for linha in texto.splitlines():
+        linha = linha.strip()
+        if not linha:
+            continue
+        normalizada = _normalizar_linha(linha)
+
+        if RE_TITULO_DIA.match(normalizada):
+            return None, 0.0
+        if RE_TITULO_REFEICAO.match(normalizada):
+            titulo, _, resto = linha.partition(":")
+            if _eh_substituicao(titulo):
+                atual, ignorando = None, True
+                continue
+            atual, ignorando = _chave_refeicao(titulo), False
+            if atual is None:
+                return None, 0.0
+            refeicoes.setdefault(atual, [])
+            itens_por_titulo.append(0)
+            linha = resto.strip()
+            if not linha:
+                continue
+        elif RE_INICIO_SUBSTITUICAO.match(normalizada):
+            # "Substituição:", "Opção 2", "Pode trocar por..." até a próxima refeição
+            atual, ignorando = None, True
+            continue
+
+        if ignorando:
+            continue
+        if atual is None:
+            # Antes da primeira refeição: título, nome do paciente...
+            if RE_QUANTIDADE.search(_sem_acentos(linha)) and _duvidosa(linha) > 1:
+                duvidosos += PESO_LINHA_DUVIDOSA
+            continue
+
+        for parte in _partes(linha):
+            item = _parsear_item(parte)
+            if item is None:
+                return None, 0.0
+            refeicoes[atual].append(item)
+            itens_por_titulo[-1] += 1
+            entendidos += 1
+
+    if entendidos < 2 or 0 in itens_por_titulo:
+        return None, 0.0
+    return {"refeicoes": refeicoes, "dias": 1}, entendidos / (entendidos + duvidosos)
+
+
+def tentar_interpretar(texto: str) -> tuple:
+    """Dieta interpretada por regras se a confiança for alta, senão None (IA)"""
+    dieta, confianca = interpretar_localmente(texto)
+    rapido = dieta is not None and confianca >= DIETA_REGRAS_CONFIANCA_MIN
+    with _lock:
+        estatisticas_interpretacao_local["regras" if rapido else "ia"] += 1
+    if rapido:
+        print(f"[INTERPRETAR] Dieta regular: interpretada por regras (confiança {confianca:.2f}), sem IA")
+    elif dieta is not None:
+        print(f"[INTERPRETAR] Regras com confiança {confianca:.2f}: usando a IA")
+    return dieta if rapido else None, confianca
+
+
+def estatisticas() -> dict:
+    with _lock:
+        dados = dict(estatisticas_interpretacao_local)
+    total = dados["regras"] + dados["ia"]
+    dados["taxa_caminho_rapido"] = round(dados["regras"] / total, 3) if total else 0.0
+    return dados
@@ -0,0 +1,185 @@
+"""
+Leitura incremental e reparo de JSON vindo da IA.
+
+A interpretação chega em streaming; o LeitorJson acompanha a estrutura
+caractere a caractere (sem reparsear o texto a cada pedaço) e entrega cada
+refeição de "refeicoes" assim que a lista dela fecha, enquanto a IA ainda
+escreve as próximas.
+
+Se a resposta vier cortada (limite de tokens, conexão caída), reparar_json
+corta no último valor completo (string ou número pela metade fica de fora)
+e fecha as listas e objetos abertos:
+
+    {"refeicoes": {"almoco": [{"item": "Arroz", "quantidade": "4 col
+    → {"refeicoes": {"almoco": [{"item": "Arroz"}]}}
+
+Vírgulas sobrando ("[1, 2,]", "{"a": 1,}"), que a IA às vezes escreve mesmo
+com o JSON completo, também são removidas.
+"""
+import json
+import re
+
+_FECHA = {"{": "}", "[": "]"}
+_FIM_ESCALAR = set(",}] \t\r\n")
+_RE_VIRGULA_SOBRANDO = re.compile(r",\s*[}\]]")
+
+
+class _Nivel:
+    __slots__ = ("tipo", "esperando_chave", "chave", "captura")
+
+    def __init__(self, tipo: str):
+        self.tipo = tipo
+        self.esperando_chave = tipo == "{"
+        self.chave = None
+        self.captura = None  # (nome da refeição, início da lista) em refeicoes.<nome>
+
+
+class LeitorJson:
+    """Lê o JSON da IA em pedaços. Texto antes do primeiro "{" (cerca de
+    markdown, explicação) e depois do objeto raiz é ignorado."""
+
+    def __init__(self):
+        self._pedacos = []
+        self._pos = 0  # caracteres já lidos
+        self._pilha = []
+        self._em_string = False
+        self._escape = False
+        self._string_eh_chave = False
+        self._chave = []
+        self._em_escalar = False
+        self._inicio = None
+        self._fim = None
+        # Último ponto onde o texto pode ser cortado e fechado: (posição, fechamentos)
+        self._seguro = None
+        self._refeicoes = []
+
+    @property
+    def iniciado(self) -> bool:
+        """Já chegou o "{" do objeto raiz"""
+        return self._inicio is not None
+
+    @property
+    def completo(self) -> bool:
+        return self._fim is not None
+
+    def texto(self) -> str:
+        # Junta só quando pedido (fim de refeição, fim da resposta): concatenar
+        # a cada pedaço deixaria a leitura quadrática
+        if len(self._pedacos) > 1:
+            self._pedacos = ["".join(self._pedacos)]
+        return self._pedacos[0] if self._pedacos else ""
+
+    def alimentar(self, pedaco: str):
+        self._pedacos.append(pedaco)
+        if self._fim is None:
+            self._ler(pedaco)
+
+    def refeicoes_concluidas(self) -> list:
+        """(nome, itens) das refeições que fecharam desde a última chamada"""
+        prontas, self._refeicoes = self._refeicoes, []
+        return prontas
+
+    def reparado(self) -> str:
+        """JSON válido com o que chegou até agora (None se nem começou)"""
+        if self._inicio is None:
+            return None
+        if self._fim is not None:
+            return sem_virgulas_sobrando(self.texto()[self._inicio:self._fim])
+        # Número/literal no fim pode estar cortado ("12" de "120"): fica de fora
+        posicao, fechamentos = self._seguro
+        return sem_virgulas_sobrando(self.texto()[self._inicio:posicao] + fechamentos)
+
+    def _marcar_seguro(self, posicao: int):
+        self._seguro = (posicao, "".join(_FECHA[nivel.tipo] for nivel in reversed(self._pilha)))
+
+    def _ler(self, pedaco: str):
+        pilha = self._pilha
+        for pos, c in enumerate(pedaco, self._pos):
+
+            if self._inicio is None:
+                if c == "{":
+                    self._inicio = pos
+                    pilha.append(_Nivel("{"))
+                    self._marcar_seguro(pos + 1)
+                continue
+
+            if self._em_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._em_string = False
+                    if self._string_eh_chave:
+                        pilha[-1].chave = json.loads('"' + "".join(self._chave) + '"', strict=False)
+                    else:
+                        self._marcar_seguro(pos + 1)
+                    continue
+                if self._string_eh_chave:
+                    self._chave.append(c)
+                continue
+
+            if self._em_escalar and c in _FIM_ESCALAR:
+                self._em_escalar = False
+                self._marcar_seguro(pos)
+
+            if c == '"':
+                self._em_string = True
+                self._string_eh_chave = pilha[-1].tipo == "{" and pilha[-1].esperando_chave
+                self._chave = []
+            elif c in "{[":
+                nivel = _Nivel(c)
+                if (c == "[" and len(pilha) == 2 and pilha[0].chave == "refeicoes"
+                        and pilha[1].tipo == "{" and pilha[1].chave is not None):
+                    nivel.captura = (pilha[1].chave, pos)
+                pilha.append(nivel)
+                self._marcar_seguro(pos + 1)
+            elif c in "}]":
+                nivel = pilha.pop()
+                if nivel.captura is not None:
+                    nome, inicio = nivel.captura
+                    try:
+                        self._refeicoes.append((nome, json.loads(sem_virgulas_sobrando(self.texto()[inicio:pos + 1]))))
+                    except json.JSONDecodeError:
+                        pass  # lista malformada: fica para o parse final
+                if not pilha:
+                    self._fim = pos + 1
+                    return
+                self._marcar_seguro(pos + 1)
+            elif c == ":":
+                pilha[-1].esperando_chave = False
+            elif c == ",":
+                if pilha[-1].tipo == "{":
+                    pilha[-1].esperando_chave = True
+            elif not c.isspace():
+                self._em_escalar = True
+        self._pos += len(pedaco)
+
+
+def sem_virgulas_sobrando(texto: str) -> str:
+    """Remove "," seguida só de espaços e "}"/"]" (fora de strings)"""
+    if "," not in texto:
+        return texto
+    saida = []
+    em_string = escape = False
+    for pos, c in enumerate(texto):
+        if em_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                em_string = False
+        elif c == '"':
+            em_string = True
+        elif c == "," and _RE_VIRGULA_SOBRANDO.match(texto, pos):
+            continue
+        saida.append(c)
+    return "".join(saida)
+
+
+def reparar_json(texto: str) -> str:
+    """Fecha o JSON cortado no último valor completo (None se não há objeto)"""
+    leitor = LeitorJson()
+    leitor.alimentar(texto)
+    return leitor.reparado()
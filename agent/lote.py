@@ -0,0 +1,282 @@
+"""
+Geração de listas de compras em lote.
+
+Quando uma tabela de conversão muda (FATOR_COZIDO_PARA_CRU, embalagens...)
+é preciso recalcular as listas de milhares de dietas salvas. Em vez de rodar
+gerar_lista_compras dieta por dieta, os itens de todas as dietas viram colunas
+(grupo nome|unidade, quantidade, fator cozido→cru, vezes) e a conversão, a
+soma por grupo e os multiplicadores de dias/pessoas são feitos sobre as
+colunas inteiras — com NumPy se estiver instalado, em Python puro se não.
+Textos repetidos ("100g", "Arroz cozido") são analisados uma vez só.
+
+O resultado é o mesmo de gerar_lista_compras (sem os prints por item); no
+"motivo", as refeições aparecem na ordem da dieta.
+
+Linha de comando (uma dieta JSON por linha, usa todos os núcleos):
+    python -m agent.lote dietas.jsonl listas.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from collections import deque
+
+from agent.ai_parser import (
+    FATOR_COZIDO_PARA_CRU,
+    PESO_MEDIO_FRUTA,
+    _extrair_quantidade,
+    _formatar_quantidade,
+    _nome_exibicao,
+    _normalizar_nome_item,
+)
+from agent.workers import WORKERS_CPU, encerrar_pool, executar_em_processo, obter_pool
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Dietas por tarefa enviada ao pool na linha de comando
+LOTE_DIETAS_POR_TAREFA = int(os.getenv("LOTE_DIETAS_POR_TAREFA", "500"))
+
+
+class _Colunas:
+    """Itens de todas as dietas do lote, achatados em listas paralelas"""
+
+    def __init__(self):
+        # Por item
+        self.grupo = []
+        self.qtd = []
+        self.fator = []
+        self.vezes = []
+        # Por grupo (dieta, nome normalizado, unidade), na ordem de aparição
+        self.chaves = {}
+        self.dieta_do_grupo = []
+        self.nome_do_grupo = []
+        self.unidade_do_grupo = []
+        self.exibicao = []
+        self.refeicoes = []
+        # Por dieta
+        self.multiplicador = []
+        self.pessoas = []
+
+
+def _itens_da_dieta(dieta: dict) -> list:
+    """Itens válidos da dieta já analisados: (refeição, nome normalizado,
+    unidade, nome exibido, qtd, fator cozido→cru, vezes)"""
+    alimentos_em_casa = [a.lower() for a in dieta.get("alimentos_em_casa", [])]
+    itens_validos = []
+    for nome_refeicao, itens in dieta.get("refeicoes", {}).items():
+        for item in itens:
+            nome_item = item.get("item", "").strip()
+            qtd_str = item.get("quantidade", "").strip().lower()
+
+            if not nome_item or "vontade" in qtd_str or not qtd_str:
+                continue
+            if any(casa in nome_item.lower() for casa in alimentos_em_casa):
+                continue
+
+            qtd_num, unidade = _extrair_quantidade(qtd_str)
+            nome_norm = _normalizar_nome_item(nome_item)
+            fator = FATOR_COZIDO_PARA_CRU.get(nome_norm, 1.0) if unidade == "g" else 1.0
+            itens_validos.append((nome_refeicao, nome_norm, unidade, _nome_exibicao(nome_item),
+                                  qtd_num, fator, float(item.get("vezes", 1))))
+    return itens_validos
+
+
+def _acrescentar_dieta(colunas: _Colunas, indice: int, dieta: dict, itens: list):
+    # Mesma regra de gerar_lista_compras: dieta diária → ×7
+    colunas.multiplicador.append(7 if dieta.get("dias", 1) == 1 else 1)
+    colunas.pessoas.append(float(dieta.get("pessoas", 1)))
+
+    for nome_refeicao, nome_norm, unidade, nome_display, qtd, fator, vezes in itens:
+        chave = (indice, nome_norm, unidade)
+        grupo = colunas.chaves.get(chave)
+        if grupo is None:
+            grupo = colunas.chaves[chave] = len(colunas.dieta_do_grupo)
+            colunas.dieta_do_grupo.append(indice)
+            colunas.nome_do_grupo.append(nome_norm)
+            colunas.unidade_do_grupo.append(unidade)
+            colunas.exibicao.append(nome_display)
+            colunas.refeicoes.append({})
+        elif len(nome_display) < len(colunas.exibicao[grupo]):
+            colunas.exibicao[grupo] = nome_display
+        colunas.refeicoes[grupo][nome_refeicao] = True
+
+        colunas.grupo.append(grupo)
+        colunas.qtd.append(qtd)
+        colunas.fator.append(fator)
+        colunas.vezes.append(vezes)
+
+
+def _somar_por_grupo(colunas: _Colunas) -> list:
+    """Σ qtd × fator × vezes por grupo (mesma ordem de soma do cálculo unitário)"""
+    total_grupos = len(colunas.dieta_do_grupo)
+    if NUMPY_AVAILABLE and colunas.grupo:
+        valores = np.asarray(colunas.qtd) * np.asarray(colunas.fator) * np.asarray(colunas.vezes)
+        return np.bincount(colunas.grupo, weights=valores, minlength=total_grupos).tolist()
+
+    somas = [0.0] * total_grupos
+    for grupo, qtd, fator, vezes in zip(colunas.grupo, colunas.qtd, colunas.fator, colunas.vezes):
+        somas[grupo] += qtd * fator * vezes
+    return somas
+
+
+def _mesclar_frutas(colunas: _Colunas, somas: list) -> set:
+    """Soma "banana|g" em "banana|unidade" pelo peso médio. Retorna os grupos
+    em gramas que foram absorvidos."""
+    absorvidos = set()
+    for (indice, nome_norm, unidade), grupo_g in colunas.chaves.items():
+        if unidade != "g" or nome_norm not in PESO_MEDIO_FRUTA:
+            continue
+        grupo_un = colunas.chaves.get((indice, nome_norm, "unidade"))
+        if grupo_un is None:
+            continue
+        somas[grupo_un] += somas[grupo_g] / PESO_MEDIO_FRUTA[nome_norm]
+        colunas.refeicoes[grupo_un].update(colunas.refeicoes[grupo_g])
+        if len(colunas.exibicao[grupo_g]) < len(colunas.exibicao[grupo_un]):
+            colunas.exibicao[grupo_un] = colunas.exibicao[grupo_g]
+        absorvidos.add(grupo_g)
+    return absorvidos
+
+
+def _quantidades_semanais(colunas: _Colunas, somas: list) -> list:
+    multiplicadores = [colunas.multiplicador[d] for d in colunas.dieta_do_grupo]
+    pessoas = [colunas.pessoas[d] for d in colunas.dieta_do_grupo]
+    if NUMPY_AVAILABLE and somas:
+        return (np.asarray(somas) * np.asarray(multiplicadores, dtype=float) * np.asarray(pessoas)).tolist()
+    return [soma * mult * p for soma, mult, p in zip(somas, multiplicadores, pessoas)]
+
+
+def gerar_listas_em_lote(dietas: list) -> list:
+    """
+    Gera as listas de compras de várias dietas de uma vez.
+
+    Retorna uma entrada por dieta, na mesma ordem: a lista de compras, ou
+    {"erro": ..., "detalhes": ...} se aquela dieta for inválida (as demais
+    seguem normalmente).
+    """
+    colunas = _Colunas()
+    erros = {}
+    for indice, dieta in enumerate(dietas):
+        try:
+            itens = _itens_da_dieta(dieta)
+            float(dieta.get("pessoas", 1))  # pessoas precisa ser numérico
+        except Exception as e:
+            erros[indice] = {"erro": "Dieta inválida", "detalhes": str(e)}
+            itens, dieta = [], {}
+        _acrescentar_dieta(colunas, indice, dieta, itens)
+
+    somas = _somar_por_grupo(colunas)
+    absorvidos = _mesclar_frutas(colunas, somas)
+    semanais = _quantidades_semanais(colunas, somas)
+
+    listas = [erros.get(indice, []) for indice in range(len(dietas))]
+    for grupo, indice in enumerate(colunas.dieta_do_grupo):
+        if grupo in absorvidos:
+            continue
+        multiplicador = colunas.multiplicador[indice]
+        pessoas = dietas[indice].get("pessoas", 1)
+        listas[indice].append({
+            "nome": colunas.exibicao[grupo],
+            "quantidade": _formatar_quantidade(colunas.nome_do_grupo[grupo], semanais[grupo],
+                                               colunas.unidade_do_grupo[grupo]),
+            "motivo": f"{'+'.join(colunas.refeicoes[grupo])} ({somas[grupo]:.0f}/dia × "
+                      f"{multiplicador} dias × {pessoas} pessoa(s))",
+        })
+    return listas
+
+
+async def gerar_listas_em_lote_async(dietas: list, por_tarefa: int = None) -> list:
+    """Divide o lote em blocos e processa em paralelo no pool de processos"""
+    por_tarefa = max(por_tarefa or LOTE_DIETAS_POR_TAREFA, 1)
+    if len(dietas) <= por_tarefa:
+        return await executar_em_processo(gerar_listas_em_lote, dietas)
+
+    blocos = [dietas[i:i + por_tarefa] for i in range(0, len(dietas), por_tarefa)]
+    resultados = await asyncio.gather(*(executar_em_processo(gerar_listas_em_lote, bloco) for bloco in blocos))
+    return [lista for resultado in resultados for lista in resultado]
+
+
+# =============================================================================
+# LINHA DE COMANDO: recálculo offline a partir de JSONL
+# =============================================================================
+
+def _processar_linhas(linhas: list) -> list:
+    """Executado no pool: linhas JSONL → linhas de saída (JSON)"""
+    entradas, dietas, saidas = [], [], []
+    for numero, linha in linhas:
+        try:
+            registro = json.loads(linha)
+        except json.JSONDecodeError as e:
+            saidas.append((numero, {"linha": numero, "erro": "JSON inválido", "detalhes": str(e)}))
+            continue
+        # Aceita a dieta pura ou {"id": ..., "dieta": {...}}
+        dieta = registro.get("dieta", registro) if isinstance(registro, dict) else registro
+        entradas.append((numero, registro))
+        dietas.append(dieta)
+
+    for (numero, registro), lista in zip(entradas, gerar_listas_em_lote(dietas)):
+        saida = {"linha": numero}
+        if isinstance(registro, dict) and "id" in registro:
+            saida["id"] = registro["id"]
+        if isinstance(lista, dict):
+            saida.update(lista)
+        else:
+            saida["lista_compras"] = lista
+        saidas.append((numero, saida))
+
+    saidas.sort(key=lambda s: s[0])
+    return [json.dumps(saida, ensure_ascii=False) for _, saida in saidas]
+
+
+def _blocos(arquivo, tamanho: int):
+    bloco = []
+    for numero, linha in enumerate(arquivo, start=1):
+        if linha.strip():
+            bloco.append((numero, linha))
+        if len(bloco) >= tamanho:
+            yield bloco
+            bloco = []
+    if bloco:
+        yield bloco
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Recalcula listas de compras a partir de dietas em JSONL")
+    parser.add_argument("entrada", help="arquivo JSONL com uma dieta por linha ('-' para stdin)")
+    parser.add_argument("saida", nargs="?", default="-", help="arquivo JSONL de saída (padrão: stdout)")
+    parser.add_argument("--por-tarefa", type=int, default=LOTE_DIETAS_POR_TAREFA,
+                        help="dietas por tarefa enviada a cada processo")
+    args = parser.parse_args(argv)
+
+    entrada = sys.stdin if args.entrada == "-" else open(args.entrada, encoding="utf-8")
+    saida = sys.stdout if args.saida == "-" else open(args.saida, "w", encoding="utf-8")
+    pool = obter_pool()
+    # Poucos blocos em voo por processo: lê e escreve em streaming, na ordem
+    pendentes = deque()
+    total = 0
+    try:
+        for bloco in _blocos(entrada, max(args.por_tarefa, 1)):
+            pendentes.append(pool.submit(_processar_linhas, bloco))
+            if len(pendentes) >= 2 * WORKERS_CPU:
+                linhas = pendentes.popleft().result()
+                saida.write("\n".join(linhas) + "\n")
+                total += len(linhas)
+        while pendentes:
+            linhas = pendentes.popleft().result()
+            saida.write("\n".join(linhas) + "\n")
+            total += len(linhas)
+    finally:
+        encerrar_pool()
+        if entrada is not sys.stdin:
+            entrada.close()
+        if saida is not sys.stdout:
+            saida.close()
+    print(f"[LOTE] {total} dietas processadas com {WORKERS_CPU} processos", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,59 @@
+"""
+Fábrica única dos clientes OpenAI (sync e async).
+
+Todos os módulos do agent importam `client` / `async_client` daqui, para que
+exista um só pool de conexões HTTP por tipo de cliente e um só lugar para
+dimensionar concorrência em produção.
+"""
 import os
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
 load_dotenv(override=True)  # 🔴 ISSO RESOLVE 90% DOS SEUS ERROS
 
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+# Configuração do pool (ajustável por variável de ambiente)
+OPENAI_MAX_CONEXOES = int(os.getenv("OPENAI_MAX_CONEXOES", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_TIMEOUT_CONEXAO = float(os.getenv("OPENAI_TIMEOUT_CONEXAO", "5"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+
+
+def _limites() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONEXOES,
+        max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_TIMEOUT_CONEXAO)
+
+
+def criar_client() -> OpenAI:
+    """Cria um cliente síncrono com o pool configurado"""
+    return OpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=os.getenv("OPENAI_BASE_URL") or None,
+        max_retries=OPENAI_MAX_RETRIES,
+        timeout=_timeout(),
+        http_client=httpx.Client(limits=_limites(), timeout=_timeout()),
+    )
+
+
+def criar_async_client() -> AsyncOpenAI:
+    """Cria um cliente assíncrono com a mesma configuração do síncrono"""
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=os.getenv("OPENAI_BASE_URL") or None,
+        max_retries=OPENAI_MAX_RETRIES,
+        timeout=_timeout(),
+        http_client=httpx.AsyncClient(limits=_limites(), timeout=_timeout()),
+    )
+
+
+client = criar_client()
+async_client = criar_async_client()
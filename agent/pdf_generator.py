@@ -1,214 +1,459 @@
 """
 Gerador de PDF para lista de compras
 """
+import hashlib
+import json
+import asyncio
+import os
+import re
+import zipfile
+from datetime import datetime
+from functools import lru_cache
 from io import BytesIO
 try:
     from reportlab.lib.pagesizes import A4
     from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
     from reportlab.lib.units import cm
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.pdfgen import canvas
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
     from reportlab.lib import colors
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT
-    from datetime import datetime
+    from reportlab.lib.enums import TA_CENTER
     REPORTLAB_AVAILABLE = True
 except ImportError:
     REPORTLAB_AVAILABLE = False
 
+from agent.cache import CacheLRU
+from agent.tracing import span
+from agent.workers import WORKERS_CPU, executar_em_processo
+
+# "platypus" (tabela do reportlab, padrão) ou "canvas" (desenho direto, mais rápido)
+PDF_MODO = os.getenv("PDF_MODO", "platypus")
+
+# Muda sempre que o layout do PDF muda → invalida os PDFs em cache (e os ETags)
+VERSAO_TEMPLATE_PDF = f"3-{PDF_MODO}"
+
+# PDFs prontos por conteúdo da lista: baixar de novo a mesma lista não refaz o layout
+PDF_CACHE_MAX_ITENS = int(os.getenv("PDF_CACHE_MAX_ITENS", "512"))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+cache_pdfs = CacheLRU(max_itens=PDF_CACHE_MAX_ITENS, max_bytes=PDF_CACHE_MAX_BYTES)
+
+
+def chave_pdf(lista_compras: list) -> str:
+    """Hash canônico da lista + versão do template + data impressa no PDF
+    (usado também como ETag): no dia seguinte o PDF é refeito com a data nova"""
+    canonico = json.dumps(lista_compras, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{VERSAO_TEMPLATE_PDF}\0{_data_atual()}\0{canonico}".encode("utf-8")).hexdigest()[:32]
+
+
+def obter_pdf_lista_compras(lista_compras: list, chave: str = None) -> bytes:
+    """gerar_pdf_lista_compras com cache LRU (limitado em itens e bytes)"""
+    chave = chave or chave_pdf(lista_compras)
+    pdf_bytes = cache_pdfs.obter(chave)
+    if pdf_bytes is None:
+        with span("pdf.render", itens=len(lista_compras)) as s:
+            pdf_bytes = gerar_pdf_lista_compras(lista_compras)
+            s.definir(bytes=len(pdf_bytes))
+        cache_pdfs.salvar(chave, pdf_bytes)
+    return pdf_bytes
+
+
+async def obter_pdf_lista_compras_async(lista_compras: list, chave: str = None) -> bytes:
+    """Versão assíncrona de obter_pdf_lista_compras: o reportlab roda no pool
+    de processos (limitado por WORKERS_CPU), sem bloquear o event loop"""
+    chave = chave or chave_pdf(lista_compras)
+    pdf_bytes = cache_pdfs.obter(chave)
+    if pdf_bytes is None:
+        with span("pdf.render", itens=len(lista_compras), processo=True) as s:
+            pdf_bytes = await executar_em_processo(gerar_pdf_lista_compras, lista_compras)
+            s.definir(bytes=len(pdf_bytes))
+        cache_pdfs.salvar(chave, pdf_bytes)
+    return pdf_bytes
+
+
+# =============================================================================
+# SANITIZAÇÃO: uma passada de str.translate por célula
+# =============================================================================
+
+# Acentos → letra base; caracteres que quebram o markup/tabela → espaço.
+# O que sobrar fora do ASCII é descartado depois (Helvetica padrão não tem).
+_TABELA_SANITIZAR = str.maketrans({
+    **dict.fromkeys("ãáàâ", "a"), **dict.fromkeys("éê", "e"), "í": "i",
+    **dict.fromkeys("óôõ", "o"), **dict.fromkeys("úü", "u"), "ç": "c",
+    **dict.fromkeys("ÃÁÀÂ", "A"), **dict.fromkeys("ÉÊ", "E"), "Í": "I",
+    **dict.fromkeys("ÓÔÕ", "O"), **dict.fromkeys("ÚÜ", "U"), "Ç": "C",
+    **dict.fromkeys("&<>\n\r\t", " "),
+})
+
+
+def sanitizar(texto) -> str:
+    """Texto seguro para a fonte padrão do PDF (ASCII, sem markup, até 200 chars)"""
+    if not texto:
+        return ""
+    # A lista vem do cliente: célula pode ser lista/dict (não hasheável)
+    return _sanitizar_str(str(texto))
+
+
+@lru_cache(maxsize=4096)
+def _sanitizar_str(texto: str) -> str:
+    texto = texto.translate(_TABELA_SANITIZAR)
+    if not texto.isascii():
+        texto = texto.encode('ascii', 'ignore').decode('ascii')
+    return texto.strip()[:200]
+
+
+def _linhas_tabela(lista_compras: list) -> list:
+    """Linhas da tabela já sanitizadas e cortadas para caber nas colunas"""
+    return [
+        [
+            str(i),
+            sanitizar(item.get('nome', 'Item sem nome'))[:25],
+            sanitizar(item.get('quantidade', 'N/A'))[:15],
+            sanitizar(item.get('motivo', 'Conforme dieta'))[:40],
+        ]
+        for i, item in enumerate(lista_compras, 1)
+    ]
+
+
+def _data_atual() -> str:
+    # Só o dia: entra na chave do cache/ETag (com a hora, nenhum PDF se repetiria)
+    return datetime.now().strftime("%d/%m/%Y")
+
+
+def _rodape(total: int) -> str:
+    return f"Total de itens: {total} | Gerado por Agente de Compras"
+
+
+# =============================================================================
+# MODO PLATYPUS: estilos e modelo da tabela criados uma vez só
+# =============================================================================
+
+CABECALHO_TABELA = ['#', 'Item', 'Quantidade', 'Observacoes']
+
+if REPORTLAB_AVAILABLE:
+    COR_PRINCIPAL = colors.HexColor('#0f766e')
+    LARGURAS_COLUNAS = [1.2*cm, 4.5*cm, 2.8*cm, 7.5*cm]
+    MARGEM = 2*cm
+
+    _ESTILOS = getSampleStyleSheet()
+
+    ESTILO_TITULO = ParagraphStyle(
+        'CustomTitle',
+        parent=_ESTILOS['Heading1'],
+        fontSize=24,
+        textColor=COR_PRINCIPAL,
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        fontName='Helvetica-Bold'
+    )
+
+    ESTILO_SUBTITULO = ParagraphStyle(
+        'CustomSubtitle',
+        parent=_ESTILOS['Normal'],
+        fontSize=10,
+        textColor=colors.grey,
+        spaceAfter=20,
+        alignment=TA_CENTER
+    )
+
+    ESTILO_RODAPE = ParagraphStyle(
+        'Footer',
+        parent=_ESTILOS['Normal'],
+        fontSize=8,
+        textColor=colors.grey,
+        alignment=TA_CENTER
+    )
+
+    ESTILO_TABELA = TableStyle([
+        # Cabeçalho
+        ('BACKGROUND', (0, 0), (-1, 0), COR_PRINCIPAL),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+
+        # Conteúdo
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+        ('ALIGN', (0, 1), (0, -1), 'CENTER'),  # Número centralizado
+        ('ALIGN', (1, 1), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('TOPPADDING', (0, 1), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+
+        # Bordas
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('LINEBELOW', (0, 0), (-1, 0), 2, COR_PRINCIPAL),
+
+        # Alternância de cores
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.beige]),
+    ])
+
+
+def _elementos_secao(titulo: str, linhas: list) -> list:
+    elements = [
+        Paragraph(titulo, ESTILO_TITULO),
+        Paragraph(f"Gerada em {_data_atual()}", ESTILO_SUBTITULO),
+        Spacer(1, 0.5*cm),
+    ]
+    if not linhas:
+        elements.append(Paragraph("Nenhum item na lista.", _ESTILOS['Normal']))
+    else:
+        # repeatRows: cabeçalho repetido em cada página
+        table = Table([CABECALHO_TABELA] + linhas, colWidths=LARGURAS_COLUNAS, repeatRows=1)
+        table.setStyle(ESTILO_TABELA)
+        elements.append(table)
+
+    elements.append(Spacer(1, 1*cm))
+    elements.append(Paragraph(_rodape(len(linhas)), ESTILO_RODAPE))
+    return elements
+
+
+def _gerar_pdf_platypus(secoes: list) -> bytes:
+    """secoes: [(titulo, linhas)], cada uma começando numa página nova"""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        rightMargin=MARGEM,
+        leftMargin=MARGEM,
+        topMargin=MARGEM,
+        bottomMargin=MARGEM
+    )
+
+    elements = []
+    for indice, (titulo, linhas) in enumerate(secoes):
+        if indice:
+            elements.append(PageBreak())
+        elements += _elementos_secao(titulo, linhas)
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+# =============================================================================
+# MODO CANVAS: desenho direto da tabela de 4 colunas, sem o fluxo do platypus
+# =============================================================================
+
+ALTURA_LINHA = 22
+ALTURA_CABECALHO = 26
+
+
+def _desenhar_secao(pdf, titulo: str, linhas: list):
+    largura_pagina, altura_pagina = A4
+    # Tabela centralizada, como o platypus faz
+    largura_tabela = sum(LARGURAS_COLUNAS)
+    x_tabela = (largura_pagina - largura_tabela) / 2
+    x_colunas = [x_tabela]
+    for largura in LARGURAS_COLUNAS:
+        x_colunas.append(x_colunas[-1] + largura)
+
+    def cabecalho_tabela(y):
+        pdf.setFillColor(COR_PRINCIPAL)
+        pdf.rect(x_tabela, y - ALTURA_CABECALHO, largura_tabela, ALTURA_CABECALHO, stroke=0, fill=1)
+        pdf.setFillColor(colors.whitesmoke)
+        pdf.setFont('Helvetica-Bold', 11)
+        for coluna, titulo in enumerate(CABECALHO_TABELA):
+            centro = (x_colunas[coluna] + x_colunas[coluna + 1]) / 2
+            pdf.drawCentredString(centro, y - ALTURA_CABECALHO + 10, titulo)
+        return y - ALTURA_CABECALHO
+
+    def grade(topo, base, topo_linhas):
+        pdf.setStrokeColor(colors.grey)
+        pdf.setLineWidth(1)
+        for x in x_colunas:
+            pdf.line(x, topo, x, base)
+        y = topo_linhas
+        while y >= base - 0.5:
+            pdf.line(x_tabela, y, x_colunas[-1], y)
+            y -= ALTURA_LINHA
+        pdf.line(x_tabela, topo, x_colunas[-1], topo)
+        pdf.setStrokeColor(COR_PRINCIPAL)
+        pdf.setLineWidth(2)
+        pdf.line(x_tabela, topo_linhas, x_colunas[-1], topo_linhas)
+
+    # Título e data
+    y = altura_pagina - MARGEM
+    pdf.setFillColor(COR_PRINCIPAL)
+    pdf.setFont('Helvetica-Bold', 24)
+    pdf.drawCentredString(largura_pagina / 2, y - 24, titulo)
+    pdf.setFillColor(colors.grey)
+    pdf.setFont('Helvetica', 10)
+    pdf.drawCentredString(largura_pagina / 2, y - 60, f"Gerada em {_data_atual()}")
+    y -= 100
+
+    if not linhas:
+        pdf.setFillColor(colors.black)
+        pdf.drawString(x_tabela, y - 12, "Nenhum item na lista.")
+        y -= 30
+    else:
+        topo = y
+        y = topo_linhas = cabecalho_tabela(y)
+        for indice, linha in enumerate(linhas):
+            if y - ALTURA_LINHA < MARGEM:
+                grade(topo, y, topo_linhas)
+                pdf.showPage()
+                topo = altura_pagina - MARGEM
+                y = topo_linhas = cabecalho_tabela(topo)
+            pdf.setFillColor(colors.white if indice % 2 == 0 else colors.beige)
+            pdf.rect(x_tabela, y - ALTURA_LINHA, largura_tabela, ALTURA_LINHA, stroke=0, fill=1)
+            pdf.setFillColor(colors.black)
+            pdf.setFont('Helvetica', 9)
+            base_texto = y - ALTURA_LINHA + 8
+            pdf.drawCentredString((x_colunas[0] + x_colunas[1]) / 2, base_texto, linha[0])
+            for coluna in (1, 2, 3):
+                pdf.drawString(x_colunas[coluna] + 6, base_texto, linha[coluna])
+            y -= ALTURA_LINHA
+        grade(topo, y, topo_linhas)
+
+    # Rodapé
+    if y - 1*cm - 10 < MARGEM:
+        pdf.showPage()
+        y = altura_pagina - MARGEM
+    pdf.setFillColor(colors.grey)
+    pdf.setFont('Helvetica', 8)
+    pdf.drawCentredString(largura_pagina / 2, y - 1*cm - 8, _rodape(len(linhas)))
+
+
+def _gerar_pdf_canvas(secoes: list) -> bytes:
+    """secoes: [(titulo, linhas)], cada uma começando numa página nova"""
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    for indice, (titulo, linhas) in enumerate(secoes):
+        if indice:
+            pdf.showPage()
+        _desenhar_secao(pdf, titulo, linhas)
+    pdf.save()
+    return buffer.getvalue()
+
+
+def _gerar_pdf(secoes: list, modo: str = None) -> bytes:
+    if not REPORTLAB_AVAILABLE:
+        raise ImportError("reportlab não está instalado. Execute: pip install reportlab")
+
+    if (modo or PDF_MODO) == "canvas":
+        return _gerar_pdf_canvas(secoes)
 
-def gerar_pdf_lista_compras(lista_compras: list) -> bytes:
+    try:
+        return _gerar_pdf_platypus(secoes)
+    except Exception as e:
+        # FALLBACK: o modo canvas não depende do fluxo do platypus
+        print(f"Erro no PDF completo: {e}")
+        try:
+            return _gerar_pdf_canvas(secoes)
+        except Exception as e2:
+            print(f"Erro no PDF simples: {e2}")
+            raise Exception(f"Nao foi possivel gerar PDF: {str(e2)}")
+
+
+def gerar_pdf_lista_compras(lista_compras: list, modo: str = None) -> bytes:
     """
-    Gera um PDF a partir de uma lista de compras - VERSÃO ULTRA-ROBUSTA
+    Gera um PDF a partir de uma lista de compras.
 
     Args:
         lista_compras: Lista de dicionários com 'nome', 'quantidade', 'motivo'
+        modo: "platypus" (tabela do reportlab) ou "canvas" (desenho direto,
+              bem mais rápido para listas longas). Padrão: PDF_MODO.
 
     Returns:
         bytes do PDF gerado
     """
-    if not REPORTLAB_AVAILABLE:
-        raise ImportError("reportlab não está instalado. Execute: pip install reportlab")
+    return _gerar_pdf([("Lista de Compras", _linhas_tabela(lista_compras or []))], modo)
 
-    # Função de sanitização global
-    def sanitizar(texto):
-        if not texto:
-            return ""
-        texto = str(texto)
-
-        # Correções de caracteres comuns ANTES de remover acentos
-        correcoes = {
-            'ã': 'a', 'á': 'a', 'à': 'a', 'â': 'a',
-            'é': 'e', 'ê': 'e',
-            'í': 'i',
-            'ó': 'o', 'ô': 'o', 'õ': 'o',
-            'ú': 'u', 'ü': 'u',
-            'ç': 'c',
-            'Ã': 'A', 'Á': 'A', 'À': 'A', 'Â': 'A',
-            'É': 'E', 'Ê': 'E',
-            'Í': 'I',
-            'Ó': 'O', 'Ô': 'O', 'Õ': 'O',
-            'Ú': 'U', 'Ü': 'U',
-            'Ç': 'C'
-        }
-
-        for char_acentuado, char_normal in correcoes.items():
-            texto = texto.replace(char_acentuado, char_normal)
-
-        # Remover outros caracteres não-ASCII
-        texto = texto.encode('ascii', 'ignore').decode('ascii')
 
-        # Remover caracteres problemáticos que passaram
-        for char in ['&', '<', '>', '\n', '\r', '\t']:
-            texto = texto.replace(char, ' ')
+# =============================================================================
+# LOTE: várias listas (ex: pacientes de uma clínica) num PDF só ou num ZIP
+# =============================================================================
 
-        return texto.strip()[:200]  # Limitar tamanho
+def _titulo_lista(entrada: dict, indice: int) -> str:
+    nome = sanitizar(entrada.get("nome"))[:60]
+    return f"Lista de Compras - {nome}" if nome else f"Lista de Compras {indice}"
 
-    # TENTAR GERAR PDF COMPLETO (Método 1)
-    try:
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=A4,
-            rightMargin=2*cm,
-            leftMargin=2*cm,
-            topMargin=2*cm,
-            bottomMargin=2*cm
-        )
-
-        styles = getSampleStyleSheet()
-
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#0f766e'),
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        )
-
-        subtitle_style = ParagraphStyle(
-            'CustomSubtitle',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.grey,
-            spaceAfter=20,
-            alignment=TA_CENTER
-        )
-
-        elements = []
-
-        # Título SEM EMOJI (caracteres ASCII apenas)
-        elements.append(Paragraph("Lista de Compras", title_style))
-
-        # Data
-        data_atual = datetime.now().strftime("%d/%m/%Y as %H:%M")  # Sem "à" com acento
-        elements.append(Paragraph(f"Gerada em {data_atual}", subtitle_style))
-        elements.append(Spacer(1, 0.5*cm))
-
-        # Verificar se há itens
-        if not lista_compras or len(lista_compras) == 0:
-            elements.append(Paragraph("Nenhum item na lista.", styles['Normal']))
-        else:
-            # Criar tabela
-            data = [['#', 'Item', 'Quantidade', 'Observacoes']]
-
-            for i, item in enumerate(lista_compras, 1):
-                nome = sanitizar(item.get('nome', 'Item sem nome'))
-                qtd = sanitizar(item.get('quantidade', 'N/A'))
-                motivo = sanitizar(item.get('motivo', 'Conforme dieta'))
-
-                # Usar texto simples curto (max 40 chars para caber bem)
-                data.append([
-                    str(i),
-                    nome[:25],  # Limitar nome
-                    qtd[:15],    # Limitar quantidade
-                    motivo[:40]  # Limitar motivo
-                ])
-
-        # Criar tabela com larguras ajustadas (Observações com mais espaço)
-        table = Table(data, colWidths=[1.2*cm, 4.5*cm, 2.8*cm, 7.5*cm])
-        table.setStyle(TableStyle([
-            # Cabeçalho
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0f766e')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-
-            # Conteúdo
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('ALIGN', (0, 1), (0, -1), 'CENTER'),  # Número centralizado
-            ('ALIGN', (1, 1), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('TOPPADDING', (0, 1), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-
-            # Bordas
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('LINEBELOW', (0, 0), (-1, 0), 2, colors.HexColor('#0f766e')),
-
-            # Alternância de cores
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.beige]),
-        ]))
 
-        elements.append(table)
+def gerar_pdf_listas_em_lote(listas: list, modo: str = None) -> bytes:
+    """
+    Um PDF com uma seção por lista, cada uma começando numa página nova.
 
-        # Rodapé
-        elements.append(Spacer(1, 1*cm))
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=styles['Normal'],
-            fontSize=8,
-            textColor=colors.grey,
-            alignment=TA_CENTER
-        )
-        elements.append(Paragraph(
-            f"Total de itens: {len(lista_compras)} | Gerado por Agente de Compras",
-            footer_style
-        ))
-
-        # Construir e retornar PDF
-        doc.build(elements)
-        pdf_bytes = buffer.getvalue()
-        buffer.close()
-        return pdf_bytes
+    Args:
+        listas: [{"nome": "Maria", "lista_compras": [...]}, ...]
+        modo: como em gerar_pdf_lista_compras
+    """
+    return _gerar_pdf([
+        (_titulo_lista(entrada, indice), _linhas_tabela(entrada.get("lista_compras") or []))
+        for indice, entrada in enumerate(listas, 1)
+    ], modo)
 
-    except Exception as e:
-        print(f"Erro no PDF completo: {e}")
-        # FALLBACK: PDF MINIMALISTA (Método 2)
-        try:
-            buffer2 = BytesIO()
-            doc2 = SimpleDocTemplate(buffer2, pagesize=A4)
-            styles2 = getSampleStyleSheet()
-
-            simple_elements = [
-                Paragraph("Lista de Compras", styles2['Title']),
-                Spacer(1, 1*cm)
-            ]
-
-            # Adicionar itens como parágrafos simples
-            for i, item in enumerate(lista_compras, 1):
-                nome = sanitizar(item.get('nome', 'Item'))
-                qtd = sanitizar(item.get('quantidade', 'N/A'))
-
-                simple_elements.append(Paragraph(
-                    f"{i}. {nome} - {qtd}",
-                    styles2['Normal']
-                ))
-                simple_elements.append(Spacer(1, 0.2*cm))
-
-            doc2.build(simple_elements)
-            pdf_bytes2 = buffer2.getvalue()
-            buffer2.close()
-            return pdf_bytes2
 
-        except Exception as e2:
-            print(f"Erro no PDF simples: {e2}")
-            # ÚLTIMO RECURSO: Retornar erro
-            raise Exception(f"Nao foi possivel gerar PDF: {str(e2)}")
+def _gerar_pdf_entrada(entrada: dict, indice: int, modo: str = None) -> bytes:
+    """PDF de uma lista do lote, com o nome no título. Roda no pool de processos."""
+    return _gerar_pdf([(_titulo_lista(entrada, indice), _linhas_tabela(entrada.get("lista_compras") or []))], modo)
+
+
+def _nome_arquivo(entrada: dict, indice: int) -> str:
+    """Nome do PDF dentro do ZIP: o índice na frente garante nomes únicos"""
+    nome = re.sub(r"[^A-Za-z0-9]+", "_", sanitizar(entrada.get("nome"))).strip("_")[:60]
+    return f"{indice:04d}_{nome or 'lista'}.pdf"
+
+
+class _SaidaZip:
+    """Destino do ZipFile que só acumula os bytes até o próximo envio"""
+
+    def __init__(self):
+        self.pedacos = []
+
+    def write(self, dados) -> int:
+        self.pedacos.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def retirar(self) -> bytes:
+        dados = b"".join(self.pedacos)
+        self.pedacos.clear()
+        return dados
+
+
+async def zip_pdfs_em_lote(listas: list, modo: str = None):
+    """
+    ZIP com um PDF por lista, gerado em streaming: os PDFs são renderizados em
+    paralelo no pool de processos (no máximo 2 × WORKERS_CPU em andamento) e
+    cada um sai no ZIP assim que fica pronto, na ordem da entrada. A memória
+    fica limitada aos PDFs em andamento, qualquer que seja o tamanho do lote.
+    """
+    if not REPORTLAB_AVAILABLE:
+        raise ImportError("reportlab não está instalado. Execute: pip install reportlab")
+
+    saida = _SaidaZip()
+    em_andamento = []
+    proxima = escritos = erros = 0
+    with span("pdf.lote_zip", listas=len(listas)) as s:
+        try:
+            # ZIP_STORED: PDF já é comprimido, deflate só gastaria CPU
+            with zipfile.ZipFile(saida, mode="w", compression=zipfile.ZIP_STORED) as arquivo_zip:
+                while proxima < len(listas) or em_andamento:
+                    while proxima < len(listas) and len(em_andamento) < 2 * WORKERS_CPU:
+                        em_andamento.append(asyncio.ensure_future(executar_em_processo(
+                            _gerar_pdf_entrada, listas[proxima], proxima + 1, modo)))
+                        proxima += 1
+                    nome_arquivo = _nome_arquivo(listas[escritos], escritos + 1)
+                    try:
+                        arquivo_zip.writestr(nome_arquivo, await em_andamento[0])
+                    except Exception as e:
+                        # Uma lista com problema não derruba o ZIP inteiro
+                        print(f"Erro no PDF {nome_arquivo}: {e}")
+                        arquivo_zip.writestr(nome_arquivo[:-4] + ".erro.txt", f"Erro ao gerar PDF: {e}\n")
+                        erros += 1
+                    em_andamento.pop(0)
+                    escritos += 1
+                    yield saida.retirar()
+            yield saida.retirar()  # diretório central
+        finally:
+            for tarefa in em_andamento:
+                tarefa.cancel()
+            s.definir(pdfs=escritos, erros=erros)
 
 
 # Função auxiliar para gerar texto simples (fallback)
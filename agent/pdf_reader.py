@@ -1,11 +1,77 @@
+import asyncio
+import os
 import pdfplumber
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import resolve1
+
+from agent.tracing import span
+from agent.workers import executar_em_processo
+
+# Páginas por tarefa no pool: PDFs com mais páginas são divididos em blocos
+# processados em paralelo e remontados na ordem original
+PDF_PAGINAS_POR_TAREFA = int(os.getenv("PDF_PAGINAS_POR_TAREFA", "2"))
+
+# PDFs com mais páginas que isso são recusados antes da extração
+PDF_MAX_PAGINAS = int(os.getenv("PDF_MAX_PAGINAS", "30"))
+
+
+class PDFMuitoGrandeError(ValueError):
+    """PDF com mais páginas que o permitido"""
 
 
 def extrair_texto_pdf(file) -> str:
     """Extrai texto de PDF usando pdfplumber (melhor para layouts complexos
     como dietas de nutricionistas com colunas e tabelas)."""
     with pdfplumber.open(file.file) as pdf:
-        texto = ""
-        for page in pdf.pages:
-            texto += (page.extract_text() or "") + "\n"
-    return texto
+        return "".join((page.extract_text() or "") + "\n" for page in pdf.pages)
+
+
+def contar_paginas_pdf(caminho: str) -> int:
+    """Conta páginas lendo só o catálogo do PDF (/Pages /Count), sem
+    analisar layout. Se o catálogo estiver quebrado, cai no pdfplumber."""
+    try:
+        with open(caminho, "rb") as arquivo:
+            documento = PDFDocument(PDFParser(arquivo))
+            return int(resolve1(resolve1(documento.catalog["Pages"])["Count"]))
+    except Exception:
+        with pdfplumber.open(caminho) as pdf:
+            return len(pdf.pages)
+
+
+def _extrair_paginas(caminho: str, inicio: int, fim: int) -> list:
+    """Extrai o texto das páginas [inicio, fim). Roda em processo separado e
+    lê do disco só o que essas páginas usam."""
+    with pdfplumber.open(caminho, pages=list(range(inicio + 1, fim + 1))) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages]
+
+
+async def extrair_paginas_pdf_async(caminho: str, max_paginas: int = PDF_MAX_PAGINAS) -> list:
+    """Texto de cada página do PDF, na ordem. O layout do pdfplumber roda no
+    pool de processos, com as páginas de PDFs grandes distribuídas entre os
+    workers.
+
+    Args:
+        caminho: PDF em disco. Cada bloco recebe só o caminho (não os bytes
+            do arquivo inteiro) e abre o PDF direto no worker
+        max_paginas: limite de páginas; acima disso levanta PDFMuitoGrandeError
+    """
+    with span("pdf.extracao", bytes=os.path.getsize(caminho)) as s:
+        total = await asyncio.to_thread(contar_paginas_pdf, caminho)
+        s.definir(paginas=total)
+        if max_paginas and total > max_paginas:
+            raise PDFMuitoGrandeError(f"PDF tem {total} páginas (máximo: {max_paginas})")
+
+        blocos = [
+            executar_em_processo(_extrair_paginas, caminho, inicio, min(inicio + PDF_PAGINAS_POR_TAREFA, total))
+            for inicio in range(0, total, PDF_PAGINAS_POR_TAREFA)
+        ]
+        paginas = [texto for bloco in await asyncio.gather(*blocos) for texto in bloco]
+        s.definir(blocos=len(blocos), caracteres=sum(len(texto) + 1 for texto in paginas))
+    return paginas
+
+
+async def extrair_texto_pdf_async(caminho: str, max_paginas: int = PDF_MAX_PAGINAS) -> str:
+    """Versão assíncrona de extrair_texto_pdf (ver extrair_paginas_pdf_async)"""
+    paginas = await extrair_paginas_pdf_async(caminho, max_paginas)
+    return "".join(texto + "\n" for texto in paginas)
@@ -0,0 +1,103 @@
+"""
+Atalho determinístico para o roteiro fixo do chat (SYSTEM_CHAT).
+
+O SYSTEM_CHAT roteiriza a conversa: primeiro pergunta quantas pessoas, depois
+manda clicar em "Finalizar". Quando o turno é um desses passos roteirizados e
+a resposta do usuário foi entendida com segurança, a resposta é montada aqui
+mesmo, sem chamar a IA. Turnos livres (ajustes, dúvidas) continuam indo para
+a IA.
+"""
+import re
+
+from agent.intencoes import RE_PESSOAS
+
+PERGUNTA_PESSOAS = "Recebi sua dieta! Pra quantas pessoas é a compra?"
+MENSAGEM_LISTA_PRONTA = "Perfeito! Clique em 'Finalizar' para gerar sua lista de compras. [LISTA_PRONTA]"
+
+# Respostas locais só para mensagens curtas (mais que isso pode ter pedido extra)
+MAX_PALAVRAS_RESPOSTA_CURTA = 8
+
+# Primeira mensagem que o frontend envia sozinho depois do /dieta
+MENSAGEM_ABERTURA = "Recebi minha dieta, pode me ajudar com a lista?"
+
+NUMEROS_POR_EXTENSO = {
+    "um": 1, "uma": 1, "dois": 2, "duas": 2, "tres": 3, "três": 3, "quatro": 4,
+    "cinco": 5, "seis": 6, "sete": 7, "oito": 8, "nove": 9, "dez": 10,
+}
+
+_RE_SO_NUMERO = re.compile(
+    r"^(?:somos|s[aã]o|para|pra|é)?\s*(\d{1,2}|" + "|".join(NUMEROS_POR_EXTENSO) + r")"
+    r"(?:\s*(?:pessoas?|adultos?))?\s*[.!]?$"
+)
+_RE_SO_EU = re.compile(r"^(?:s[oó]|apenas|somente)?\s*(?:eu|pra mim|para mim)(?:\s*mesmo)?\s*[.!]?$")
+
+estatisticas_roteiro = {"respostas_locais": 0, "respostas_ia": 0}
+
+
+def _ultima_resposta_assistente(historico: list) -> str:
+    for msg in reversed(historico):
+        if msg.get("role") == "assistant":
+            return msg.get("content", "")
+    return None
+
+
+def extrair_pessoas(mensagem: str):
+    """Número de pessoas na mensagem, ou None se não der para ter certeza"""
+    msg = mensagem.lower().strip()
+
+    match = RE_PESSOAS.search(msg)
+    if match:
+        return int(match.group(1))
+
+    match = _RE_SO_NUMERO.match(msg)
+    if match:
+        valor = match.group(1)
+        return int(valor) if valor.isdigit() else NUMEROS_POR_EXTENSO[valor]
+
+    if _RE_SO_EU.match(msg):
+        return 1
+
+    return None
+
+
+def responder_roteiro(dieta: dict, historico: list, mensagem_usuario: str):
+    """Retorna a resposta roteirizada para este turno, ou None se o turno
+    precisa da IA. `historico` ainda não contém a mensagem atual."""
+    ultima = _ultima_resposta_assistente(historico)
+
+    if ultima is None:
+        # Primeiro turno: a abertura do frontend recebe a pergunta de pessoas;
+        # só o número de pessoas já finaliza. Qualquer outra coisa ("posso
+        # trocar o frango por peixe?") vai para a IA
+        msg = mensagem_usuario.strip().lower()
+        if msg == MENSAGEM_ABERTURA.lower():
+            return _local(PERGUNTA_PESSOAS)
+        if _RE_SO_NUMERO.match(msg) or _RE_SO_EU.match(msg):
+            return _responder_pessoas(dieta, mensagem_usuario)
+        return None
+
+    if "quantas pessoas" in ultima.lower():
+        return _responder_pessoas(dieta, mensagem_usuario)
+
+    return None
+
+
+def _responder_pessoas(dieta: dict, mensagem_usuario: str):
+    """MENSAGEM_LISTA_PRONTA se a mensagem é curta, sem pergunta, e traz o
+    número de pessoas; senão None (IA)"""
+    if len(mensagem_usuario.split()) > MAX_PALAVRAS_RESPOSTA_CURTA or "?" in mensagem_usuario:
+        return None
+    pessoas = extrair_pessoas(mensagem_usuario)
+    if pessoas and 1 <= pessoas <= 20:
+        dieta["pessoas"] = pessoas
+        return _local(MENSAGEM_LISTA_PRONTA)
+    return None
+
+
+def _local(resposta: str) -> str:
+    estatisticas_roteiro["respostas_locais"] += 1
+    return resposta
+
+
+def registrar_resposta_ia():
+    estatisticas_roteiro["respostas_ia"] += 1
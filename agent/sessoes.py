@@ -0,0 +1,127 @@
+"""
+Sessões de conversa guardadas no servidor (dieta + histórico do chat).
+
+Com a sessão, o /chat recebe só o id e a mensagem nova, em vez de a dieta e o
+histórico inteiros a cada turno. Por padrão fica em memória; com
+SESSOES_ARQUIVO definido usa SQLite (útil com vários workers do uvicorn).
+Sessões paradas por mais de SESSOES_TTL segundos são descartadas e, acima de
+SESSOES_MAX sessões, as usadas há mais tempo saem primeiro.
+
+Nos dois modos obter() devolve uma cópia: o que o chat altera só vale depois
+de salvar() (uma chamada à IA que falhou não deixa turno pela metade).
+"""
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class ArmazemSessoes:
+    """Guarda {"dieta": dict, "historico": list} por id de sessão"""
+
+    def __init__(self, arquivo: str = None, ttl: float = None, max_sessoes: int = None):
+        self.arquivo = arquivo if arquivo is not None else os.getenv("SESSOES_ARQUIVO", "")
+        self.ttl = ttl if ttl is not None else float(os.getenv("SESSOES_TTL", str(2 * 3600)))
+        self.max_sessoes = max_sessoes if max_sessoes is not None else int(os.getenv("SESSOES_MAX", "10000"))
+        self._memoria = OrderedDict()  # id -> (sessao, ultimo_acesso), da menos para a mais recente
+        self._lock = threading.Lock()
+        self._ultima_limpeza = time.time()
+        self._conn = None
+
+        if self.arquivo:
+            pasta = os.path.dirname(self.arquivo)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            self._conn = sqlite3.connect(self.arquivo, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessoes ("
+                " id TEXT PRIMARY KEY,"
+                " dados TEXT NOT NULL,"
+                " acessado_em REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessoes_acessado_em ON sessoes (acessado_em)")
+            self._conn.commit()
+
+    def criar(self, dieta: dict, historico: list = None) -> str:
+        sessao_id = uuid.uuid4().hex
+        self.salvar(sessao_id, {"dieta": dieta, "historico": historico or []})
+        return sessao_id
+
+    def obter(self, sessao_id: str):
+        """Retorna a sessão ou None se não existir / tiver expirado"""
+        agora = time.time()
+        self._limpar_expiradas(agora)
+
+        with self._lock:
+            if self._conn is not None:
+                linha = self._conn.execute(
+                    "SELECT dados, acessado_em FROM sessoes WHERE id = ?", (sessao_id,)
+                ).fetchone()
+                if not linha or agora - linha[1] > self.ttl:
+                    return None
+                self._conn.execute("UPDATE sessoes SET acessado_em = ? WHERE id = ?", (agora, sessao_id))
+                self._conn.commit()
+                return json.loads(linha[0])
+
+            entrada = self._memoria.get(sessao_id)
+            if not entrada or agora - entrada[1] > self.ttl:
+                return None
+            self._memoria[sessao_id] = (entrada[0], agora)
+            self._memoria.move_to_end(sessao_id)
+            return copy.deepcopy(entrada[0])
+
+    def salvar(self, sessao_id: str, sessao: dict):
+        agora = time.time()
+        self._limpar_expiradas(agora)
+        with self._lock:
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sessoes (id, dados, acessado_em) VALUES (?, ?, ?)",
+                    (sessao_id, json.dumps(sessao, ensure_ascii=False), agora),
+                )
+                excedentes = self._conn.execute("SELECT COUNT(*) FROM sessoes").fetchone()[0] - self.max_sessoes
+                if excedentes > 0:
+                    self._conn.execute(
+                        "DELETE FROM sessoes WHERE id IN"
+                        " (SELECT id FROM sessoes ORDER BY acessado_em LIMIT ?)", (excedentes,)
+                    )
+                self._conn.commit()
+            else:
+                self._memoria[sessao_id] = (copy.deepcopy(sessao), agora)
+                self._memoria.move_to_end(sessao_id)
+                while len(self._memoria) > self.max_sessoes:
+                    self._memoria.popitem(last=False)
+
+    def remover(self, sessao_id: str):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM sessoes WHERE id = ?", (sessao_id,))
+                self._conn.commit()
+            else:
+                self._memoria.pop(sessao_id, None)
+
+    def _limpar_expiradas(self, agora: float):
+        """Varredura de sessões ociosas, no máximo uma vez por minuto"""
+        if agora - self._ultima_limpeza < 60:
+            return
+        self._ultima_limpeza = agora
+        limite = agora - self.ttl
+        with self._lock:
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM sessoes WHERE acessado_em < ?", (limite,))
+                self._conn.commit()
+            else:
+                # Em ordem de acesso: as expiradas estão todas no começo
+                while self._memoria and next(iter(self._memoria.values()))[1] < limite:
+                    self._memoria.popitem(last=False)
+
+    def __len__(self):
+        if self._conn is not None:
+            with self._lock:
+                return self._conn.execute("SELECT COUNT(*) FROM sessoes").fetchone()[0]
+        return len(self._memoria)
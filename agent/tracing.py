@@ -0,0 +1,299 @@
+"""
+Rastreamento leve por requisição: spans em volta de cada etapa (upload,
+extração do PDF, IA, pós-processamento, cálculo, PDF da lista), com duração,
+tamanhos, páginas e tokens.
+
+O id da requisição (cabeçalho X-Request-ID) acompanha a requisição via
+contextvars, inclusive através de await, asyncio.gather e asyncio.to_thread.
+Ao fim de cada requisição o rastro completo é exportado para:
+  - TRACING_ARQUIVO: um JSON por linha (um rastro por requisição)
+  - TRACING_OTLP_URL: coletor OTLP/HTTP em JSON (ex: http://localhost:4318/v1/traces)
+A exportação roda numa thread própria, fora do caminho da resposta.
+
+As durações de cada etapa também ficam em memória (últimas TRACING_AMOSTRAS)
+para os percentis p50/p95/p99 do /metricas, mesmo sem exportador configurado.
+"""
+import contextvars
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+import httpx
+
+TRACING_ARQUIVO = os.getenv("TRACING_ARQUIVO", "")
+TRACING_OTLP_URL = os.getenv("TRACING_OTLP_URL", "")
+TRACING_SERVICO = os.getenv("TRACING_SERVICO", "agente-compras")
+TRACING_AMOSTRAS = int(os.getenv("TRACING_AMOSTRAS", "1000"))
+
+_rastro_atual = contextvars.ContextVar("rastro_atual", default=None)
+_span_atual = contextvars.ContextVar("span_atual", default=None)
+
+
+def novo_id() -> str:
+    return uuid.uuid4().hex
+
+
+def id_requisicao_atual() -> str:
+    """Id da requisição em andamento (ou None fora de uma requisição)"""
+    rastro = _rastro_atual.get()
+    return rastro.id_requisicao if rastro else None
+
+
+class Rastro:
+    """Spans de uma requisição"""
+
+    def __init__(self, id_requisicao: str):
+        self.id_requisicao = id_requisicao
+        self.spans = []
+
+    def como_dict(self) -> dict:
+        return {
+            "id_requisicao": self.id_requisicao,
+            "spans": [s.como_dict() for s in self.spans],
+        }
+
+
+class Span:
+    """Uma etapa cronometrada. Use como context manager:
+
+        with span("llm.interpretacao", caracteres=len(texto)) as s:
+            r = client.chat.completions.create(...)
+            s.definir(tokens_entrada=r.usage.prompt_tokens)
+    """
+
+    __slots__ = ("nome", "id", "pai", "atributos", "inicio", "duracao_ms",
+                 "erro", "_t0", "_rastro", "_token")
+
+    def __init__(self, nome: str, **atributos):
+        self.nome = nome
+        self.id = uuid.uuid4().hex[:16]
+        self.pai = None
+        self.atributos = atributos
+        self.inicio = None
+        self.duracao_ms = None
+        self.erro = None
+
+    def definir(self, **atributos):
+        self.atributos.update(atributos)
+        return self
+
+    def _abrir(self):
+        self._rastro = _rastro_atual.get()
+        self.pai = _span_atual.get()
+        self.inicio = time.time()
+        self._t0 = time.perf_counter()
+
+    def _fechar(self, tipo=None):
+        self.duracao_ms = (time.perf_counter() - self._t0) * 1000
+        if tipo is not None:
+            self.erro = tipo.__name__
+        _registrar_duracao(self.nome, self.duracao_ms)
+        if self._rastro is not None:
+            self._rastro.spans.append(self)
+
+    def __enter__(self):
+        self._abrir()
+        self._token = _span_atual.set(self.id)
+        return self
+
+    def __exit__(self, tipo, excecao, tb):
+        try:
+            _span_atual.reset(self._token)
+        except ValueError:
+            # Gerador assíncrono finalizado em outro contexto (ex: aclose no GC)
+            pass
+        self._fechar(tipo)
+        return False
+
+    def como_dict(self) -> dict:
+        dados = {
+            "nome": self.nome,
+            "id": self.id,
+            "pai": self.pai,
+            "inicio": self.inicio,
+            "duracao_ms": round(self.duracao_ms, 3),
+            "atributos": self.atributos,
+        }
+        if self.erro:
+            dados["erro"] = self.erro
+        return dados
+
+
+def span(nome: str, **atributos) -> Span:
+    return Span(nome, **atributos)
+
+
+class rastrear_requisicao:
+    """Abre o rastro da requisição e o span raiz; ao sair do bloco encerra e
+    exporta. Para respostas em streaming, chame adiar() dentro do bloco e
+    encerrar() quando o corpo terminar de ser enviado."""
+
+    def __init__(self, id_requisicao: str = None, nome: str = "requisicao", **atributos):
+        self.rastro = Rastro(id_requisicao or novo_id())
+        self.raiz = Span(nome, **atributos)
+        self._adiado = False
+        self._encerrado = False
+
+    def __enter__(self) -> Span:
+        self._token_rastro = _rastro_atual.set(self.rastro)
+        self.raiz._abrir()
+        self._token_span = _span_atual.set(self.raiz.id)
+        return self.raiz
+
+    def __exit__(self, tipo, excecao, tb):
+        _span_atual.reset(self._token_span)
+        _rastro_atual.reset(self._token_rastro)
+        if tipo is not None or not self._adiado:
+            self.encerrar(tipo)
+        return False
+
+    def adiar(self):
+        self._adiado = True
+
+    def encerrar(self, tipo=None):
+        if self._encerrado:
+            return
+        self._encerrado = True
+        self.raiz._fechar(tipo)
+        exportar(self.rastro)
+
+
+# =============================================================================
+# ESTATÍSTICAS POR ETAPA (para o /metricas)
+# =============================================================================
+
+_duracoes = {}  # nome -> deque das últimas durações (ms)
+_contagens = {}
+_lock_duracoes = threading.Lock()
+
+
+def _registrar_duracao(nome: str, duracao_ms: float):
+    with _lock_duracoes:
+        amostras = _duracoes.get(nome)
+        if amostras is None:
+            amostras = _duracoes[nome] = deque(maxlen=TRACING_AMOSTRAS)
+        amostras.append(duracao_ms)
+        _contagens[nome] = _contagens.get(nome, 0) + 1
+
+
+def _percentil(ordenadas: list, p: float) -> float:
+    indice = min(int(round(p * (len(ordenadas) - 1))), len(ordenadas) - 1)
+    return round(ordenadas[indice], 2)
+
+
+def estatisticas_etapas() -> dict:
+    """p50/p95/p99 (ms) de cada etapa nas últimas TRACING_AMOSTRAS execuções"""
+    with _lock_duracoes:
+        copias = {nome: sorted(amostras) for nome, amostras in _duracoes.items()}
+        contagens = dict(_contagens)
+    return {
+        nome: {
+            "execucoes": contagens[nome],
+            "p50_ms": _percentil(ordenadas, 0.50),
+            "p95_ms": _percentil(ordenadas, 0.95),
+            "p99_ms": _percentil(ordenadas, 0.99),
+            "max_ms": round(ordenadas[-1], 2),
+        }
+        for nome, ordenadas in sorted(copias.items())
+    }
+
+
+# =============================================================================
+# EXPORTAÇÃO (JSON lines / OTLP)
+# =============================================================================
+
+def _valor_otlp(valor) -> dict:
+    if isinstance(valor, bool):
+        return {"boolValue": valor}
+    if isinstance(valor, int):
+        return {"intValue": str(valor)}
+    if isinstance(valor, float):
+        return {"doubleValue": valor}
+    return {"stringValue": str(valor)}
+
+
+def _para_otlp(rastro: Rastro) -> dict:
+    """Converte o rastro para o formato JSON do OTLP/HTTP (ExportTraceServiceRequest)"""
+    trace_id = rastro.id_requisicao.lower()
+    if len(trace_id) != 32 or any(c not in "0123456789abcdef" for c in trace_id):
+        trace_id = hashlib.sha256(rastro.id_requisicao.encode("utf-8")).hexdigest()[:32]
+
+    spans = []
+    for s in rastro.spans:
+        inicio_ns = int(s.inicio * 1e9)
+        atributos = {"request.id": rastro.id_requisicao, **s.atributos}
+        dados = {
+            "traceId": trace_id,
+            "spanId": s.id,
+            "name": s.nome,
+            "kind": 2 if s.pai is None else 1,  # SERVER / INTERNAL
+            "startTimeUnixNano": str(inicio_ns),
+            "endTimeUnixNano": str(inicio_ns + int(s.duracao_ms * 1e6)),
+            "attributes": [{"key": k, "value": _valor_otlp(v)} for k, v in atributos.items() if v is not None],
+            "status": {"code": 2, "message": s.erro} if s.erro else {"code": 0},
+        }
+        if s.pai:
+            dados["parentSpanId"] = s.pai
+        spans.append(dados)
+
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACING_SERVICO}}]},
+        "scopeSpans": [{"scope": {"name": "agent.tracing"}, "spans": spans}],
+    }]}
+
+
+class _Exportador(threading.Thread):
+    """Thread que grava/envia os rastros sem atrasar as respostas"""
+
+    def __init__(self, arquivo: str, otlp_url: str):
+        super().__init__(name="exportador-tracing", daemon=True)
+        self.arquivo = arquivo
+        self.otlp_url = otlp_url
+        self.fila = queue.Queue(maxsize=1000)
+        self.descartados = 0
+        self._avisou_erro = False
+
+    def enviar(self, rastro: Rastro):
+        try:
+            self.fila.put_nowait(rastro)
+        except queue.Full:
+            self.descartados += 1
+
+    def run(self):
+        http = httpx.Client(timeout=5) if self.otlp_url else None
+        while True:
+            rastro = self.fila.get()
+            try:
+                if self.arquivo:
+                    with open(self.arquivo, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(rastro.como_dict(), ensure_ascii=False) + "\n")
+                if http is not None:
+                    http.post(self.otlp_url, json=_para_otlp(rastro)).raise_for_status()
+            except Exception as e:
+                if not self._avisou_erro:
+                    print(f"[TRACING] Falha ao exportar rastro ({e}); próximos erros serão omitidos")
+                    self._avisou_erro = True
+
+
+_exportador = None
+_lock_exportador = threading.Lock()
+
+
+def exportar(rastro: Rastro):
+    global _exportador
+    if not (TRACING_ARQUIVO or TRACING_OTLP_URL):
+        return
+    if _exportador is None:
+        with _lock_exportador:
+            if _exportador is None:
+                pasta = os.path.dirname(TRACING_ARQUIVO)
+                if pasta:
+                    os.makedirs(pasta, exist_ok=True)
+                _exportador = _Exportador(TRACING_ARQUIVO, TRACING_OTLP_URL)
+                _exportador.start()
+    _exportador.enviar(rastro)
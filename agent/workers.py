@@ -0,0 +1,41 @@
+"""
+Pool de processos compartilhado para trabalho CPU-bound (extração de PDF etc.)
+
+O pool é criado sob demanda e limitado por WORKERS_CPU, para que várias
+requisições pesadas ao mesmo tempo não disputem o event loop nem criem
+processos sem limite.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+WORKERS_CPU = int(os.getenv("WORKERS_CPU", str(os.cpu_count() or 1)))
+
+_pool = None
+
+
+def obter_pool() -> ProcessPoolExecutor:
+    """Retorna o pool global, criando na primeira chamada"""
+    global _pool
+    if _pool is None:
+        # spawn: o servidor já tem threads rodando (event loop, httpx),
+        # então fork não é seguro aqui
+        _pool = ProcessPoolExecutor(
+            max_workers=WORKERS_CPU,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+async def executar_em_processo(func, *args):
+    """Executa func(*args) no pool de processos sem bloquear o event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(obter_pool(), func, *args)
+
+
+def encerrar_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Benchmark da compactação do texto da dieta (compactar_paginas).
+
+Antes de medir, confere que o boilerplate sai e que linhas com alimento ou
+quantidade ficam: orientação de hidratação só é removida quando fala de
+água pura e sem quantidade.
+
+Uso:
+    python benchmarks/bench_compactacao.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")  # o cliente não é usado
+
+from dietas_sinteticas import texto_dieta_sintetica  # noqa: E402
+from agent.compactacao import _compactar  # noqa: E402
+
+CABECALHO = "Clínica Nutri Bem - Dra. Ana Souza\nCRN-3 12345\n"
+RODAPE = "\ncontato@nutribem.com.br | (11) 98765-4321\nPágina {} de {}"
+
+REMOVIDAS = [
+    "CRN-3 12345",
+    "contato@nutribem.com.br",
+    "www.nutribem.com.br",
+    "Beba bastante água ao longo do dia",
+    "Beba água",
+    "Hidratação: beba água ao longo do dia",
+    "Este plano é individual e intransferível",
+]
+
+MANTIDAS = [
+    "Tome água de coco no lanche da tarde",
+    "Beba água com limão em jejum",
+    "Beba 2 litros de água",
+    "Consuma 2 litros de água por dia",
+    "Hidratação: mínimo 2L por dia",
+    "Tome água e chá durante o dia",
+    "Almoço: 150g de arroz",
+]
+
+
+def paginas_sinteticas(itens: int, paginas: int) -> list:
+    linhas = texto_dieta_sintetica(itens, 7).splitlines()
+    por_pagina = -(-len(linhas) // paginas)
+    return [
+        CABECALHO + "\n".join(linhas[i:i + por_pagina]) + RODAPE.format(n + 1, paginas)
+        for n, i in enumerate(range(0, len(linhas), por_pagina))
+    ]
+
+
+def conferir():
+    for linha in REMOVIDAS:
+        assert _compactar([linha]) == ("", 1), linha
+    for linha in MANTIDAS:
+        assert _compactar([linha]) == (linha, 0), linha
+
+    paginas = paginas_sinteticas(200, 5)
+    texto, _ = _compactar(paginas)
+    assert texto.count("CRN-3") == 0 and "Página" not in texto, texto[:200]
+    assert texto.count("Clínica Nutri Bem") == 1, texto[:200]
+
+
+def main():
+    conferir()
+    print("Compactação do texto da dieta (ms por dieta):")
+    for itens, paginas in ((20, 1), (200, 5), (2000, 30)):
+        texto = paginas_sinteticas(itens, paginas)
+        tempo = min(timeit.repeat(lambda: _compactar(texto), number=5, repeat=3)) / 5
+        print(f"  {itens:5d} itens, {paginas:2d} páginas: {tempo * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
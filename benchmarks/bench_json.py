@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Benchmark da leitura incremental do JSON da interpretação (LeitorJson).
+
+Mede o custo de acompanhar a resposta em streaming (pedaços de ~1 token)
+contra um json.loads único no fim, e confere antes o reparo: todo prefixo
+da resposta vira JSON válido, vírgulas sobrando são removidas e as
+refeições entregues durante o streaming batem com o parse final.
+
+Uso:
+    python benchmarks/bench_json.py
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")  # o cliente não é usado
+
+from dietas_sinteticas import resposta_ia_sintetica  # noqa: E402
+from agent.ai_parser import _parsear_json  # noqa: E402
+from agent.json_incremental import LeitorJson, reparar_json  # noqa: E402
+
+# ~1 token por pedaço, como chega do streaming
+CARACTERES_POR_PEDACO = 4
+
+
+def ler_em_pedacos(resposta: str) -> tuple:
+    leitor = LeitorJson()
+    refeicoes = []
+    for i in range(0, len(resposta), CARACTERES_POR_PEDACO):
+        leitor.alimentar(resposta[i:i + CARACTERES_POR_PEDACO])
+        refeicoes.extend(leitor.refeicoes_concluidas())
+    return leitor, refeicoes
+
+
+def conferir():
+    for dias in (1, 7):
+        resposta = resposta_ia_sintetica(40, dias)
+        esperado = json.loads(resposta.split("```json")[1].split("```")[0])
+
+        leitor, refeicoes = ler_em_pedacos(resposta)
+        assert leitor.completo and json.loads(leitor.reparado()) == esperado
+        assert dict(refeicoes) == esperado["refeicoes"]
+
+        for corte in range(len(resposta)):
+            reparado = reparar_json(resposta[:corte])
+            if reparado is not None:
+                json.loads(reparado)
+
+    com_virgulas = '{"refeicoes": {"almoco": [{"item": "Arroz", "quantidade": "150g",}],}, "dias": 1,}'
+    resultado = _parsear_json(com_virgulas)
+    assert resultado == {"refeicoes": {"almoco": [{"item": "Arroz", "quantidade": "150g"}]}, "dias": 1}, resultado
+    leitor, refeicoes = ler_em_pedacos(com_virgulas)
+    assert refeicoes == [("almoco", [{"item": "Arroz", "quantidade": "150g"}])], refeicoes
+    # Vírgula dentro de string fica
+    assert json.loads(reparar_json('{"a": ",]", "b": [1,],}')) == {"a": ",]", "b": [1]}
+    # Cortada: sem o item pela metade e sem a vírgula antes dele
+    assert json.loads(reparar_json('{"a": [{"item": "Arroz"}, {"item": "Fei')) == {"a": [{"item": "Arroz"}, {}]}
+
+
+def main():
+    conferir()
+    print("Leitura da resposta da interpretação (ms por resposta):")
+    for itens in (20, 200, 2000):
+        resposta = resposta_ia_sintetica(itens, 7)
+        inteiro = min(timeit.repeat(lambda: _parsear_json(resposta), number=5, repeat=3)) / 5
+        pedacos = min(timeit.repeat(lambda: ler_em_pedacos(resposta), number=5, repeat=3)) / 5
+        print(f"  {itens:5d} itens: json.loads no fim {inteiro * 1000:7.2f} | "
+              f"LeitorJson em pedaços {pedacos * 1000:7.2f}")
+
+
+if __name__ == "__main__":
+    main()
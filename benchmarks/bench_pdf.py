@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Benchmark do PDF da lista de compras (gerar_pdf_lista_compras).
+
+Compara os modos "platypus" (tabela do reportlab) e "canvas" (desenho direto)
+em listas de 20, 200 e 2000 linhas, e a sanitização por str.translate com a
+implementação anterior (um str.replace por caractere).
+
+Uso:
+    python benchmarks/bench_pdf.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")  # o cliente não é usado
+
+from dietas_sinteticas import lista_sintetica  # noqa: E402
+from agent.pdf_generator import _sanitizar_str, gerar_pdf_lista_compras, sanitizar  # noqa: E402
+
+
+def sanitizar_anterior(texto):
+    """Implementação anterior, mantida aqui só como referência de comparação"""
+    if not texto:
+        return ""
+    texto = str(texto)
+    correcoes = {
+        'ã': 'a', 'á': 'a', 'à': 'a', 'â': 'a', 'é': 'e', 'ê': 'e', 'í': 'i',
+        'ó': 'o', 'ô': 'o', 'õ': 'o', 'ú': 'u', 'ü': 'u', 'ç': 'c',
+        'Ã': 'A', 'Á': 'A', 'À': 'A', 'Â': 'A', 'É': 'E', 'Ê': 'E', 'Í': 'I',
+        'Ó': 'O', 'Ô': 'O', 'Õ': 'O', 'Ú': 'U', 'Ü': 'U', 'Ç': 'C'
+    }
+    for char_acentuado, char_normal in correcoes.items():
+        texto = texto.replace(char_acentuado, char_normal)
+    texto = texto.encode('ascii', 'ignore').decode('ascii')
+    for char in ['&', '<', '>', '\n', '\r', '\t']:
+        texto = texto.replace(char, ' ')
+    return texto.strip()[:200]
+
+
+def medir(func, repeticoes=3) -> float:
+    """Milissegundos por chamada (melhor de `repeticoes`)"""
+    numero = 1
+    return min(timeit.repeat(func, number=numero, repeat=repeticoes)) / numero * 1000
+
+
+def main():
+    celulas = [v for item in lista_sintetica(2000) for v in item.values()]
+    for celula in set(celulas) | {None, ""}:
+        assert sanitizar_anterior(celula) == sanitizar(celula), celula
+    for celula in (["1", "kg"], {"valor": 2}, 3.5):  # a lista vem do cliente
+        assert sanitizar_anterior(celula) == sanitizar(celula), celula
+
+    anterior = min(timeit.repeat(lambda: [sanitizar_anterior(c) for c in celulas], number=5, repeat=3)) / 5
+    atual = min(timeit.repeat(lambda: [_sanitizar_str.__wrapped__(str(c)) for c in celulas], number=5, repeat=3)) / 5
+    print(f"Sanitização de {len(celulas)} células:")
+    print(f"  anterior (replace):    {anterior * 1000:8.2f} ms")
+    print(f"  atual (translate):     {atual * 1000:8.2f} ms  ({anterior / atual:4.1f}x)")
+
+    print("\nRender do PDF:")
+    for linhas in (20, 200, 2000):
+        lista = lista_sintetica(linhas)
+        tempos = {modo: medir(lambda: gerar_pdf_lista_compras(lista, modo)) for modo in ("platypus", "canvas")}
+        print(f"  {linhas:5d} linhas: platypus {tempos['platypus']:8.1f} ms | canvas {tempos['canvas']:8.1f} ms "
+              f"({tempos['platypus'] / tempos['canvas']:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
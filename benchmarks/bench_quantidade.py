@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark do parser de quantidades (_extrair_quantidade).
+
+Compara, por item de uma dieta semanal sintética, a implementação anterior
+(tabelas e regex recriadas a cada chamada) com a atual (tabelas no import,
+regex canônica única e memoização).
+
+Uso:
+    python benchmarks/bench_quantidade.py
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")  # o cliente não é usado
+
+from agent.ai_parser import _extrair_quantidade  # noqa: E402
+
+
+def extrair_quantidade_anterior(qtd_str: str) -> tuple:
+    """Implementação anterior, mantida aqui só como referência de comparação"""
+    qtd_str = qtd_str.lower().strip()
+    UNIDADES_COMPOSTAS = {
+        "colher_sopa": ("colher_sopa", 1),
+        "colher_cha": ("colher_cha", 1),
+        "xicara": ("xicara", 1),
+    }
+    for alias, (unidade_final, fator) in UNIDADES_COMPOSTAS.items():
+        if alias in qtd_str:
+            match = re.search(r'(\d+\.?\d*)', qtd_str)
+            qtd = float(match.group(1)) if match else 1.0
+            return qtd * fator, unidade_final
+    ALIAS_UNIDADES = [
+        (r'colher(?:es)?\s*de\s*sopa', "colher_sopa", 1),
+        (r'colher(?:es)?\s*de\s*ch[aá]', "colher_cha", 1),
+        (r'x[ií]car[as]?', "xicara", 1),
+        (r'kg', "g", 1000),
+        (r'gramas?', "g", 1),
+        (r'ml', "ml", 1),
+        (r'litros?|(?<![a-z])l(?![a-z])', "ml", 1000),
+        (r'g\b', "g", 1),
+        (r'latas?', "lata", 1),
+        (r'sach[eê]s?|envelopes?', "sache", 1),
+        (r'caixas?', "caixa", 1),
+        (r'pacotes?', "pacote", 1),
+        (r'por[çc][oõ]es?|por[çc][aã]o', "porcao", 1),
+        (r'conchas?', "g", 100),
+        (r'potes?', "pote", 1),
+        (r'colheres?', "colher_sopa", 1),
+        (r'fatias?', "fatia", 1),
+        (r'unidades?|un\.?|und\.?', "unidade", 1),
+    ]
+    for padrao, unidade_final, fator in ALIAS_UNIDADES:
+        if re.search(padrao, qtd_str):
+            match_n = re.search(r'(\d+\.?\d*)', qtd_str)
+            qtd = float(match_n.group(1)) if match_n else 1.0
+            return qtd * fator, unidade_final
+    match_num = re.search(r'(\d+\.?\d*)', qtd_str)
+    if match_num:
+        return float(match_num.group(1)), "unidade"
+    return 0, "unidade"
+
+
+# Quantidades típicas de uma dieta (já normalizadas pela IA)
+QUANTIDADES_DIA = [
+    "1 unidade", "2 unidades", "200ml", "30g",              # café da manhã
+    "1 unidade", "1 pote",                                   # lanche da manhã
+    "4 colher_sopa", "100g", "150g", "100g", "1 colher_sopa",  # almoço
+    "1 unidade", "30g", "2 fatias",                          # lanche da tarde
+    "150g", "100g", "100g", "1 colher_cha",                  # jantar
+    "200ml", "1 colher_sopa",                                # ceia
+]
+DIETA_SEMANAL = QUANTIDADES_DIA * 7
+
+
+def medir(func, itens, repeticoes=200) -> float:
+    """Microssegundos por item"""
+    tempo = timeit.timeit(lambda: [func(q) for q in itens], number=repeticoes)
+    return tempo / (repeticoes * len(itens)) * 1e6
+
+
+def main():
+    for qtd in set(DIETA_SEMANAL):
+        assert extrair_quantidade_anterior(qtd) == _extrair_quantidade(qtd), qtd
+
+    anterior = medir(extrair_quantidade_anterior, DIETA_SEMANAL)
+
+    _extrair_quantidade.cache_clear()
+    sem_cache = medir(_extrair_quantidade.__wrapped__, DIETA_SEMANAL)
+    com_cache = medir(_extrair_quantidade, DIETA_SEMANAL)
+
+    print(f"Dieta semanal sintética: {len(DIETA_SEMANAL)} itens")
+    print(f"  anterior:              {anterior:8.2f} µs/item")
+    print(f"  atual (sem memo):      {sem_cache:8.2f} µs/item  ({anterior / sem_cache:5.1f}x)")
+    print(f"  atual (com memo):      {com_cache:8.2f} µs/item  ({anterior / com_cache:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Benchmark da interpretação por regras (interpretar_localmente).
+
+Antes de medir, confere casos em que as regras precisam acertar ou devolver
+a dieta para a IA (confiança 0): uma refeição que as regras não leram não
+pode sumir do resultado.
+
+Uso:
+    python benchmarks/bench_regras.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")  # o cliente não é usado
+
+from dietas_sinteticas import texto_dieta_sintetica  # noqa: E402
+from agent.interpretacao_local import interpretar_localmente  # noqa: E402
+
+ALMOCO_REGULAR = "Almoço: " + ", ".join(f"{10 * (i + 1)}g de arroz" for i in range(20))
+
+# texto → refeicoes esperadas (None = tem que ir para a IA)
+CASOS = {
+    "Almoço: 150g arroz, 120g frango grelhado, salada à vontade": {
+        "almoco": [{"item": "Arroz", "quantidade": "150g"},
+                   {"item": "Frango grelhado", "quantidade": "120g"},
+                   {"item": "Salada", "quantidade": "a vontade"}],
+    },
+    # Vírgula decimal não separa itens
+    "Almoço: 150g arroz, 1,5 xícara de feijão": {
+        "almoco": [{"item": "Arroz", "quantidade": "150g"},
+                   {"item": "Feijão", "quantidade": "1.5 xicara"}],
+    },
+    # Porção/prato/pedaço não é quantidade: a IA estima em gramas
+    ALMOCO_REGULAR + ", 1 porção de frango": None,
+    ALMOCO_REGULAR + "\nJantar: 1 prato de salada, 120g de carne": None,
+    ALMOCO_REGULAR + "\nLanche: 2 pedaços de bolo": None,
+    # Dois alimentos num nome só: o segundo sumiria da lista
+    ALMOCO_REGULAR + "\nLanche: 2 fatias de pão integral com queijo branco": None,
+    ALMOCO_REGULAR + "\nJantar: 150g de arroz e feijão": None,
+    ALMOCO_REGULAR + "\nJantar: 150g arroz feijão": None,
+    ALMOCO_REGULAR + "\nLanche: 1 pão/queijo": None,
+    "Jantar: 120g peito de frango, 150g filé de tilápia": {
+        "jantar": [{"item": "Peito de frango", "quantidade": "120g"},
+                   {"item": "Filé de tilápia", "quantidade": "150g"}],
+    },
+    # Refeição sem nenhum item entendido não pode sumir
+    ALMOCO_REGULAR + "\nJantar: sopa de legumes": None,
+    ALMOCO_REGULAR + "\nJantar:\n- Sopa de legumes": None,
+    # Item não entendido dentro de uma refeição manda para a IA
+    ALMOCO_REGULAR + ", sopa de legumes": None,
+}
+
+
+def conferir():
+    for texto, esperado in CASOS.items():
+        dieta, confianca = interpretar_localmente(texto)
+        if esperado is None:
+            assert dieta is None and confianca == 0, (texto, dieta, confianca)
+        else:
+            assert dieta == {"refeicoes": esperado, "dias": 1} and confianca == 1, (texto, dieta, confianca)
+
+    dieta, confianca = interpretar_localmente(texto_dieta_sintetica(30))
+    assert confianca == 1 and sum(map(len, dieta["refeicoes"].values())) == 30
+
+
+def main():
+    conferir()
+    print("Interpretação por regras (ms por dieta):")
+    for itens in (20, 200, 2000):
+        texto = texto_dieta_sintetica(itens)
+        tempo = min(timeit.repeat(lambda: interpretar_localmente(texto), number=5, repeat=3)) / 5
+        print(f"  {itens:5d} itens: {tempo * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
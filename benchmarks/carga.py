@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+"""
+Gerador de carga para o fluxo completo do servidor:
+/dieta → /chat → /finalizar → /gerar-pdf, com N usuários simultâneos.
+
+Reporta latência p50/p95/p99 por endpoint, vazão (fluxos completos/s) e o
+atraso do event loop do servidor, medido pela latência do GET /health
+sondado em paralelo (o /health não faz trabalho nenhum, então o tempo dele é
+quase todo fila no event loop).
+
+Para não gastar créditos, rode o servidor contra o OpenAI falso:
+    python benchmarks/openai_falso.py --porta 8099 --latencia-ms 800 &
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=sk-falso uvicorn server:app --port 8000 &
+    python benchmarks/carga.py --url http://127.0.0.1:8000 --usuarios 50 --duracao 60
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from dietas_sinteticas import texto_dieta_sintetica  # noqa: E402
+
+ETAPAS = ["/dieta", "/chat", "/finalizar", "/gerar-pdf"]
+
+# Turno livre (longo demais para o roteiro local): sempre passa pela IA
+MENSAGEM_CHAT = "Somos 2 pessoas, pode trocar o frango do jantar por peixe e tirar o pão do café da manhã?"
+
+
+class Coleta:
+    def __init__(self):
+        self.latencias = {etapa: [] for etapa in ETAPAS + ["/health"]}
+        self.erros = {etapa: 0 for etapa in ETAPAS + ["/health"]}
+        self.fluxos = 0
+        self.atraso_local = []  # atraso do event loop do próprio gerador
+
+    def registrar(self, etapa: str, inicio: float, ok: bool):
+        if ok:
+            self.latencias[etapa].append(time.perf_counter() - inicio)
+        else:
+            self.erros[etapa] += 1
+
+
+def _ok(resposta: httpx.Response) -> bool:
+    if resposta.status_code != 200:
+        return False
+    if resposta.headers.get("content-type", "").startswith("application/json"):
+        return "erro" not in resposta.json()
+    return True
+
+
+async def fluxo(http: httpx.AsyncClient, coleta: Coleta, itens: int, variar: bool):
+    """Um usuário do início ao fim. Para no primeiro passo que falhar."""
+    texto = texto_dieta_sintetica(itens)
+    if variar:
+        # Texto único por fluxo: evita que o cache de interpretação responda tudo
+        texto += f"\nObs: {uuid.uuid4().hex}"
+
+    inicio = time.perf_counter()
+    r = await http.post("/dieta", data={"texto": texto})
+    coleta.registrar("/dieta", inicio, _ok(r))
+    if not _ok(r):
+        return
+    sessao_id = r.json().get("sessao_id")
+
+    inicio = time.perf_counter()
+    r = await http.post("/chat", json={"sessao_id": sessao_id, "mensagem_usuario": MENSAGEM_CHAT})
+    coleta.registrar("/chat", inicio, _ok(r))
+    if not _ok(r):
+        return
+
+    inicio = time.perf_counter()
+    r = await http.post("/finalizar", json={"sessao_id": sessao_id})
+    coleta.registrar("/finalizar", inicio, _ok(r))
+    if not _ok(r):
+        return
+    lista = r.json().get("lista_compras", [])
+
+    inicio = time.perf_counter()
+    r = await http.post("/gerar-pdf", json={"lista_compras": lista})
+    coleta.registrar("/gerar-pdf", inicio, _ok(r))
+    if _ok(r):
+        coleta.fluxos += 1
+
+
+async def usuario(http: httpx.AsyncClient, coleta: Coleta, fim: float, itens: int, variar: bool):
+    while time.perf_counter() < fim:
+        try:
+            await fluxo(http, coleta, itens, variar)
+        except httpx.HTTPError:
+            coleta.erros["/dieta"] += 1
+
+
+async def sondar_health(http: httpx.AsyncClient, coleta: Coleta, fim: float, intervalo: float):
+    while time.perf_counter() < fim:
+        inicio = time.perf_counter()
+        try:
+            r = await http.get("/health")
+            coleta.registrar("/health", inicio, r.status_code == 200)
+        except httpx.HTTPError:
+            coleta.erros["/health"] += 1
+        await asyncio.sleep(intervalo)
+
+
+async def medir_atraso_local(coleta: Coleta, fim: float, intervalo: float = 0.05):
+    """Se o próprio gerador estiver saturado, os números do servidor não valem"""
+    while time.perf_counter() < fim:
+        antes = time.perf_counter()
+        await asyncio.sleep(intervalo)
+        coleta.atraso_local.append(time.perf_counter() - antes - intervalo)
+
+
+def _percentis(amostras: list) -> dict:
+    if not amostras:
+        return {"n": 0}
+    ordenadas = sorted(amostras)
+
+    def p(q):
+        return round(ordenadas[min(int(q * len(ordenadas)), len(ordenadas) - 1)] * 1000, 1)
+    return {"n": len(ordenadas), "p50_ms": p(0.50), "p95_ms": p(0.95), "p99_ms": p(0.99),
+            "max_ms": round(ordenadas[-1] * 1000, 1), "media_ms": round(statistics.mean(ordenadas) * 1000, 1)}
+
+
+async def executar(url: str, usuarios: int, duracao: float, itens: int, variar: bool,
+                   intervalo_health: float) -> dict:
+    coleta = Coleta()
+    limites = httpx.Limits(max_connections=usuarios + 10, max_keepalive_connections=usuarios + 10)
+    inicio = time.perf_counter()
+    fim = inicio + duracao
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=120) as http:
+        await asyncio.gather(
+            *(usuario(http, coleta, fim, itens, variar) for _ in range(usuarios)),
+            sondar_health(http, coleta, fim, intervalo_health),
+            medir_atraso_local(coleta, fim),
+        )
+    decorrido = time.perf_counter() - inicio
+
+    return {
+        "url": url,
+        "usuarios": usuarios,
+        "duracao_s": round(decorrido, 1),
+        "fluxos_completos": coleta.fluxos,
+        "fluxos_por_segundo": round(coleta.fluxos / decorrido, 2),
+        "endpoints": {etapa: {**_percentis(coleta.latencias[etapa]), "erros": coleta.erros[etapa]}
+                      for etapa in ETAPAS},
+        "atraso_event_loop_servidor": _percentis(coleta.latencias["/health"]),
+        "atraso_event_loop_gerador": _percentis(coleta.atraso_local),
+    }
+
+
+def imprimir(relatorio: dict):
+    print(f"\n{relatorio['usuarios']} usuários por {relatorio['duracao_s']}s → "
+          f"{relatorio['fluxos_completos']} fluxos completos ({relatorio['fluxos_por_segundo']}/s)\n")
+    print(f"  {'endpoint':<12} {'n':>6} {'erros':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    linhas = list(relatorio["endpoints"].items()) + [
+        ("/health", {**relatorio["atraso_event_loop_servidor"], "erros": "-"})]
+    for etapa, dados in linhas:
+        if not dados.get("n"):
+            print(f"  {etapa:<12} {0:>6} {dados['erros']:>6}")
+            continue
+        print(f"  {etapa:<12} {dados['n']:>6} {dados['erros']:>6} {dados['p50_ms']:>7}ms "
+              f"{dados['p95_ms']:>7}ms {dados['p99_ms']:>7}ms {dados['max_ms']:>7}ms")
+    local = relatorio["atraso_event_loop_gerador"]
+    if local.get("n") and local["p99_ms"] > 50:
+        print(f"\n  ⚠️ O gerador está saturado (atraso p99 {local['p99_ms']}ms): use menos usuários "
+              "ou rode mais instâncias")
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Teste de carga do fluxo /dieta → /chat → /finalizar → /gerar-pdf")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--usuarios", type=int, default=20, help="usuários simultâneos")
+    parser.add_argument("--duracao", type=float, default=30, help="segundos de carga")
+    parser.add_argument("--itens", type=int, default=30, help="itens por dieta enviada")
+    parser.add_argument("--repetir-dieta", action="store_true",
+                        help="envia sempre o mesmo texto (mede o caminho com cache)")
+    parser.add_argument("--intervalo-health", type=float, default=0.1, help="segundos entre sondas do /health")
+    parser.add_argument("--saida", help="salva o relatório em JSON")
+    args = parser.parse_args(argv)
+
+    relatorio = asyncio.run(executar(args.url, args.usuarios, args.duracao, args.itens,
+                                     not args.repetir_dieta, args.intervalo_health))
+    imprimir(relatorio)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Dietas sintéticas para os benchmarks (sem IA, sem rede).
+
+Os itens imitam o que o SYSTEM_INTERPRETACAO devolve: nomes reais de
+alimentos, quantidades no formato canônico ("150g", "1 colher_sopa") e, nas
+dietas semanais, o campo "vezes".
+"""
+import json
+import random
+
+REFEICOES = ["cafe_manha", "lanche_manha", "almoco", "lanche_tarde", "jantar", "ceia"]
+
+ITENS = [
+    ("Pão francês", "1 unidade"), ("Pão integral", "2 fatias"), ("Ovo", "2 unidades"),
+    ("Leite desnatado", "200ml"), ("Aveia", "30g"), ("Banana", "1 unidade"),
+    ("Maçã", "1 unidade"), ("Mamão", "100g"), ("Iogurte natural", "1 pote"),
+    ("Queijo minas", "30g"), ("Arroz integral cozido", "4 colher_sopa"), ("Arroz", "100g"),
+    ("Feijão", "1 concha"), ("Frango grelhado", "150g"), ("Carne moída", "100g"),
+    ("Tilápia grelhada", "150g"), ("Batata doce cozida", "100g"), ("Macarrão integral", "100g"),
+    ("Brócolis cozido", "100g"), ("Salada de folhas", "à vontade"), ("Tomate", "1 unidade"),
+    ("Cenoura ralada", "2 colher_sopa"), ("Azeite", "1 colher_cha"), ("Castanha do pará", "2 unidades"),
+    ("Whey protein", "30g"), ("Pasta de amendoim", "1 colher_sopa"), ("Mel", "1 colher_cha"),
+    ("Tapioca", "3 colher_sopa"), ("Requeijão light", "1 colher_sopa"), ("Abacate", "100g"),
+]
+
+
+def dieta_sintetica(total_itens: int, dias: int = 1, semente: int = 42) -> dict:
+    """Dieta estruturada com `total_itens` itens espalhados pelas refeições"""
+    aleatorio = random.Random(semente)
+    refeicoes = {nome: [] for nome in REFEICOES}
+    for i in range(total_itens):
+        nome, quantidade = aleatorio.choice(ITENS)
+        item = {"item": nome, "quantidade": quantidade}
+        if dias == 7:
+            item["vezes"] = aleatorio.choice([1, 2, 3, 5, 7])
+        refeicoes[REFEICOES[i % len(REFEICOES)]].append(item)
+    return {
+        "refeicoes": {nome: itens for nome, itens in refeicoes.items() if itens},
+        "dias": dias,
+        "pessoas": 2,
+    }
+
+
+def resposta_ia_sintetica(total_itens: int, dias: int = 1, semente: int = 42) -> str:
+    """Resposta da IA como chega do modelo (JSON dentro de bloco markdown)"""
+    dieta = dieta_sintetica(total_itens, dias, semente)
+    for indice, itens in enumerate(dieta["refeicoes"].values()):
+        if indice % 2:
+            itens[0]["estimado"] = True
+    return "```json\n" + json.dumps({"refeicoes": dieta["refeicoes"], "dias": dias}, ensure_ascii=False) + "\n```"
+
+
+def lista_sintetica(total_itens: int) -> list:
+    """Lista de compras com `total_itens` linhas (para o PDF)"""
+    return [
+        {
+            "nome": f"{ITENS[i % len(ITENS)][0]} {i // len(ITENS) + 1}" if i >= len(ITENS) else ITENS[i][0],
+            "quantidade": ["500g", "1kg", "6 unidades (meia dúzia)", "1L", "2 pacotes"][i % 5],
+            "motivo": "almoco+jantar (150/dia × 7 dias × 2 pessoa(s))",
+        }
+        for i in range(total_itens)
+    ]
+
+
+NOMES_REFEICOES = {
+    "cafe_manha": "Café da manhã", "lanche_manha": "Lanche da manhã", "almoco": "Almoço",
+    "lanche_tarde": "Lanche da tarde", "jantar": "Jantar", "ceia": "Ceia",
+}
+
+
+def texto_dieta_sintetica(total_itens: int, dias: int = 1, semente: int = 42) -> str:
+    """A mesma dieta em texto livre, como o usuário cola no /dieta"""
+    dieta = dieta_sintetica(total_itens, dias, semente)
+    linhas = ["Plano alimentar" + (" semanal" if dias == 7 else "")]
+    for refeicao, itens in dieta["refeicoes"].items():
+        linhas.append("")
+        linhas.append(NOMES_REFEICOES[refeicao] + ":")
+        for item in itens:
+            vezes = f" ({item['vezes']}x na semana)" if "vezes" in item else ""
+            linhas.append(f"- {item['quantidade']} de {item['item']}{vezes}")
+    return "\n".join(linhas)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+Servidor falso da API de chat completions da OpenAI, para teste de carga.
+
+Responde POST /v1/chat/completions no mesmo formato da API real (inclusive
+streaming em SSE), com latência sorteada de uma distribuição configurável e
+injeção de erros 500 e 429. Pedidos com o SYSTEM_INTERPRETACAO recebem um JSON
+de dieta sintética; os demais recebem as respostas roteirizadas do chat.
+
+Uso:
+    python benchmarks/openai_falso.py --porta 8099 --latencia-ms 800 --distribuicao lognormal
+
+E o servidor apontando para ele:
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=sk-falso uvicorn server:app
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from dietas_sinteticas import dieta_sintetica  # noqa: E402
+
+RESPOSTA_PRIMEIRO_TURNO = "Recebi sua dieta! Pra quantas pessoas é a compra?"
+RESPOSTA_FINAL = "Perfeito! Clique em 'Finalizar' para gerar sua lista de compras. [LISTA_PRONTA]"
+
+
+class Configuracao:
+    latencia_ms = 500.0
+    distribuicao = "lognormal"  # fixa | uniforme | normal | lognormal | exponencial
+    desvio = 0.5                # sigma da lognormal / fração da média nas demais
+    tokens_por_segundo = 80.0   # ritmo do streaming
+    taxa_erro = 0.0             # fração de respostas 500
+    taxa_429 = 0.0              # fração de respostas 429 (rate limit)
+    itens_dieta = 30
+
+
+config = Configuracao()
+app = FastAPI(title="OpenAI falso")
+contadores = {"requisicoes": 0, "streams": 0, "erros_500": 0, "erros_429": 0}
+
+
+def sortear_latencia() -> float:
+    """Latência (s) até o primeiro byte, segundo a distribuição configurada"""
+    media = config.latencia_ms / 1000
+    if config.distribuicao == "fixa":
+        return media
+    if config.distribuicao == "uniforme":
+        return random.uniform(media * (1 - config.desvio), media * (1 + config.desvio))
+    if config.distribuicao == "normal":
+        return max(0.0, random.gauss(media, media * config.desvio))
+    if config.distribuicao == "exponencial":
+        return random.expovariate(1 / media) if media else 0.0
+    # lognormal com a mesma média: cauda longa, como a API real
+    if not media:
+        return 0.0
+    return random.lognormvariate(0, config.desvio) * media / (2.718281828 ** (config.desvio ** 2 / 2))
+
+
+def _conteudo(mensagens: list) -> str:
+    sistema = mensagens[0].get("content", "") if mensagens else ""
+    if "extrator" in sistema:
+        dieta = dieta_sintetica(config.itens_dieta, 1, semente=random.randint(0, 10 ** 6))
+        return "```json\n" + json.dumps({"refeicoes": dieta["refeicoes"], "dias": 1}, ensure_ascii=False) + "\n```"
+    turnos_assistente = sum(1 for m in mensagens if m.get("role") == "assistant")
+    return RESPOSTA_PRIMEIRO_TURNO if turnos_assistente == 0 else RESPOSTA_FINAL
+
+
+def _tokens(texto: str) -> int:
+    return max(1, len(texto) // 4)
+
+
+def _erro(status: int, mensagem: str, tipo: str) -> JSONResponse:
+    headers = {"retry-after": "1"} if status == 429 else None
+    return JSONResponse(status_code=status, headers=headers,
+                        content={"error": {"message": mensagem, "type": tipo, "code": None}})
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    corpo = await request.json()
+    contadores["requisicoes"] += 1
+    await asyncio.sleep(sortear_latencia())
+
+    sorteio = random.random()
+    if sorteio < config.taxa_429:
+        contadores["erros_429"] += 1
+        return _erro(429, "Rate limit reached (falso)", "rate_limit_exceeded")
+    if sorteio < config.taxa_429 + config.taxa_erro:
+        contadores["erros_500"] += 1
+        return _erro(500, "Erro interno (falso)", "server_error")
+
+    mensagens = corpo.get("messages", [])
+    conteudo = _conteudo(mensagens)
+    modelo = corpo.get("model", "gpt-4o-mini")
+    id_resposta = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    criado = int(time.time())
+    uso = {
+        "prompt_tokens": sum(_tokens(str(m.get("content", ""))) for m in mensagens),
+        "completion_tokens": _tokens(conteudo),
+    }
+    uso["total_tokens"] = uso["prompt_tokens"] + uso["completion_tokens"]
+
+    if not corpo.get("stream"):
+        return {
+            "id": id_resposta, "object": "chat.completion", "created": criado, "model": modelo,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": conteudo}}],
+            "usage": uso,
+        }
+
+    contadores["streams"] += 1
+    incluir_uso = (corpo.get("stream_options") or {}).get("include_usage", False)
+
+    def pedaco(delta: dict, fim: str = None, usage: dict = None, choices: bool = True) -> str:
+        dados = {"id": id_resposta, "object": "chat.completion.chunk", "created": criado, "model": modelo,
+                 "choices": [{"index": 0, "delta": delta, "finish_reason": fim}] if choices else []}
+        if usage is not None:
+            dados["usage"] = usage
+        return f"data: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+    async def eventos():
+        yield pedaco({"role": "assistant", "content": ""})
+        intervalo = 1 / config.tokens_por_segundo if config.tokens_por_segundo else 0
+        for i in range(0, len(conteudo), 4):  # ~1 token a cada 4 caracteres
+            yield pedaco({"content": conteudo[i:i + 4]})
+            if intervalo:
+                await asyncio.sleep(intervalo)
+        yield pedaco({}, fim="stop")
+        if incluir_uso:
+            yield pedaco({}, usage=uso, choices=False)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(eventos(), media_type="text/event-stream")
+
+
+@app.get("/contadores")
+async def obter_contadores():
+    return contadores
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Servidor falso da API de chat da OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8099)
+    parser.add_argument("--latencia-ms", type=float, default=config.latencia_ms, help="latência média")
+    parser.add_argument("--distribuicao", default=config.distribuicao,
+                        choices=["fixa", "uniforme", "normal", "lognormal", "exponencial"])
+    parser.add_argument("--desvio", type=float, default=config.desvio)
+    parser.add_argument("--tokens-por-segundo", type=float, default=config.tokens_por_segundo,
+                        help="ritmo do streaming (0 = sem pausa)")
+    parser.add_argument("--taxa-erro", type=float, default=config.taxa_erro, help="fração de respostas 500")
+    parser.add_argument("--taxa-429", type=float, default=config.taxa_429, help="fração de respostas 429")
+    parser.add_argument("--itens-dieta", type=int, default=config.itens_dieta,
+                        help="itens na dieta devolvida para o SYSTEM_INTERPRETACAO")
+    args = parser.parse_args(argv)
+
+    config.latencia_ms = args.latencia_ms
+    config.distribuicao = args.distribuicao
+    config.desvio = args.desvio
+    config.tokens_por_segundo = args.tokens_por_segundo
+    config.taxa_erro = args.taxa_erro
+    config.taxa_429 = args.taxa_429
+    config.itens_dieta = args.itens_dieta
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.porta, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
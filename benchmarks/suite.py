@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+"""
+Suite de micro-benchmarks dos caminhos quentes em Python puro.
+
+Roda offline: a IA é substituída por um cliente falso que responde na hora,
+então só o código do projeto é medido. Usa dietas sintéticas de tamanho
+crescente (diária × semanal, 10 a 500 itens) e salva os resultados em JSON
+para comparar execuções entre commits.
+
+Uso:
+    python benchmarks/suite.py                         # roda tudo e salva
+    python benchmarks/suite.py --filtro lista          # só casos com "lista" no nome
+    python benchmarks/suite.py --comparar base.json    # compara com uma execução anterior
+
+Com --comparar, casos mais lentos que a base além de --limite (padrão 15%)
+são listados e o processo sai com código 1 (útil antes do deploy).
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+import types
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")  # o cliente real não é usado
+os.environ["DIETA_CACHE_ARQUIVO"] = ""  # cache de interpretação só em memória
+
+from dietas_sinteticas import dieta_sintetica, lista_sintetica, resposta_ia_sintetica  # noqa: E402
+from agent import agent as agente  # noqa: E402
+from agent import ai_parser  # noqa: E402
+from agent.roteiro_chat import responder_roteiro  # noqa: E402
+
+PASTA_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+
+TAMANHOS = [10, 50, 200, 500]
+DIAS = [1, 7]
+
+MENSAGENS_CHAT = [
+    "somos 3 pessoas",
+    "já tenho arroz e feijão em casa",
+    "prefiro peixe no lugar do frango",
+    "pode trocar a banana por maçã e a aveia por granola?",
+    "é pra semana toda, 7 dias, e eu não como carne vermelha",
+]
+
+
+# =============================================================================
+# IA FALSA
+# =============================================================================
+
+def _resposta_falsa(conteudo: str):
+    return types.SimpleNamespace(
+        choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=conteudo))],
+        usage=types.SimpleNamespace(prompt_tokens=0, completion_tokens=0),
+    )
+
+
+def _pedacos_stream(conteudo: str, tamanho: int = 4) -> list:
+    """Chunks do streaming da OpenAI (~1 token cada), sem uso de tokens"""
+    return [
+        types.SimpleNamespace(
+            choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=conteudo[i:i + tamanho]))],
+            usage=None,
+        )
+        for i in range(0, len(conteudo), tamanho)
+    ]
+
+
+class _CompletionsFalso:
+    def __init__(self, conteudo: str):
+        self.conteudo = conteudo
+
+    def create(self, **kwargs):
+        return _resposta_falsa(self.conteudo)
+
+
+def instalar_ia_falsa(conteudo: str = "Perfeito, anotado!"):
+    """Troca o cliente da OpenAI por um que responde na hora, sem rede"""
+    ai_parser.client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=_CompletionsFalso(conteudo)))
+
+
+# =============================================================================
+# CASOS
+# =============================================================================
+
+CASOS = []  # (nome, preparar) — preparar() retorna (função sem argumentos, itens por execução)
+
+
+def caso(nome: str):
+    def registrar(preparar):
+        CASOS.append((nome, preparar))
+        return preparar
+    return registrar
+
+
+def _itens(dieta: dict) -> list:
+    return [item for itens in dieta["refeicoes"].values() for item in itens]
+
+
+def _registrar_casos():
+    for dias in DIAS:
+        for tamanho in TAMANHOS:
+            sufixo = f"{'semanal' if dias == 7 else 'diaria'}_{tamanho}"
+
+            @caso(f"extrair_quantidade/{sufixo}")
+            def _(tamanho=tamanho, dias=dias):
+                quantidades = [i["quantidade"].strip().lower() for i in _itens(dieta_sintetica(tamanho, dias))]
+
+                def executar():
+                    for qtd in quantidades:
+                        ai_parser._extrair_quantidade(qtd)
+                return executar, len(quantidades)
+
+            @caso(f"normalizar_nome_item/{sufixo}")
+            def _(tamanho=tamanho, dias=dias):
+                nomes = [i["item"] for i in _itens(dieta_sintetica(tamanho, dias))]
+
+                def executar():
+                    for nome in nomes:
+                        ai_parser._normalizar_nome_item(nome)
+                return executar, len(nomes)
+
+            @caso(f"gerar_lista_compras/{sufixo}")
+            def _(tamanho=tamanho, dias=dias):
+                dieta = dieta_sintetica(tamanho, dias)
+                return (lambda: ai_parser.gerar_lista_compras(dieta)), tamanho
+
+            @caso(f"parsear_json/{sufixo}")
+            def _(tamanho=tamanho, dias=dias):
+                resposta = resposta_ia_sintetica(tamanho, dias)
+                return (lambda: ai_parser._parsear_json(resposta)), tamanho
+
+            @caso(f"interpretacao_em_stream/{sufixo}")
+            def _(tamanho=tamanho, dias=dias):
+                # leitura em pedaços + todos os _filtrar_* + estimados + fixos
+                pedacos = _pedacos_stream(resposta_ia_sintetica(tamanho, dias))
+
+                def executar():
+                    leitura = ai_parser._LeituraInterpretacao()
+                    for pedaco in pedacos:
+                        leitura.alimentar(None, pedaco)
+                    return leitura.concluir()
+                return executar, tamanho
+
+    # Filtros isolados: cada execução parte de uma cópia nova (json.loads
+    # incluso; o caso "referencia/json_loads" mede só a cópia)
+    for tamanho in TAMANHOS:
+        serializado = json.dumps({"refeicoes": dieta_sintetica(tamanho, 1)["refeicoes"], "dias": 1},
+                                 ensure_ascii=False)
+
+        @caso(f"referencia/json_loads_{tamanho}")
+        def _(serializado=serializado, tamanho=tamanho):
+            return (lambda: json.loads(serializado)), tamanho
+
+        for filtro in ("_filtrar_refeicoes_invalidas", "_filtrar_substituicoes",
+                       "_filtrar_duplicatas_por_categoria"):
+            @caso(f"{filtro.lstrip('_')}/diaria_{tamanho}")
+            def _(serializado=serializado, tamanho=tamanho, filtro=filtro):
+                funcao = getattr(ai_parser, filtro)
+                return (lambda: funcao(json.loads(serializado))), tamanho
+
+    @caso("chat/extracao_mensagem")
+    def _():
+        dieta = dieta_sintetica(50, 1)
+
+        def executar():
+            for mensagem in MENSAGENS_CHAT:
+                agente._atualizar_dieta_com_mensagem(dieta, mensagem)
+        return executar, len(MENSAGENS_CHAT)
+
+    @caso("chat/roteiro")
+    def _():
+        dieta = dieta_sintetica(50, 1)
+        historico = [
+            {"role": "user", "content": "Recebi minha dieta"},
+            {"role": "assistant", "content": "Pra quantas pessoas é a compra?"},
+        ]
+
+        def executar():
+            for mensagem in MENSAGENS_CHAT:
+                responder_roteiro(dieta, historico, mensagem)
+        return executar, len(MENSAGENS_CHAT)
+
+    @caso("chat/chat_humano_ia_falsa")
+    def _():
+        # Turno livre completo: roteiro, contexto limitado, IA (falsa) e extração
+        dieta = dieta_sintetica(50, 1)
+        historico = []
+        for i in range(10):
+            historico += [{"role": "user", "content": MENSAGENS_CHAT[i % len(MENSAGENS_CHAT)]},
+                          {"role": "assistant", "content": "Anotado! Mais alguma coisa?"}]
+
+        def executar():
+            agente.chat_humano(dieta, list(historico), MENSAGENS_CHAT[3])
+        return executar, 1
+
+    for modo in ("platypus", "canvas"):
+        for tamanho in (20, 200, 2000):
+            @caso(f"gerar_pdf_lista_compras/{modo}_{tamanho}")
+            def _(tamanho=tamanho, modo=modo):
+                from agent.pdf_generator import REPORTLAB_AVAILABLE, _sanitizar_str, gerar_pdf_lista_compras
+                if not REPORTLAB_AVAILABLE:
+                    return None, 0
+                lista = lista_sintetica(tamanho)
+
+                def executar():
+                    _sanitizar_str.cache_clear()  # mede a sanitização também, não só o cache
+                    gerar_pdf_lista_compras(lista, modo)
+                return executar, tamanho
+
+
+# =============================================================================
+# MEDIÇÃO
+# =============================================================================
+
+def medir(funcao, itens: int, repeticoes: int, tempo_minimo: float) -> dict:
+    """Tempo por execução (min e mediana de `repeticoes` amostras)"""
+    timer = timeit.Timer(funcao)
+    numero, tempo = timer.autorange()
+    # autorange mira ~0.2s; ajusta para o tempo mínimo por amostra pedido
+    numero = max(1, int(numero * tempo_minimo / max(tempo, 1e-9)))
+    amostras = [t / numero for t in timer.repeat(repeat=repeticoes, number=numero)]
+    minimo = min(amostras)
+    return {
+        "execucoes_por_amostra": numero,
+        "amostras": repeticoes,
+        "min_ms": round(minimo * 1e3, 6),
+        "mediana_ms": round(statistics.median(amostras) * 1e3, 6),
+        "itens": itens,
+        "us_por_item": round(minimo * 1e6 / itens, 4) if itens else None,
+    }
+
+
+def _commit_atual() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def executar(filtro: str = None, repeticoes: int = 5, tempo_minimo: float = 0.05) -> dict:
+    instalar_ia_falsa()
+    _registrar_casos()
+    resultados = {}
+    # Os módulos do agent fazem print por item; fora da medição isso só polui
+    with open(os.devnull, "w") as nulo:
+        for nome, preparar in CASOS:
+            if filtro and filtro not in nome:
+                continue
+            with contextlib.redirect_stdout(nulo):
+                funcao, itens = preparar()
+                if funcao is None:
+                    continue
+                resultado = medir(funcao, itens, repeticoes, tempo_minimo)
+            resultados[nome] = resultado
+            print(f"  {nome:<48} {resultado['min_ms']:>12.4f} ms"
+                  + (f"  {resultado['us_por_item']:>10.3f} µs/item" if resultado["us_por_item"] else ""))
+
+    return {
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _commit_atual(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "resultados": resultados,
+    }
+
+
+def comparar(atual: dict, base: dict, limite: float) -> list:
+    """Imprime a razão atual/base por caso e retorna os casos que regrediram"""
+    regressoes = []
+    print(f"\nComparação com {base.get('commit') or '?'} ({base.get('data', '?')}):")
+    for nome, resultado in atual["resultados"].items():
+        anterior = base.get("resultados", {}).get(nome)
+        if not anterior:
+            continue
+        razao = resultado["min_ms"] / anterior["min_ms"] if anterior["min_ms"] else 1.0
+        marca = ""
+        if razao > 1 + limite:
+            marca = "  ← REGRESSÃO"
+            regressoes.append(nome)
+        print(f"  {nome:<48} {razao:>6.2f}x{marca}")
+    return regressoes
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks dos caminhos quentes")
+    parser.add_argument("--filtro", help="roda só os casos cujo nome contém este texto")
+    parser.add_argument("--repeticoes", type=int, default=5, help="amostras por caso")
+    parser.add_argument("--tempo-minimo", type=float, default=0.05, help="segundos por amostra")
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: benchmarks/resultados/<data>_<commit>.json)")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--limite", type=float, default=0.15, help="regressão tolerada (0.15 = 15%%)")
+    args = parser.parse_args(argv)
+
+    print("Benchmarks (IA falsa, sem rede):")
+    resultado = executar(args.filtro, args.repeticoes, args.tempo_minimo)
+
+    saida = args.saida
+    if not saida:
+        os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+        data = resultado["data"].replace(":", "").replace("-", "")
+        saida = os.path.join(PASTA_RESULTADOS, f"{data}_{resultado['commit'] or 'sem-commit'}.json")
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados salvos em {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        regressoes = comparar(resultado, base, args.limite)
+        if regressoes:
+            print(f"\n{len(regressoes)} caso(s) mais lentos que a base além de {args.limite:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
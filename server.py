@@ -1,24 +1,37 @@
-from fastapi import FastAPI, UploadFile, File, Form
-from fastapi.responses import FileResponse, HTMLResponse, Response
+from fastapi import FastAPI, UploadFile, File, Form, Request
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import List, Optional
 import os
+import json
+import tempfile
 from dotenv import load_dotenv
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+from agent.sessoes import ArmazemSessoes
+from agent.tracing import estatisticas_etapas, novo_id, rastrear_requisicao, span
+
 # Importar funções do agent (se existirem)
 try:
     from agent.agent import (
         interpretar_dieta_texto,
+        interpretar_dieta_texto_async,
         interpretar_dieta_pdf,
         chat_humano,
-        finalizar_compra
+        chat_humano_async,
+        chat_humano_stream,
+        finalizar_compra,
+        finalizar_compras_em_lote
     )
+    from agent.pdf_reader import PDFMuitoGrandeError
 except ImportError:
+    class PDFMuitoGrandeError(ValueError):
+        pass
+
     # Se não existirem, usar funções simples
     def interpretar_dieta_texto(texto: str) -> dict:
         return {
@@ -26,12 +39,22 @@ except ImportError:
             "escolhas": ["Prefere frango ou peixe?"]
         }
 
-    async def interpretar_dieta_pdf(file):
+    async def interpretar_dieta_texto_async(texto: str) -> dict:
+        return interpretar_dieta_texto(texto)
+
+    async def interpretar_dieta_pdf(arquivo):
         return {"fixos": ["arroz"], "escolhas": []}
 
     def chat_humano(dieta, historico, mensagem):
         return ("Perfeito! Anotado.", historico + [{"role": "assistant", "content": "Perfeito! Anotado."}])
 
+    async def chat_humano_async(dieta, historico, mensagem):
+        return chat_humano(dieta, historico, mensagem)
+
+    async def chat_humano_stream(dieta, historico, mensagem):
+        resposta, _ = chat_humano(dieta, historico, mensagem)
+        yield resposta
+
     def finalizar_compra(dieta_final):
         return [
             {"nome": "Arroz", "quantidade": "2kg", "motivo": "Base alimentar"},
@@ -39,10 +62,24 @@ except ImportError:
             {"nome": "Salada", "quantidade": "500g", "motivo": "Vegetais"}
         ]
 
+    async def finalizar_compras_em_lote(dietas):
+        return [finalizar_compra(dieta) for dieta in dietas]
+
 # Configurações de ambiente
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*")
 
+# Limites de upload do /dieta
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(1024 * 1024)))  # acima disso vai para disco
+MAX_TEXTO_CHARS = int(os.getenv("MAX_TEXTO_CHARS", "50000"))
+MAX_DIETAS_LOTE = int(os.getenv("MAX_DIETAS_LOTE", "10000"))
+MAX_LISTAS_PDF_LOTE = int(os.getenv("MAX_LISTAS_PDF_LOTE", "2000"))
+ERRO_UPLOAD_GRANDE = {
+    "erro": "Arquivo muito grande",
+    "detalhes": "O tamanho máximo é " + f"{MAX_UPLOAD_BYTES / (1024 * 1024):.1f}MB".replace(".0MB", "MB")
+}
+
 # Parse CORS origins
 if ALLOWED_ORIGINS == "*":
     # Apenas para desenvolvimento local ou beta inicial
@@ -64,6 +101,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Content-Location", "X-Request-ID"],
     max_age=600,  # Cache de preflight por 10 minutos
 )
 
@@ -82,14 +120,89 @@ if os.path.exists(static_path):
         pass
 
 
+@app.middleware("http")
+async def limitar_tamanho_upload(request: Request, call_next):
+    """Recusa uploads grandes demais pelo Content-Length, antes de ler o corpo"""
+    if request.url.path == "/dieta":
+        tamanho = request.headers.get("content-length")
+        # margem para os cabeçalhos do multipart
+        if tamanho and tamanho.isdigit() and int(tamanho) > MAX_UPLOAD_BYTES + 64 * 1024:
+            return JSONResponse(status_code=413, content=ERRO_UPLOAD_GRANDE)
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def rastrear(request: Request, call_next):
+    """Rastro por requisição: propaga/gera o X-Request-ID e mede cada etapa"""
+    id_requisicao = request.headers.get("x-request-id", "")
+    if not id_requisicao or len(id_requisicao) > 128 or not id_requisicao.isprintable():
+        id_requisicao = novo_id()
+    tamanho = request.headers.get("content-length", "")
+
+    rastreio = rastrear_requisicao(
+        id_requisicao,
+        metodo=request.method,
+        rota=request.url.path,
+        bytes_entrada=int(tamanho) if tamanho.isdigit() else 0,
+    )
+    with rastreio as raiz:
+        response = await call_next(request)
+        raiz.definir(status=response.status_code)
+        # O rastro só termina depois do corpo enviado (inclui o streaming do chat)
+        rastreio.adiar()
+    response.headers["X-Request-ID"] = id_requisicao
+    response.body_iterator = _corpo_rastreado(response.body_iterator, rastreio)
+    return response
+
+
+async def _corpo_rastreado(corpo, rastreio):
+    enviados = 0
+    try:
+        async for parte in corpo:
+            enviados += len(parte)
+            yield parte
+    finally:
+        rastreio.raiz.definir(bytes_saida=enviados)
+        rastreio.encerrar()
+
+
+@app.on_event("shutdown")
+def encerrar_workers():
+    """Encerra o pool de processos usado para extração e geração de PDF"""
+    try:
+        from agent.workers import encerrar_pool
+        encerrar_pool()
+    except ImportError:
+        pass
+
+
+# Sessões de conversa (dieta + histórico guardados no servidor)
+sessoes = ArmazemSessoes()
+
+
 class ChatRequest(BaseModel):
-    dieta: dict
-    historico: List[dict]
+    # Com sessao_id (retornado pelo /dieta) basta enviar a mensagem nova;
+    # dieta + historico continuam aceitos para clientes antigos
+    sessao_id: Optional[str] = None
+    dieta: Optional[dict] = None
+    historico: Optional[List[dict]] = None
     mensagem_usuario: str
 
 
 class FinalizarRequest(BaseModel):
-    dieta_final: dict
+    dieta_final: Optional[dict] = None
+    sessao_id: Optional[str] = None
+
+
+class FinalizarLoteRequest(BaseModel):
+    dietas: List[dict]
+
+
+class GerarPdfLoteRequest(BaseModel):
+    # [{"nome": "Maria", "lista_compras": [...]}, ...]
+    listas: List[dict]
+    # "zip": um PDF por lista | "pdf": um PDF só, uma seção (página nova) por lista
+    formato: str = "zip"
 
 
 class VerificarProntidaoRequest(BaseModel):
@@ -108,6 +221,27 @@ async def health_check():
     }
 
 
+@app.get("/metricas")
+async def metricas():
+    """Contadores internos (cache de interpretação etc.)"""
+    from agent.ai_parser import cache_interpretacao
+    from agent.roteiro_chat import estatisticas_roteiro
+    from agent.pdf_generator import cache_pdfs
+    from agent.agent import coalescedor_interpretacao
+    from agent.compactacao import estatisticas as estatisticas_compactacao
+    from agent.interpretacao_local import estatisticas as estatisticas_interpretacao_local
+
+    return {
+        "cache_interpretacao": cache_interpretacao.estatisticas(),
+        "coalescencia_interpretacao": coalescedor_interpretacao.estatisticas(),
+        "compactacao": estatisticas_compactacao(),
+        "interpretacao_local": estatisticas_interpretacao_local(),
+        "chat": dict(estatisticas_roteiro),
+        "cache_pdf": cache_pdfs.estatisticas(),
+        "etapas": estatisticas_etapas()
+    }
+
+
 @app.get("/")
 @app.head("/")
 async def root():
@@ -127,6 +261,24 @@ async def chat_page():
     return {"erro": "Página não encontrada"}
 
 
+async def _receber_upload(file: UploadFile):
+    """Copia o upload em blocos para um arquivo temporário (memória até
+    UPLOAD_SPOOL_BYTES, depois disco). Retorna None se passar de MAX_UPLOAD_BYTES."""
+    destino = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+    total = 0
+    while True:
+        bloco = await file.read(64 * 1024)
+        if not bloco:
+            break
+        total += len(bloco)
+        if total > MAX_UPLOAD_BYTES:
+            destino.close()
+            return None
+        destino.write(bloco)
+    destino.seek(0)
+    return destino
+
+
 @app.post("/dieta")
 async def receber_dieta(
     texto: Optional[str] = Form(None),
@@ -138,10 +290,27 @@ async def receber_dieta(
     try:
         if file:
             print(f"\n[DEBUG] Recebendo PDF: {file.filename}")
-            dieta = await interpretar_dieta_pdf(file)
+            with span("upload", arquivo=file.filename) as s:
+                arquivo = await _receber_upload(file)
+                if arquivo is not None:
+                    s.definir(bytes=arquivo.seek(0, os.SEEK_END))
+                    arquivo.seek(0)
+            if arquivo is None:
+                return ERRO_UPLOAD_GRANDE
+            try:
+                dieta = await interpretar_dieta_pdf(arquivo)
+            except PDFMuitoGrandeError as e:
+                return {"erro": "PDF muito grande", "detalhes": str(e)}
+            finally:
+                arquivo.close()
         elif texto:
             print(f"\n[DEBUG] Recebendo texto ({len(texto)} caracteres)")
-            dieta = interpretar_dieta_texto(texto)
+            if len(texto) > MAX_TEXTO_CHARS:
+                return {
+                    "erro": "Texto muito longo",
+                    "detalhes": f"O máximo é {MAX_TEXTO_CHARS} caracteres"
+                }
+            dieta = await interpretar_dieta_texto_async(texto)
         else:
             return {"erro": "Envie texto ou PDF"}
 
@@ -176,6 +345,7 @@ async def receber_dieta(
 
         return {
             "dieta": dieta,
+            "sessao_id": sessoes.criar(dieta),
             "escolhas_pendentes": escolhas_pendentes,
             "mensagem": mensagem
         }
@@ -186,35 +356,121 @@ async def receber_dieta(
         return {"erro": f"Erro ao processar dieta: {str(e)}", "detalhes": str(e)}
 
 
+ERRO_SESSAO_EXPIRADA = {
+    "erro": "Sessão expirada ou inexistente",
+    "detalhes": "Envie a dieta novamente para iniciar uma nova conversa."
+}
+
+
+def _carregar_conversa(req: ChatRequest):
+    """Retorna (dieta, historico, sessao_id) da sessão ou do próprio request,
+    ou None. sessao_id só vem preenchido se a sessão existia."""
+    if req.sessao_id:
+        sessao = sessoes.obter(req.sessao_id)
+        if sessao is not None:
+            return sessao["dieta"], sessao["historico"], req.sessao_id
+    if req.dieta is not None:
+        return req.dieta, req.historico or [], None
+    return None
+
+
+def _montar_resposta_chat(req: ChatRequest, sessao_id: Optional[str], dieta: dict,
+                          resposta: str, historico: list) -> dict:
+    # ✅ DETECÇÃO INTELIGENTE: Se agente indicar que está pronto, limpar escolhas
+    palavras_finalizacao = ["finalizar", "gerar sua lista", "está pronto", "pode clicar"]
+    resposta_lower = resposta.lower()
+
+    if any(palavra in resposta_lower for palavra in palavras_finalizacao):
+        # Limpar escolhas para habilitar botão Finalizar
+        dieta["escolhas"] = []
+
+    if req.sessao_id:
+        # Sessão: estado fica no servidor, resposta não cresce com a conversa.
+        # Se a sessão pedida expirou (veio a dieta do request), abre uma nova:
+        # o id é sempre gerado pelo servidor
+        if sessao_id is None:
+            sessao_id = sessoes.criar(dieta, historico)
+        else:
+            sessoes.salvar(sessao_id, {"dieta": dieta, "historico": historico})
+        return {
+            "resposta": resposta,
+            "sessao_id": sessao_id,
+            "escolhas_pendentes": bool(dieta.get("escolhas"))
+        }
+
+    return {
+        "resposta": resposta,
+        "historico": historico,
+        "dieta_atualizada": dieta  # Retornar dieta atualizada para frontend sincronizar
+    }
+
+
+def _evento_sse(evento: str, dados: dict) -> str:
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+
 @app.post("/chat")
 async def conversar(req: ChatRequest):
     """
     Conversa com o usuário para resolver escolhas
     """
     try:
-        resposta, historico = chat_humano(
-            req.dieta,
-            req.historico,
+        conversa = _carregar_conversa(req)
+        if conversa is None:
+            return ERRO_SESSAO_EXPIRADA
+        dieta, historico, sessao_id = conversa
+
+        resposta, historico = await chat_humano_async(
+            dieta,
+            historico,
             req.mensagem_usuario
         )
 
-        # ✅ DETECÇÃO INTELIGENTE: Se agente indicar que está pronto, limpar escolhas
-        palavras_finalizacao = ["finalizar", "gerar sua lista", "está pronto", "pode clicar"]
-        resposta_lower = resposta.lower()
-
-        if any(palavra in resposta_lower for palavra in palavras_finalizacao):
-            # Limpar escolhas para habilitar botão Finalizar
-            req.dieta["escolhas"] = []
-
-        return {
-            "resposta": resposta,
-            "historico": historico,
-            "dieta_atualizada": req.dieta  # Retornar dieta atualizada para frontend sincronizar
-        }
+        return _montar_resposta_chat(req, sessao_id, dieta, resposta, historico)
     except Exception as e:
         return {"erro": f"Erro ao processar chat: {str(e)}", "detalhes": str(e)}
 
 
+@app.post("/chat/stream")
+async def conversar_stream(req: ChatRequest):
+    """
+    Igual ao /chat, mas em Server-Sent Events: envia eventos "token" com cada
+    pedaço da resposta e um evento final "fim" com o mesmo corpo do /chat.
+    """
+    conversa = _carregar_conversa(req)
+
+    async def eventos():
+        if conversa is None:
+            yield _evento_sse("erro", ERRO_SESSAO_EXPIRADA)
+            return
+        dieta, historico, sessao_id = conversa
+
+        partes = []
+        try:
+            async for pedaco in chat_humano_stream(dieta, historico, req.mensagem_usuario):
+                partes.append(pedaco)
+                yield _evento_sse("token", {"texto": pedaco})
+
+            yield _evento_sse("fim", _montar_resposta_chat(req, sessao_id, dieta, "".join(partes), historico))
+        except Exception as e:
+            yield _evento_sse("erro", {"erro": f"Erro ao processar chat: {str(e)}", "detalhes": str(e)})
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/sessao/{sessao_id}")
+async def obter_sessao(sessao_id: str):
+    """Retorna a dieta atual da sessão (ex: para mesclar dietas no frontend)"""
+    sessao = sessoes.obter(sessao_id)
+    if sessao is None:
+        return ERRO_SESSAO_EXPIRADA
+    return {"sessao_id": sessao_id, "dieta": sessao["dieta"]}
+
+
 @app.post("/verificar-prontidao")
 def verificar_prontidao(req: VerificarProntidaoRequest):
     """
@@ -247,10 +503,19 @@ async def finalizar(req: FinalizarRequest):
     Gera a lista de compras final com validação
     """
     try:
-        lista = finalizar_compra(req.dieta_final)
+        dieta_final = req.dieta_final
+        if dieta_final is None and req.sessao_id:
+            sessao = sessoes.obter(req.sessao_id)
+            if sessao is None:
+                return ERRO_SESSAO_EXPIRADA
+            dieta_final = sessao["dieta"]
+        if dieta_final is None:
+            return {"erro": "Envie dieta_final ou sessao_id"}
+
+        lista = finalizar_compra(dieta_final)
 
         # ✅ VALIDAÇÃO DE SANIDADE (passa dieta para considerar número de pessoas)
-        valido, alertas = validar_quantidades(lista, req.dieta_final)
+        valido, alertas = validar_quantidades(lista, dieta_final)
 
         if not valido:
             # Retornar com avisos mas permitir continuar
@@ -265,32 +530,84 @@ async def finalizar(req: FinalizarRequest):
         return {"erro": f"Erro ao finalizar: {str(e)}", "detalhes": str(e)}
 
 
+@app.post("/finalizar/batch")
+async def finalizar_lote(req: FinalizarLoteRequest):
+    """
+    Gera as listas de compras de várias dietas de uma vez (ex: recalcular
+    listas salvas depois de mudar uma tabela de conversão). Retorna uma
+    entrada por dieta, na mesma ordem: a lista ou um erro daquela dieta.
+    """
+    if len(req.dietas) > MAX_DIETAS_LOTE:
+        return JSONResponse(status_code=413, content={
+            "erro": "Lote muito grande",
+            "detalhes": f"O máximo é {MAX_DIETAS_LOTE} dietas por requisição"
+        })
+    try:
+        listas = await finalizar_compras_em_lote(req.dietas)
+        return {"listas": [
+            lista if isinstance(lista, dict) else {"lista_compras": lista}
+            for lista in listas
+        ]}
+    except Exception as e:
+        return {"erro": f"Erro ao finalizar lote: {str(e)}", "detalhes": str(e)}
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+def _etag_confere(if_none_match: str, chave: str) -> bool:
+    if not if_none_match:
+        return False
+    for etag in if_none_match.split(","):
+        etag = etag.strip()
+        if etag.removeprefix("W/").strip('"') == chave:
+            return True
+    return False
+
+
+def _headers_pdf(chave: str) -> dict:
+    return {
+        "Content-Disposition": "attachment; filename=lista_compras.pdf",
+        "Content-Location": f"/gerar-pdf/{chave}",
+        "ETag": f'"{chave}"',
+        "Cache-Control": "private, no-cache"
+    }
+
+
 @app.post("/gerar-pdf")
-async def gerar_pdf_endpoint(req: dict):
+async def gerar_pdf_endpoint(req: dict, request: Request):
     """
-    Gera PDF da lista de compras
+    Gera PDF da lista de compras. A mesma lista devolve o mesmo PDF (cache
+    por conteúdo); o Content-Location aponta para GET /gerar-pdf/{chave},
+    que revalida com If-None-Match (304). Como é POST, um If-None-Match que
+    confere recebe 412 (RFC 7232), não 304.
+    O reportlab roda no pool de processos, fora do event loop.
     """
     try:
-        from agent.pdf_generator import gerar_pdf_lista_compras
+        from agent.pdf_generator import chave_pdf, obter_pdf_lista_compras_async
 
         lista_compras = req.get('lista_compras', [])
 
         if not lista_compras:
             return {"erro": "Lista de compras vazia"}
 
-        pdf_bytes = gerar_pdf_lista_compras(lista_compras)
+        chave = chave_pdf(lista_compras)
+        headers = _headers_pdf(chave)
+        if _etag_confere(request.headers.get("if-none-match"), chave):
+            return JSONResponse(status_code=412, headers=headers, content={
+                "erro": "PDF já baixado",
+                "detalhes": f"Revalide com GET {headers['Content-Location']}"
+            })
+
+        # Render no pool de processos: downloads simultâneos não travam o chat
+        pdf_bytes = await obter_pdf_lista_compras_async(lista_compras, chave)
 
         return Response(
             content=pdf_bytes,
             media_type="application/pdf",
-            headers={
-                "Content-Disposition": "attachment; filename=lista_compras.pdf"
-            }
+            headers=headers
         )
     except ImportError as e:
         return {
@@ -305,6 +622,79 @@ async def gerar_pdf_endpoint(req: dict):
         }
 
 
+@app.get("/gerar-pdf/{chave}")
+async def obter_pdf_gerado(chave: str, request: Request):
+    """
+    PDF já gerado pelo POST /gerar-pdf (do cache). Com If-None-Match igual
+    ao ETag responde 304; se o PDF saiu do cache, 404: gere de novo pelo POST.
+    """
+    from agent.pdf_generator import cache_pdfs
+
+    pdf_bytes = cache_pdfs.obter(chave)
+    if pdf_bytes is None:
+        return JSONResponse(status_code=404, content={
+            "erro": "PDF não encontrado",
+            "detalhes": "Gere novamente com POST /gerar-pdf"
+        })
+    headers = _headers_pdf(chave)
+    if _etag_confere(request.headers.get("if-none-match"), chave):
+        return Response(status_code=304, headers=headers)
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+
+@app.post("/gerar-pdf/batch")
+async def gerar_pdf_lote(req: GerarPdfLoteRequest):
+    """
+    PDFs de várias listas de uma vez (ex: todos os pacientes de uma clínica).
+    No formato "zip" os PDFs são renderizados em paralelo no pool de processos
+    e o ZIP sai em streaming, um PDF de cada vez; no formato "pdf" sai um
+    documento só, com uma seção por lista.
+    """
+    if req.formato not in ("zip", "pdf"):
+        return {"erro": "Formato inválido", "detalhes": 'Use "zip" ou "pdf"'}
+    if not req.listas:
+        return {"erro": "Nenhuma lista enviada"}
+    if len(req.listas) > MAX_LISTAS_PDF_LOTE:
+        return JSONResponse(status_code=413, content={
+            "erro": "Lote muito grande",
+            "detalhes": f"O máximo é {MAX_LISTAS_PDF_LOTE} listas por requisição"
+        })
+    try:
+        from agent.pdf_generator import REPORTLAB_AVAILABLE, gerar_pdf_listas_em_lote, zip_pdfs_em_lote
+        from agent.workers import executar_em_processo
+
+        if not REPORTLAB_AVAILABLE:
+            # Checado antes: no ZIP o erro só apareceria no meio do streaming
+            raise ImportError("reportlab não está instalado")
+
+        if req.formato == "zip":
+            return StreamingResponse(
+                zip_pdfs_em_lote(req.listas),
+                media_type="application/zip",
+                headers={"Content-Disposition": "attachment; filename=listas_compras.zip"}
+            )
+
+        with span("pdf.lote_pdf", listas=len(req.listas)) as s:
+            pdf_bytes = await executar_em_processo(gerar_pdf_listas_em_lote, req.listas)
+            s.definir(bytes=len(pdf_bytes))
+        return Response(
+            content=pdf_bytes,
+            media_type="application/pdf",
+            headers={"Content-Disposition": "attachment; filename=listas_compras.pdf"}
+        )
+    except ImportError as e:
+        return {
+            "erro": "Biblioteca reportlab não instalada",
+            "detalhes": "Execute: pip install reportlab",
+            "mensagem": str(e)
+        }
+    except Exception as e:
+        return {
+            "erro": f"Erro ao gerar PDFs: {str(e)}",
+            "detalhes": str(e)
+        }
+
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)